@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Batch Manifest
+Tracks which images in a batch have already been converted, with which
+options, so that repeated or interrupted batch runs only redo the work that
+actually changed.
+"""
+
+import json
+import os
+from typing import Dict
+
+
+class ConversionManifest:
+    """
+    Append-only record of completed conversions kept in the output directory.
+
+    Each finished conversion is appended as one JSON line and flushed
+    immediately, so a run that is killed part-way loses at most the image
+    that was being converted. Later lines for the same source replace earlier
+    ones; compact() rewrites the file with one line per source.
+    """
+
+    FILENAME = '.image2pdf-manifest.jsonl'
+
+    def __init__(self, output_dir: str, options: dict, use_hash: bool = False):
+        """
+        Load the manifest for an output directory.
+
+        Args:
+            output_dir (str): Directory holding the converted PDFs
+            options (dict): Conversion options; entries recorded with
+                different options count as out of date
+            use_hash (bool): Record a SHA-256 of each source and use it to
+                recognise unchanged files whose mtime changed
+        """
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self.options = options
+        self.use_hash = use_hash
+        self._entries: Dict[str, dict] = {}
+        self._file = None
+        self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted run
+                    continue
+                self._entries[entry['source']] = entry
+
+    @staticmethod
+    def _content_hash(path: str) -> str:
+        import hashlib
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def is_up_to_date(self, source: str, output: str) -> bool:
+        """
+        Check whether a source was already converted to ``output`` with the
+        current options and has not changed since.
+
+        A source whose mtime changed but whose content hash still matches
+        has its new mtime recorded, so it is not hashed again next time.
+
+        Args:
+            source (str): Path to the source image
+            output (str): Expected output PDF path
+
+        Returns:
+            bool: True if the conversion can be skipped
+        """
+        entry = self._entries.get(os.path.abspath(source))
+        if entry is None or entry['options'] != self.options:
+            return False
+        if entry['output'] != os.path.abspath(output) or not os.path.exists(output):
+            return False
+
+        stat = os.stat(source)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return True
+        # Same size but touched: only the content hash can tell
+        if not (self.use_hash and entry.get('sha256')
+                and self._content_hash(source) == entry['sha256']):
+            return False
+        self._append(dict(entry, mtime_ns=stat.st_mtime_ns))
+        return True
+
+    def record(self, source: str, output: str):
+        """
+        Append a completed conversion to the manifest.
+
+        Args:
+            source (str): Path to the source image
+            output (str): Path to the PDF created from it
+        """
+        stat = os.stat(source)
+        entry = {
+            'source': os.path.abspath(source),
+            'output': os.path.abspath(output),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': self._content_hash(source) if self.use_hash else None,
+            'options': self.options,
+        }
+        self._append(entry)
+
+    def _append(self, entry: dict):
+        """Store an entry and append it to the manifest file."""
+        self._entries[entry['source']] = entry
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(entry, sort_keys=True) + '\n')
+        self._file.flush()
+
+    def compact(self):
+        """Rewrite the manifest with a single line per source."""
+        self.close()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        """Close the manifest file if it is open."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
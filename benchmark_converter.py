@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for Image to PDF Converter
+Builds deterministic synthetic image corpora and measures the conversion
+paths of ImageToPDFConverter: pages per second, wall time, peak memory and
+output size, plus the converter's per-stage time breakdown. Results are
+written as JSON so that two runs can be compared. With --startup, measures
+the import time of the entry points instead.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError as e:
+    print(f"Error importing required packages: {e}")
+    print("Please install required packages: pip install Pillow reportlab")
+    sys.exit(1)
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is reported as null there
+    resource = None
+
+
+SIZES = {
+    'small': (640, 480),
+    'medium': (2000, 1500),
+    'large': (4000, 3000),
+}
+
+# Corpus formats: file extension and a description of what is generated
+FORMATS = {
+    'jpeg': ('.jpg', 'RGB JPEG, quality 90'),
+    'scan-jpeg': ('.jpg', 'Black-and-white text page saved as RGB JPEG, quality 90'),
+    'png': ('.png', 'Opaque RGB PNG'),
+    'png-alpha': ('.png', 'RGBA PNG with a partially transparent alpha channel'),
+    'tiff16': ('.tif', '16-bit grayscale TIFF'),
+    'gif-multi': ('.gif', 'Three-frame palette GIF'),
+}
+
+SCENARIOS = {
+    'single': 'convert_single_image for each file',
+    'batch': 'batch_convert_directory, one process',
+    'batch-parallel': 'batch_convert_directory, one worker per CPU',
+    'merge': 'convert_multiple_images, converter backend (reportlab unless set)',
+    'merge-streaming': 'convert_multiple_images, streaming writer',
+    'merge-parallel': 'convert_multiple_images, one worker per CPU',
+}
+
+OPTION_SETS = {
+    'default': {},
+    'no-passthrough': {'jpeg_passthrough': False, 'png_passthrough': False},
+    'direct-backend': {'backend': 'direct'},
+    'optimize': {'optimize': True},
+    'max-dpi-150': {'target_dpi': 150},
+}
+
+CORPUS_VERSION = 1
+
+# Entry points measured with --startup: interpreter arguments run from this directory
+STARTUP_COMMANDS = {
+    'cli-help': ['image_to_pdf_converter.py', '--help'],
+    'gui-import': ['-c', 'import gui_converter'],
+}
+
+# Modules that only a conversion needs; starting up must not import them
+STARTUP_DEFERRED_MODULES = ('PIL', 'reportlab', 'multiprocessing', 'concurrent.futures')
+
+
+def _synthetic_image(size, seed: int) -> Image.Image:
+    """
+    Draw a deterministic RGB test image.
+
+    Gradients give smooth areas that compress like photos and scans; seeded
+    rectangles make every file in a corpus distinct.
+    """
+    width, height = size
+    rng = random.Random(seed)
+    horizontal = Image.linear_gradient('L').rotate(90).resize(size)
+    vertical = Image.linear_gradient('L').resize(size)
+    radial = Image.radial_gradient('L').resize(size)
+    img = Image.merge('RGB', (horizontal, vertical, radial))
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(24):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1 = min(width, x0 + rng.randrange(1, max(2, width // 4)))
+        y1 = min(height, y0 + rng.randrange(1, max(2, height // 4)))
+        draw.rectangle((x0, y0, x1, y1), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return img
+
+
+def _synthetic_scan(size, seed: int) -> Image.Image:
+    """Draw a deterministic RGB 'scan' of a text page: black word blocks on white."""
+    width, height = size
+    rng = random.Random(seed)
+    img = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(img)
+    line_height = max(4, height // 60)
+    for y in range(line_height * 3, height - line_height * 3, line_height * 2):
+        x = width // 10
+        while x < width - width // 10:
+            word = rng.randrange(line_height, line_height * 6)
+            draw.rectangle((x, y, min(x + word, width - 1), y + line_height), fill=(12, 12, 12))
+            x += word + line_height
+    return img
+
+
+def _save_corpus_image(img: Image.Image, path: str, image_format: str):
+    if image_format == 'jpeg':
+        img.save(path, 'JPEG', quality=90)
+    elif image_format == 'scan-jpeg':
+        img.save(path, 'JPEG', quality=90)
+    elif image_format == 'png':
+        img.save(path, 'PNG')
+    elif image_format == 'png-alpha':
+        alpha = Image.radial_gradient('L').resize(img.size)
+        rgba = img.copy()
+        rgba.putalpha(alpha)
+        rgba.save(path, 'PNG')
+    elif image_format == 'tiff16':
+        gray = img.convert('I').point(lambda value: value * 256).convert('I;16')
+        gray.save(path, 'TIFF')
+    elif image_format == 'gif-multi':
+        frames = [img.rotate(angle).convert('P', palette=Image.ADAPTIVE) for angle in (0, 90, 180)]
+        frames[0].save(path, 'GIF', save_all=True, append_images=frames[1:])
+    else:
+        raise ValueError(f"Unknown corpus format: {image_format}")
+
+
+def build_corpus(root: str, image_format: str, size_name: str, count: int) -> str:
+    """
+    Create (or reuse) a corpus directory of synthetic images.
+
+    The same arguments always produce byte-identical files, and an existing
+    complete corpus is reused instead of being regenerated.
+
+    Args:
+        root (str): Directory that holds all corpora
+        image_format (str): Key of FORMATS
+        size_name (str): Key of SIZES
+        count (int): Number of images
+
+    Returns:
+        str: Path to the corpus directory
+    """
+    extension = FORMATS[image_format][0]
+    corpus_dir = os.path.join(root, f"v{CORPUS_VERSION}-{image_format}-{size_name}-{count}")
+    marker = os.path.join(corpus_dir, '.complete')
+    if os.path.exists(marker):
+        return corpus_dir
+
+    if os.path.exists(corpus_dir):
+        shutil.rmtree(corpus_dir)
+    os.makedirs(corpus_dir)
+    for index in range(count):
+        if image_format == 'scan-jpeg':
+            img = _synthetic_scan(SIZES[size_name], seed=index)
+        else:
+            img = _synthetic_image(SIZES[size_name], seed=index)
+        _save_corpus_image(img, os.path.join(corpus_dir, f"img{index:05d}{extension}"), image_format)
+    open(marker, 'w').close()
+    return corpus_dir
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process and its finished children."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _output_bytes(output_dir: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(output_dir):
+        for filename in filenames:
+            if filename.endswith('.pdf'):
+                total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def run_scenario(spec: dict) -> dict:
+    """
+    Run one benchmark scenario in the current process.
+
+    Args:
+        spec (dict): ``corpus_dir``, ``output_dir``, ``scenario`` and ``options``
+
+    Returns:
+        dict: Measurements for the scenario
+    """
+    import_start = time.perf_counter()
+    from image_to_pdf_converter import ImageToPDFConverter, iter_image_files
+    import_seconds = time.perf_counter() - import_start
+
+    corpus_dir = spec['corpus_dir']
+    output_dir = spec['output_dir']
+    scenario = spec['scenario']
+    converter = ImageToPDFConverter(quiet=True, **spec['options'])
+    image_files = list(iter_image_files(corpus_dir))
+    merged_pdf = os.path.join(output_dir, 'merged.pdf')
+
+    start = time.perf_counter()
+    if scenario == 'single':
+        for image_file in image_files:
+            converter.convert_single_image(
+                image_file, os.path.join(output_dir, os.path.basename(image_file) + '.pdf'))
+    elif scenario == 'batch':
+        converter.batch_convert_directory(corpus_dir, output_dir, workers=1)
+    elif scenario == 'batch-parallel':
+        converter.batch_convert_directory(corpus_dir, output_dir, workers=0)
+    elif scenario == 'merge':
+        converter.convert_multiple_images(image_files, merged_pdf)
+    elif scenario == 'merge-streaming':
+        converter.convert_multiple_images(image_files, merged_pdf, streaming=True)
+    elif scenario == 'merge-parallel':
+        converter.convert_multiple_images(image_files, merged_pdf, workers=0)
+    else:
+        raise ValueError(f"Unknown scenario: {scenario}")
+    wall_seconds = time.perf_counter() - start
+
+    return {
+        'pages': len(image_files),
+        'wall_seconds': wall_seconds,
+        'pages_per_second': len(image_files) / wall_seconds if wall_seconds else None,
+        'import_seconds': import_seconds,
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'output_bytes': _output_bytes(output_dir),
+        'stages': converter.metrics.to_dict()['stages'],
+    }
+
+
+def _run_isolated(spec: dict) -> dict:
+    """Run a scenario in a fresh interpreter so peak RSS belongs to it alone."""
+    with tempfile.NamedTemporaryFile('r', suffix='.json', delete=False) as result_file:
+        result_path = result_file.name
+    try:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-scenario', json.dumps(spec),
+             '--result-file', result_path],
+            check=True, stdout=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        with open(result_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def run_benchmarks(formats: List[str], sizes: List[str], counts: List[int],
+                   scenarios: List[str], option_sets: List[str], corpus_root: str,
+                   repeat: int = 1) -> Dict[str, dict]:
+    """
+    Run every combination of corpus, scenario and option set.
+
+    Returns:
+        Dict[str, dict]: Results keyed by
+        ``format/size/count/scenario/option_set``; with ``repeat`` > 1 the
+        fastest run is kept
+    """
+    results = {}
+    for image_format in formats:
+        for size_name in sizes:
+            for count in counts:
+                corpus_dir = build_corpus(corpus_root, image_format, size_name, count)
+                for scenario in scenarios:
+                    for option_set in option_sets:
+                        key = f"{image_format}/{size_name}/{count}/{scenario}/{option_set}"
+                        best = None
+                        for _ in range(repeat):
+                            output_dir = tempfile.mkdtemp(prefix='image2pdf-bench-out-')
+                            try:
+                                result = _run_isolated({
+                                    'corpus_dir': corpus_dir,
+                                    'output_dir': output_dir,
+                                    'scenario': scenario,
+                                    'options': OPTION_SETS[option_set],
+                                })
+                            finally:
+                                shutil.rmtree(output_dir, ignore_errors=True)
+                            if best is None or result['wall_seconds'] < best['wall_seconds']:
+                                best = result
+                        results[key] = best
+                        rss = best['peak_rss_bytes']
+                        print(f"{key:55s} {best['pages_per_second']:9.1f} pages/s "
+                              f"{best['wall_seconds']:8.2f} s "
+                              f"{(rss / 2 ** 20 if rss else 0):8.1f} MiB "
+                              f"{best['output_bytes'] / 2 ** 20:9.2f} MiB out")
+    return results
+
+
+def _parse_importtime(output: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        Tuple[float, List[Tuple[str, float]], List[str]]: Total import time
+        in milliseconds, ``(module, ms)`` for every top-level import, and the
+        names of all imported modules
+    """
+    top_level = []
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # Column header
+        module = name.strip()
+        modules.append(module)
+        # Nested imports are indented by two more spaces per level
+        if len(name) - len(name.lstrip()) == 1:
+            top_level.append((module, int(cumulative) / 1000))
+    return sum(ms for _, ms in top_level), top_level, modules
+
+
+def measure_startup(repeat: int = 5) -> Dict[str, dict]:
+    """
+    Measure how long each entry point in STARTUP_COMMANDS spends importing.
+
+    Every command runs once to warm bytecode and file caches, then
+    ``repeat`` times under ``-X importtime``; the median run is kept, along
+    with the time of the fastest one.
+
+    Returns:
+        Dict[str, dict]: Per entry point, the median ``import_ms``, the
+        fastest ``best_import_ms``, the slowest top-level imports and any
+        STARTUP_DEFERRED_MODULES imported
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, arguments in STARTUP_COMMANDS.items():
+        runs = []
+        for run in range(repeat + 1):
+            completed = subprocess.run([sys.executable, '-X', 'importtime'] + arguments,
+                                       cwd=script_dir, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"{name} failed:\n{completed.stderr}")
+            if run:
+                runs.append(_parse_importtime(completed.stderr))
+        runs.sort(key=lambda parsed: parsed[0])
+        import_ms, top_level, modules = runs[len(runs) // 2]
+        results[name] = {
+            'import_ms': import_ms,
+            'best_import_ms': runs[0][0],
+            'slowest_imports': [{'module': module, 'ms': ms} for module, ms in
+                                sorted(top_level, key=lambda item: item[1], reverse=True)[:5]],
+            'deferred_imported': [deferred for deferred in STARTUP_DEFERRED_MODULES
+                                  if any(module == deferred or module.startswith(deferred + '.')
+                                         for module in modules)],
+        }
+        slowest = ', '.join(f"{item['module']} {item['ms']:.1f}" for item in results[name]['slowest_imports'])
+        print(f"{name:12s} {import_ms:7.1f} ms imports  (slowest: {slowest})")
+    return results
+
+
+def check_startup(results: Dict[str, dict], budget_ms: float) -> bool:
+    """
+    Check startup results against a budget.
+
+    The fastest run is compared, as a busy machine only ever adds time, so
+    a slow shared CI runner does not fail the check at random.
+
+    Returns:
+        bool: True if every entry point stayed within ``budget_ms`` and
+        imported none of the deferred modules
+    """
+    ok = True
+    for name, result in sorted(results.items()):
+        if result['best_import_ms'] > budget_ms:
+            print(f"✗ {name}: imports took {result['best_import_ms']:.1f} ms at best, budget is {budget_ms:.0f} ms")
+            ok = False
+        if result['deferred_imported']:
+            print(f"✗ {name}: imported {', '.join(result['deferred_imported'])} at startup")
+            ok = False
+    return ok
+
+
+def compare_results(baseline: dict, current: dict, max_regression: float) -> bool:
+    """
+    Print throughput changes between two result files.
+
+    Args:
+        baseline (dict): Earlier results (as saved by this script)
+        current (dict): New results
+        max_regression (float): Allowed fractional drop in pages per second
+
+    Returns:
+        bool: True if no shared scenario regressed beyond the limit
+    """
+    ok = True
+    for key, result in sorted(current['results'].items()):
+        old = baseline['results'].get(key)
+        if not old or not old.get('pages_per_second') or not result.get('pages_per_second'):
+            continue
+        change = result['pages_per_second'] / old['pages_per_second'] - 1
+        flag = ''
+        if change < -max_regression:
+            flag = '  ✗ REGRESSION'
+            ok = False
+        print(f"{key:55s} {old['pages_per_second']:9.1f} → {result['pages_per_second']:9.1f} "
+              f"pages/s ({change:+.1%}){flag}")
+    return ok
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main():
+    """Main function to handle command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the image to PDF conversion paths",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark_converter.py
+  python benchmark_converter.py --formats jpeg --sizes large --counts 10,100,1000
+  python benchmark_converter.py -o new.json --compare baseline.json
+  python benchmark_converter.py --startup --startup-budget-ms 150 -o startup.json
+        """
+    )
+    parser.add_argument('--formats', default=','.join(FORMATS),
+                       help=f"Corpus formats (default: all of {', '.join(FORMATS)})")
+    parser.add_argument('--sizes', default='small,medium',
+                       help=f"Image sizes from {', '.join(SIZES)} (default: small,medium)")
+    parser.add_argument('--counts', default='10,100',
+                       help='Images per corpus, e.g. 10,100,1000,10000 (default: 10,100)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                       help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--options', default='default',
+                       help=f"Option sets from {', '.join(OPTION_SETS)} (default: default)")
+    parser.add_argument('--repeat', type=int, default=1,
+                       help='Runs per combination; the fastest is kept (default: 1)')
+    parser.add_argument('--corpus-dir',
+                       default=os.path.join(tempfile.gettempdir(), 'image2pdf-bench-corpus'),
+                       help='Where generated corpora are cached')
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                       help='JSON file for the results (default: benchmark_results.json)')
+    parser.add_argument('--compare', metavar='BASELINE',
+                       help='Compare against an earlier results file and fail on regressions')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                       help='Allowed drop in pages per second with --compare (default: 0.2)')
+    parser.add_argument('--startup', action='store_true',
+                       help='Measure entry point import time with -X importtime instead of conversions')
+    parser.add_argument('--startup-budget-ms', type=float,
+                       help='With --startup, fail if an entry point imports for longer than this '
+                            'or imports Pillow, reportlab or multiprocessing')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        # Child process started by _run_isolated
+        result = run_scenario(json.loads(args.run_scenario))
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    if args.startup:
+        startup = measure_startup(max(args.repeat, 5))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'startup': startup,
+            }, f, indent=2, sort_keys=True)
+        print(f"✓ Results written to: {args.output}")
+        if args.startup_budget_ms is not None and not check_startup(startup, args.startup_budget_ms):
+            sys.exit(1)
+        return
+
+    for name, choices, values in (('format', FORMATS, _split(args.formats)),
+                                  ('size', SIZES, _split(args.sizes)),
+                                  ('scenario', SCENARIOS, _split(args.scenarios)),
+                                  ('option set', OPTION_SETS, _split(args.options))):
+        unknown = [value for value in values if value not in choices]
+        if unknown:
+            parser.error(f"Unknown {name}: {', '.join(unknown)}")
+
+    results = run_benchmarks(_split(args.formats), _split(args.sizes),
+                             [int(count) for count in _split(args.counts)],
+                             _split(args.scenarios), _split(args.options),
+                             args.corpus_dir, args.repeat)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"✓ Results written to: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare_results(baseline, report, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Conversion Metrics
+Collects per-stage timings, byte counts and per-file outcome events from
+ImageToPDFConverter, and passes each event to any registered callbacks.
+"""
+
+import heapq
+import json
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+
+class _StageTimer:
+    """Context manager that adds its elapsed time to one stage."""
+
+    __slots__ = ('_metrics', '_stage', '_start')
+
+    def __init__(self, metrics: 'ConversionMetrics', stage: str):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.add_stage(self._stage, time.perf_counter() - self._start)
+        return False
+
+
+class ConversionMetrics:
+    """
+    Accumulate where conversion time goes and report one event per file.
+
+    Stage times and byte counts are added both to run totals and to a pending
+    record for the file being converted. file_finished() turns the pending
+    record into a ``file`` event; document_finished() does the same for
+    work that belongs to a whole PDF (saving a merged document). Events are
+    plain dicts, so they can be sent back from worker processes and merged
+    with add_event().
+    """
+
+    # Stages reported by ImageToPDFConverter, in pipeline order
+    STAGES = ('probe', 'read', 'decode', 'resample', 'optimize', 'encode', 'page_write', 'save')
+
+    # Number of slowest files remembered even when events are not kept
+    SLOWEST_FILES = 10
+
+    def __init__(self, keep_events: bool = False):
+        """
+        Initialize an empty set of metrics.
+
+        Args:
+            keep_events (bool): Keep every event for to_dict(); otherwise only
+                totals and the slowest files are kept, so memory use does not
+                grow with the number of files
+        """
+        self.keep_events = keep_events
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+        self.stage_counts: Dict[str, int] = defaultdict(int)
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_converted = 0
+        self.files_failed = 0
+        self.documents = 0
+        self.events: List[dict] = []
+        self.last_event: Optional[dict] = None
+        self._slowest: List[tuple] = []
+        self._listeners: List[Callable[[dict], None]] = []
+        self._pending = self._new_pending()
+
+    @staticmethod
+    def _new_pending() -> dict:
+        return {'stages': {}, 'bytes_read': 0, 'bytes_written': 0}
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """
+        Register a callback that receives every event as it is emitted.
+
+        Args:
+            callback (Callable[[dict], None]): Function called with each event
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[dict], None]):
+        """Unregister a callback added with add_listener()."""
+        self._listeners.remove(callback)
+
+    def stage(self, name: str) -> _StageTimer:
+        """
+        Time a block of work as one stage.
+
+        Example:
+            with metrics.stage('decode'):
+                img.load()
+        """
+        return _StageTimer(self, name)
+
+    def add_stage(self, name: str, seconds: float):
+        """Add time spent in a stage for the file in progress."""
+        self.stage_seconds[name] += seconds
+        self.stage_counts[name] += 1
+        stages = self._pending['stages']
+        stages[name] = stages.get(name, 0.0) + seconds
+
+    def count_read(self, size: int):
+        """Add bytes read from input files."""
+        self.bytes_read += size
+        self._pending['bytes_read'] += size
+
+    def count_written(self, size: int):
+        """Add bytes written to output files."""
+        self.bytes_written += size
+        self._pending['bytes_written'] += size
+
+    def take_pending(self) -> dict:
+        """
+        Return the pending record and start a new one.
+
+        Used by worker processes to send the timings of a partly finished file
+        back to the process that finishes it.
+        """
+        pending, self._pending = self._pending, self._new_pending()
+        return pending
+
+    def add_pending(self, pending: dict):
+        """Merge a record from take_pending() into the totals and the file in progress."""
+        for name, seconds in pending['stages'].items():
+            self.add_stage(name, seconds)
+        self.count_read(pending['bytes_read'])
+        self.count_written(pending['bytes_written'])
+
+    def _emit(self, event: dict) -> dict:
+        self.last_event = event
+        if self.keep_events:
+            self.events.append(event)
+        for callback in self._listeners:
+            callback(event)
+        return event
+
+    def _record_file(self, event: dict):
+        if event['error'] is None:
+            self.files_converted += 1
+        else:
+            self.files_failed += 1
+        entry = (event['seconds'], event['path'])
+        if len(self._slowest) < self.SLOWEST_FILES:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    def file_finished(self, path: str, output: str = None, error: str = None) -> dict:
+        """
+        Close the pending record as the outcome of one input file.
+
+        Args:
+            path (str): Input image path
+            output (str): PDF the image was written to (None on failure)
+            error (str): Error message if the file failed
+
+        Returns:
+            dict: The emitted ``file`` event
+        """
+        pending = self.take_pending()
+        event = {
+            'type': 'file',
+            'path': path,
+            'output': output,
+            'error': error,
+            'seconds': sum(pending['stages'].values()),
+            'stages': pending['stages'],
+            'bytes_read': pending['bytes_read'],
+            'bytes_written': pending['bytes_written'],
+        }
+        self._record_file(event)
+        return self._emit(event)
+
+    def document_finished(self, output: str, pages: int, error: str = None) -> dict:
+        """
+        Close the pending record as the document-level work of a merged PDF.
+
+        Args:
+            output (str): Path of the merged PDF
+            pages (int): Number of pages written
+            error (str): Error message if the document failed
+
+        Returns:
+            dict: The emitted ``document`` event
+        """
+        pending = self.take_pending()
+        self.documents += 1
+        return self._emit({
+            'type': 'document',
+            'output': output,
+            'pages': pages,
+            'error': error,
+            'seconds': sum(pending['stages'].values()),
+            'stages': pending['stages'],
+            'bytes_written': pending['bytes_written'],
+        })
+
+    def add_event(self, event: dict) -> dict:
+        """
+        Merge a ``file`` or ``document`` event emitted by another
+        ConversionMetrics (for example one in a worker process) and pass it
+        to the listeners.
+        """
+        for name, seconds in event['stages'].items():
+            self.stage_seconds[name] += seconds
+            self.stage_counts[name] += 1
+        self.bytes_written += event['bytes_written']
+        if event['type'] == 'document':
+            self.documents += 1
+        else:
+            self.bytes_read += event['bytes_read']
+            self._record_file(event)
+        return self._emit(event)
+
+    def to_dict(self) -> dict:
+        """Return the totals (and kept events) as JSON-serialisable data."""
+        stages = {}
+        for name in list(self.STAGES) + sorted(set(self.stage_seconds) - set(self.STAGES)):
+            if name in self.stage_seconds:
+                stages[name] = {'seconds': self.stage_seconds[name],
+                                'count': self.stage_counts[name]}
+        result = {
+            'stages': stages,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'files_converted': self.files_converted,
+            'files_failed': self.files_failed,
+            'documents': self.documents,
+            'slowest_files': [{'path': path, 'seconds': seconds}
+                              for seconds, path in sorted(self._slowest, reverse=True)],
+        }
+        if self.keep_events:
+            result['events'] = self.events
+        return result
+
+    def write_json(self, output_path: str):
+        """Write to_dict() to a JSON file."""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write('\n')
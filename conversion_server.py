@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Conversion Server
+A small local HTTP service around ImageToPDFConverter. Conversions run in a
+process pool that is started and warmed up once, so callers no longer pay
+interpreter and import start-up costs for every request.
+
+Endpoints:
+  POST /convert  One image (raw body or multipart upload) -> one-page PDF
+  POST /merge    Several images (multipart, in upload order) -> one PDF
+  GET  /health   Pool and queue status as JSON
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email import policy
+from email.parser import BytesParser
+from typing import List, Optional, Tuple
+
+import image_to_pdf_converter
+from image_to_pdf_converter import ImageToPDFConverter, _init_worker, _parse_byte_size
+from memory_budget import MemoryBudget
+
+
+HTTP_REASONS = {
+    100: 'Continue',
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    422: 'Unprocessable Entity',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+    503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """An error that is reported to the client with a given status code."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadError(Exception):
+    """Raised in a worker when the uploaded data itself cannot be converted."""
+
+
+def _warm_up() -> int:
+    """Trivial job that makes the pool start a worker (and its converter)."""
+    return os.getpid()
+
+
+def _convert_upload_job(uploads: List[bytes]) -> bytes:
+    """
+    Convert uploaded images, one page each, in a worker process and return the PDF bytes.
+
+    Errors caused by the uploads (unreadable, truncated, unsupported or
+    oversized images) are raised as UploadError; anything else is a fault
+    of the server and propagates as it is.
+    """
+    from PIL import Image
+
+    try:
+        return image_to_pdf_converter._worker_converter.convert_multiple_image_data(uploads)
+    except (ValueError, OSError, Image.DecompressionBombError) as e:
+        raise UploadError(str(e)) from None
+
+
+class ConversionServer:
+    """
+    asyncio HTTP/1.1 server that hands conversions to a warm process pool.
+
+    Parsed uploads wait in a bounded queue that ``workers`` dispatcher tasks
+    feed into the pool. When the queue stays full for ``queue_timeout``
+    seconds the request is turned away with 503, so a burst of clients
+    cannot pile up unbounded work or memory.
+
+    With a memory_budget, the dispatchers share it: a request is handed to
+    the pool, in queue order, only while the decoded sizes of the requests
+    being converted plus its own (estimated from the image headers, the
+    largest upload of a /merge) fit the budget. A request larger than the
+    whole budget waits until nothing else is converting and then runs on
+    its own.
+
+    A worker that dies (crashes or is killed, e.g. when out of memory)
+    breaks the whole pool. The pool is then replaced and the requests it
+    took down are run once more; one that breaks the new pool as well is
+    answered with 503.
+    """
+
+    # Size of the chunks the PDF is streamed back in
+    RESPONSE_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, converter_options: dict = None, host: str = '127.0.0.1', port: int = 8080,
+                 workers: int = None, queue_size: int = None, queue_timeout: float = 30.0,
+                 max_upload_bytes: int = 100 * 1024 * 1024, memory_budget: int = None):
+        """
+        Initialize the server.
+
+        Args:
+            converter_options (dict): ImageToPDFConverter arguments used by
+                every worker (optional)
+            host (str): Interface to listen on
+            port (int): Port to listen on (0 picks a free port)
+            workers (int): Worker processes (defaults to every CPU)
+            queue_size (int): Requests allowed to wait for a worker (defaults
+                to four per worker)
+            queue_timeout (float): Seconds a request may wait for a queue slot
+                before it is answered with 503
+            max_upload_bytes (int): Largest request body accepted
+            memory_budget (int): Bytes of decoded image data all workers
+                may hold at once (optional); also every worker converter's
+                memory_budget, which decides what is decoded in bands
+        """
+        self.converter_options = converter_options or {}
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_budget = memory_budget
+        # Estimates decode costs for admission with the workers' settings
+        self._cost_converter = None
+        if memory_budget:
+            self.converter_options = dict(self.converter_options, memory_budget=memory_budget)
+            self._cost_converter = ImageToPDFConverter(quiet=True, **self.converter_options)
+        self.queue_size = queue_size or self.workers * 4
+        self.queue_timeout = queue_timeout
+        self.max_upload_bytes = max_upload_bytes
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._restart_lock: Optional[asyncio.Lock] = None
+        self.pool_restarts = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatchers: List[asyncio.Task] = []
+        self._server = None
+        self._budget = MemoryBudget(memory_budget)
+        self._admission_lock: Optional[asyncio.Lock] = None
+        self._budget_changed: Optional[asyncio.Condition] = None
+
+    async def start(self):
+        """Start and warm up the worker pool, then start listening."""
+        self._restart_lock = asyncio.Lock()
+        self._admission_lock = asyncio.Lock()
+        self._budget_changed = asyncio.Condition()
+        await self._start_pool()
+
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._dispatchers = [asyncio.ensure_future(self._dispatch()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _start_pool(self):
+        """Start a worker pool and wait until every worker has built its converter."""
+        loop = asyncio.get_running_loop()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.converter_options,))
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_up)
+                               for _ in range(self.workers)))
+
+    async def _restart_pool(self, broken: ProcessPoolExecutor):
+        """Replace a broken pool, unless another task has already done so."""
+        async with self._restart_lock:
+            if self._executor is not broken:
+                return
+            print("⚠ A worker process died; restarting the worker pool")
+            broken.shutdown(wait=False)
+            self.pool_restarts += 1
+            await self._start_pool()
+
+    def _pool_broken(self) -> bool:
+        """Check whether the pool lost a worker; a broken pool refuses new work straight away."""
+        try:
+            self._executor.submit(_warm_up).cancel()
+        except BrokenProcessPool:
+            return True
+        return False
+
+    async def close(self):
+        """Stop listening, cancel queued work and shut the pool down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def serve_forever(self):
+        """Start the server and handle requests until cancelled."""
+        await self.start()
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers (Ctrl+C to stop)...")
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def _upload_cost(self, uploads: List[bytes]) -> int:
+        """Return the decoded bytes converting uploads holds at once: that of the largest one."""
+        if self._cost_converter is None:
+            return 0
+        return max(self._cost_converter._decode_cost(data) for data in uploads)
+
+    @contextlib.asynccontextmanager
+    async def _admitted(self, cost: int):
+        """Wait, behind any request queued earlier, until ``cost`` fits the memory budget, and hold it."""
+        key = object()
+        async with self._admission_lock:
+            async with self._budget_changed:
+                await self._budget_changed.wait_for(lambda: self._budget.fits(cost))
+                self._budget.start(key, cost)
+        try:
+            yield
+        finally:
+            async with self._budget_changed:
+                self._budget.finish(key)
+                self._budget_changed.notify_all()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            uploads, result = await self._queue.get()
+            try:
+                async with self._admitted(self._upload_cost(uploads)):
+                    for attempt in range(2):
+                        executor = self._executor
+                        try:
+                            pdf_data = await loop.run_in_executor(executor, _convert_upload_job, uploads)
+                            break
+                        except BrokenProcessPool:
+                            await self._restart_pool(executor)
+                    else:
+                        raise HTTPError(503, "The worker process died during the conversion, twice")
+            except Exception as e:
+                if not result.done():
+                    result.set_exception(e)
+            else:
+                if not result.done():
+                    result.set_result(pdf_data)
+            finally:
+                self._queue.task_done()
+
+    async def convert(self, uploads: List[bytes]) -> bytes:
+        """
+        Queue a conversion of one or more images and wait for its PDF.
+
+        Raises:
+            HTTPError: 503 if no queue slot frees up within queue_timeout
+        """
+        result = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._queue.put((uploads, result)), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(503, "Server is busy, try again later")
+        return await result
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self._read_request(reader, writer)
+                except asyncio.IncompleteReadError:
+                    break
+                except HTTPError as e:
+                    await self._send_error(writer, e.status, str(e), keep_alive=False)
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._handle_request(writer, method, path, headers, body, keep_alive)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(501, "Chunked request bodies are not supported; send Content-Length")
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > self.max_upload_bytes:
+            raise HTTPError(413, f"Upload larger than {self.max_upload_bytes} bytes")
+
+        if length and headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    async def _handle_request(self, writer: asyncio.StreamWriter, method: str, target: str,
+                              headers: dict, body: bytes, keep_alive: bool):
+        path = target.partition('?')[0]
+        try:
+            if path == '/health':
+                if method != 'GET':
+                    raise HTTPError(405, "Use GET")
+                pool = 'ok'
+                if self._restart_lock.locked():
+                    pool = 'restarting'
+                elif self._pool_broken():
+                    pool = 'restarting'
+                    asyncio.ensure_future(self._restart_pool(self._executor))
+                status = {'status': 'ok' if pool == 'ok' else 'unavailable', 'pool': pool,
+                          'pool_restarts': self.pool_restarts, 'workers': self.workers,
+                          'queued': self._queue.qsize(), 'queue_size': self.queue_size}
+                await self._send(writer, 200 if pool == 'ok' else 503, 'application/json',
+                                 json.dumps(status).encode('utf-8'), keep_alive)
+                return
+            if path not in ('/convert', '/merge'):
+                raise HTTPError(404, f"Unknown endpoint: {path}")
+            if method != 'POST':
+                raise HTTPError(405, "Use POST")
+
+            uploads = self._parse_uploads(headers, body)
+            if path == '/convert' and len(uploads) != 1:
+                raise HTTPError(400, "/convert takes exactly one image; use /merge for several")
+
+            try:
+                pdf_data = await self.convert(uploads)
+            except HTTPError:
+                raise
+            except UploadError as e:
+                raise HTTPError(422, f"Conversion failed: {e}")
+            except Exception as e:
+                raise HTTPError(500, f"Internal error: {type(e).__name__}: {e}")
+            await self._send(writer, 200, 'application/pdf', pdf_data, keep_alive,
+                             [('Content-Disposition', 'attachment; filename="converted.pdf"')])
+        except HTTPError as e:
+            await self._send_error(writer, e.status, str(e), keep_alive)
+
+    def _parse_uploads(self, headers: dict, body: bytes) -> List[bytes]:
+        """
+        Extract the uploaded images from a raw or multipart request body.
+
+        Image formats are recognised from the data itself, so file names and
+        part content types are not needed.
+        """
+        content_type = headers.get('content-type', '')
+        media_type = content_type.split(';', 1)[0].strip().lower()
+
+        if media_type == 'multipart/form-data':
+            message = BytesParser(policy=policy.HTTP).parsebytes(
+                b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+            uploads = [part.get_payload(decode=True) for part in message.iter_parts()]
+        else:
+            uploads = [body]
+
+        uploads = [data for data in uploads if data]
+        if not uploads:
+            raise HTTPError(400, "No image data in request")
+        return uploads
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, content_type: str,
+                    data: bytes, keep_alive: bool, extra_headers: List[Tuple[str, str]] = ()):
+        head = [f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}',
+                f'Content-Type: {content_type}',
+                f'Content-Length: {len(data)}',
+                f'Connection: {"keep-alive" if keep_alive else "close"}']
+        head.extend(f'{name}: {value}' for name, value in extra_headers)
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+
+        # Stream in chunks, waiting for slow clients instead of buffering everything
+        view = memoryview(data)
+        for offset in range(0, len(view), self.RESPONSE_CHUNK_SIZE):
+            writer.write(view[offset:offset + self.RESPONSE_CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+
+    async def _send_error(self, writer: asyncio.StreamWriter, status: int, message: str,
+                          keep_alive: bool):
+        body = json.dumps({'error': message}).encode('utf-8')
+        extra_headers = [('Retry-After', '1')] if status == 503 else []
+        await self._send(writer, status, 'application/json', body, keep_alive, extra_headers)
+
+
+def main(argv: List[str] = None):
+    """Run the conversion server from the command line."""
+    parser = argparse.ArgumentParser(
+        prog='image_to_pdf_converter.py serve',
+        description="Serve image to PDF conversion over HTTP with a warm worker pool",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python image_to_pdf_converter.py serve --port 8080 --jobs 4
+  curl --data-binary @photo.jpg -H "Content-Type: image/jpeg" http://127.0.0.1:8080/convert -o photo.pdf
+  curl -F file=@a.jpg -F file=@b.png http://127.0.0.1:8080/merge -o merged.pdf
+        """
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='Worker processes (0 = all CPUs, default: 0)')
+    parser.add_argument('--queue-size', type=int,
+                        help='Requests allowed to wait for a worker (default: 4 per worker)')
+    parser.add_argument('--max-upload-mb', type=float, default=100,
+                        help='Largest accepted request body in megabytes (default: 100)')
+    parser.add_argument('--page-size', choices=['A4', 'Letter'], default='A4',
+                        help='PDF page size (default: A4)')
+    parser.add_argument('--margin', type=int, default=50,
+                        help='Page margin in points (default: 50)')
+    parser.add_argument('--no-jpeg-passthrough', action='store_true',
+                        help='Decode and re-encode JPEGs instead of embedding them unchanged')
+    parser.add_argument('--no-png-passthrough', action='store_true',
+                        help='Decode and re-compress PNGs instead of embedding their image data unchanged')
+    parser.add_argument('--max-dpi', type=float,
+                        help='Downsample images above this resolution on the page')
+    parser.add_argument('--optimize', action='store_true',
+                        help='Embed images that are really grayscale or black and white '
+                             'as 8-bit gray or 1-bit CCITT G4/Flate')
+    parser.add_argument('--memory-budget', type=_parse_byte_size, metavar='SIZE',
+                        help='Decoded image data all workers may hold at once (e.g. 2G); a '
+                             'request waits until its images fit beside those being converted, '
+                             'and larger TIFFs and PNGs are decoded in bands')
+    args = parser.parse_args(argv)
+
+    server = ConversionServer(
+        {'page_size': args.page_size, 'margin': args.margin,
+         'jpeg_passthrough': not args.no_jpeg_passthrough,
+         'png_passthrough': not args.no_png_passthrough, 'target_dpi': args.max_dpi,
+         'optimize': args.optimize},
+        host=args.host, port=args.port, workers=args.jobs, queue_size=args.queue_size,
+        max_upload_bytes=int(args.max_upload_mb * 1024 * 1024), memory_budget=args.memory_budget)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("Server stopped.")
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main()
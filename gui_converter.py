@@ -4,26 +4,173 @@ GUI Image to PDF Converter
 A simple GUI application for converting images to PDF using tkinter.
 """
 
+import base64
+import importlib.util
 import os
+import queue
 import sys
+import time
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import filedialog, messagebox, ttk
-from pathlib import Path
 import threading
 
-# Import the converter class from the main script
-try:
-    from image_to_pdf_converter import ImageToPDFConverter
-except ImportError:
-    try:
-        from PIL import Image
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import letter, A4
-    except ImportError as e:
-        messagebox.showerror("Import Error", 
-                           f"Required packages not found: {e}\n\n"
-                           "Please install: pip install Pillow reportlab")
-        sys.exit(1)
+# The converter (and with it Pillow and reportlab) is imported on first use
+# rather than here, so the window appears without waiting for it.
+REQUIRED_PACKAGES = {'PIL': 'Pillow', 'reportlab': 'reportlab'}
+
+
+def missing_packages() -> list:
+    """Return the pip names of required packages that are not installed, without importing them."""
+    return [name for module, name in REQUIRED_PACKAGES.items()
+            if importlib.util.find_spec(module) is None]
+
+
+class ThumbnailList(ttk.Frame):
+    """
+    Scrollable list of the selected images with a thumbnail for each.
+    
+    The list is virtualised: canvas items exist only for the rows on screen
+    and are reused as it scrolls, so it stays responsive with tens of
+    thousands of entries. Thumbnails for the visible rows are rendered by a
+    ThumbnailLoader on background threads and kept in its on-disk cache.
+    """
+    
+    THUMBNAIL_SIZE = (64, 64)
+    ROW_PADDING = 4
+    
+    # Tk photo images kept in memory; older ones are reloaded from the disk cache
+    CACHED_PHOTOS = 512
+    
+    # How often finished thumbnails are collected from the loader (ms)
+    POLL_INTERVAL = 50
+    
+    def __init__(self, master):
+        super().__init__(master)
+        self.items = []
+        self.row_height = self.THUMBNAIL_SIZE[1] + 2 * self.ROW_PADDING
+        self._rows = []
+        self._photos = OrderedDict()
+        self._failed = set()
+        self._results = queue.Queue()
+        self._loader = None
+        
+        self.canvas = tk.Canvas(self, highlightthickness=0, background='white')
+        self.canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._scroll)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        
+        self.canvas.bind('<Configure>', lambda event: self.refresh())
+        self.canvas.bind('<MouseWheel>', self._on_mouse_wheel)
+        self.canvas.bind('<Button-4>', lambda event: self._scroll('scroll', -3, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self._scroll('scroll', 3, 'units'))
+        self.after(self.POLL_INTERVAL, self._poll)
+    
+    def set_items(self, image_paths):
+        """Show these image paths (the list is referenced, not copied)."""
+        self.items = image_paths
+        self.canvas.configure(scrollregion=(0, 0, 0, len(image_paths) * self.row_height),
+                              yscrollincrement=self.row_height // 4)
+        if not image_paths:
+            self.canvas.yview_moveto(0)
+        self.refresh()
+    
+    def _scroll(self, *args):
+        self.canvas.yview(*args)
+        self.refresh()
+    
+    def _on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small raw deltas
+        steps = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        self._scroll('scroll', steps * 3, 'units')
+    
+    def _row_items(self, slot: int):
+        """Return the (image, text) canvas items for a row slot, creating them if needed."""
+        while len(self._rows) <= slot:
+            image_item = self.canvas.create_image(self.ROW_PADDING + self.THUMBNAIL_SIZE[0] // 2, 0,
+                                                  anchor=tk.CENTER)
+            text_item = self.canvas.create_text(self.THUMBNAIL_SIZE[0] + 3 * self.ROW_PADDING, 0,
+                                                anchor=tk.W)
+            self._rows.append((image_item, text_item))
+        return self._rows[slot]
+    
+    def refresh(self):
+        """Redraw the visible rows and ask for their thumbnails."""
+        top = int(self.canvas.canvasy(0))
+        first = max(0, top // self.row_height)
+        visible = self.canvas.winfo_height() // self.row_height + 2
+        wanted = []
+        
+        for slot in range(max(visible, len(self._rows))):
+            index = first + slot
+            if slot >= visible or index >= len(self.items):
+                if slot < len(self._rows):
+                    for item in self._rows[slot]:
+                        self.canvas.itemconfigure(item, state=tk.HIDDEN)
+                continue
+            
+            image_path = self.items[index]
+            image_item, text_item = self._row_items(slot)
+            middle = index * self.row_height + self.row_height // 2
+            self.canvas.coords(image_item, self.ROW_PADDING + self.THUMBNAIL_SIZE[0] // 2, middle)
+            self.canvas.coords(text_item, self.THUMBNAIL_SIZE[0] + 3 * self.ROW_PADDING, middle)
+            self.canvas.itemconfigure(text_item, state=tk.NORMAL,
+                                      text=f"{index + 1}. {os.path.basename(image_path)}")
+            
+            photo = self._photos.get(image_path)
+            if photo is not None:
+                self._photos.move_to_end(image_path)
+            elif image_path not in self._failed:
+                wanted.append(image_path)
+            self.canvas.itemconfigure(image_item, state=tk.NORMAL, image=photo if photo is not None else '')
+        
+        if wanted:
+            self._thumbnail_loader().request(wanted)
+    
+    def _thumbnail_loader(self):
+        """Start the background loader the first time a thumbnail is needed."""
+        if self._loader is None:
+            from thumbnail_cache import ThumbnailCache, ThumbnailLoader
+            
+            try:
+                cache = ThumbnailCache()
+            except OSError:
+                cache = None  # Unwritable cache directory: render every time
+            self._loader = ThumbnailLoader(lambda path, data: self._results.put((path, data)),
+                                           cache, self.THUMBNAIL_SIZE)
+        return self._loader
+    
+    def _poll(self):
+        """Turn finished thumbnails into photo images on the Tk thread."""
+        changed = False
+        while True:
+            try:
+                image_path, data = self._results.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if data is None:
+                self._failed.add(image_path)
+                continue
+            try:
+                self._photos[image_path] = tk.PhotoImage(data=base64.b64encode(data).decode('ascii'),
+                                                         format='png')
+            except tk.TclError:
+                self._failed.add(image_path)
+                continue
+            while len(self._photos) > self.CACHED_PHOTOS:
+                self._photos.popitem(last=False)
+        if changed:
+            self.refresh()
+        self.after(self.POLL_INTERVAL, self._poll)
+    
+    def destroy(self):
+        if self._loader is not None:
+            self._loader.close()
+        super().destroy()
 
 
 class ImageToPDFGUI:
@@ -32,12 +179,16 @@ class ImageToPDFGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Image to PDF Converter")
-        self.root.geometry("600x500")
+        self.root.geometry("700x650")
         self.root.resizable(True, True)
         
-        # Initialize the converter
-        self.converter = ImageToPDFConverter()
+        # Created with the chosen settings when a conversion starts
+        self.converter = None
+        # CancelToken of the running conversion, None while idle
+        self.cancel_token = None
         self.selected_images = []
+        # Set-backed index of selected_images for constant-time duplicate checks
+        self.selected_set = set()
         
         self.setup_ui()
     
@@ -71,19 +222,9 @@ class ImageToPDFGUI:
         ttk.Button(buttons_frame, text="Clear All", 
                   command=self.clear_images).pack(side=tk.LEFT, padx=5)
         
-        # Image list
-        list_frame = ttk.Frame(main_frame)
-        list_frame.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
-        list_frame.columnconfigure(0, weight=1)
-        list_frame.rowconfigure(0, weight=1)
-        
-        self.image_listbox = tk.Listbox(list_frame)
-        self.image_listbox.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # Scrollbar for listbox
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.image_listbox.yview)
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.image_listbox.configure(yscrollcommand=scrollbar.set)
+        # Image list with thumbnails, in page order
+        self.image_list = ThumbnailList(main_frame)
+        self.image_list.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
         
         # Options section
         options_frame = ttk.LabelFrame(main_frame, text="Options", padding="10")
@@ -132,10 +273,14 @@ class ImageToPDFGUI:
         
         self.convert_button = ttk.Button(convert_frame, text="Convert to PDF", 
                                         command=self.convert_images)
-        self.convert_button.pack()
+        self.convert_button.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.cancel_button = ttk.Button(convert_frame, text="Cancel", 
+                                       command=self.cancel_conversion, state='disabled')
+        self.cancel_button.pack(side=tk.LEFT)
         
         # Progress bar
-        self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
+        self.progress = ttk.Progressbar(main_frame, mode='determinate')
         self.progress.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
         
         # Status label
@@ -158,11 +303,7 @@ class ImageToPDFGUI:
             filetypes=filetypes
         )
         
-        for file in files:
-            if file not in self.selected_images:
-                self.selected_images.append(file)
-                self.image_listbox.insert(tk.END, os.path.basename(file))
-        
+        self._add_paths(files)
         self.update_status(f"Selected {len(self.selected_images)} images")
     
     def add_directory(self):
@@ -170,33 +311,33 @@ class ImageToPDFGUI:
         directory = filedialog.askdirectory(title="Select Directory with Images")
         
         if directory:
+            from image_to_pdf_converter import iter_image_files
+            
             # Find all image files in the directory
-            added_count = 0
-            for ext in self.converter.SUPPORTED_FORMATS:
-                for file_path in Path(directory).glob(f"*{ext}"):
-                    file_str = str(file_path)
-                    if file_str not in self.selected_images:
-                        self.selected_images.append(file_str)
-                        self.image_listbox.insert(tk.END, file_path.name)
-                        added_count += 1
-                
-                # Also check uppercase extensions
-                for file_path in Path(directory).glob(f"*{ext.upper()}"):
-                    file_str = str(file_path)
-                    if file_str not in self.selected_images:
-                        self.selected_images.append(file_str)
-                        self.image_listbox.insert(tk.END, file_path.name)
-                        added_count += 1
+            added_count = self._add_paths(iter_image_files(directory))
             
             if added_count > 0:
                 self.update_status(f"Added {added_count} images from directory")
             else:
                 messagebox.showinfo("Info", "No supported image files found in the selected directory.")
     
+    def _add_paths(self, paths) -> int:
+        """Append paths that are not selected yet and return how many were added."""
+        added_count = 0
+        for path in paths:
+            if path not in self.selected_set:
+                self.selected_set.add(path)
+                self.selected_images.append(path)
+                added_count += 1
+        if added_count:
+            self.image_list.set_items(self.selected_images)
+        return added_count
+    
     def clear_images(self):
         """Clear all selected images."""
         self.selected_images.clear()
-        self.image_listbox.delete(0, tk.END)
+        self.selected_set.clear()
+        self.image_list.set_items(self.selected_images)
         self.update_status("Cleared all images")
     
     def browse_output(self):
@@ -219,6 +360,36 @@ class ImageToPDFGUI:
     def update_status(self, message):
         """Update the status label."""
         self.status_var.set(message)
+    
+    # Minimum seconds between progress updates sent to the Tk thread
+    PROGRESS_INTERVAL = 0.1
+    
+    def _progress_callback(self):
+        """
+        Return a converter progress callback that forwards throttled updates
+        to the Tk thread.
+        """
+        last_update = [0.0]
+        
+        def callback(progress):
+            now = time.perf_counter()
+            if now - last_update[0] >= self.PROGRESS_INTERVAL or progress.done == progress.total:
+                last_update[0] = now
+                self.root.after(0, lambda: self.show_progress(progress))
+        
+        return callback
+    
+    def show_progress(self, progress):
+        """Show a ConversionProgress on the progress bar and status line."""
+        if self.cancel_token is None:
+            return  # A late update from a conversion that already ended
+        total = progress.total or len(self.selected_images)
+        self.progress.configure(maximum=max(total, progress.done, 1), value=progress.done)
+        message = f"Converting {progress.done}/{total} · {progress.pages_per_second:.1f} pages/s"
+        if progress.eta is not None:
+            minutes, seconds = divmod(int(round(progress.eta)), 60)
+            message += f" · ETA {minutes}:{seconds:02d}"
+        self.update_status(message)
         self.root.update_idletasks()
     
     def convert_images(self):
@@ -233,66 +404,88 @@ class ImageToPDFGUI:
             messagebox.showerror("Error", "Invalid margin value. Please enter a number.")
             return
         
+        from image_to_pdf_converter import CancelToken, ImageToPDFConverter
+        
         # Update converter settings
         self.converter = ImageToPDFConverter(
             page_size=self.page_size_var.get(),
-            margin=margin
+            margin=margin,
+            quiet=True
         )
+        self.cancel_token = CancelToken()
         
         # Start conversion in a separate thread
         self.convert_button.configure(state='disabled')
-        self.progress.start()
+        self.cancel_button.configure(state='normal')
+        self.progress.configure(maximum=len(self.selected_images), value=0)
+        self.update_status(f"Converting 0/{len(self.selected_images)}")
         
-        thread = threading.Thread(target=self._convert_thread)
+        thread = threading.Thread(target=self._convert_thread,
+                                  args=(list(self.selected_images), self.cancel_token))
         thread.daemon = True
         thread.start()
     
-    def _convert_thread(self):
-        """Convert images in a separate thread."""
+    def cancel_conversion(self):
+        """Stop the running conversion before its next image."""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.cancel_button.configure(state='disabled')
+            self.update_status("Cancelling...")
+    
+    def _convert_thread(self, image_paths, cancel_token):
+        """Convert images in a separate thread, using a worker process per CPU."""
+        from image_to_pdf_converter import ConversionCancelled
+        
+        # A pool is not worth starting for a single image
+        workers = 0 if len(image_paths) > 1 else 1
+        progress = self._progress_callback()
         try:
             if self.mode_var.get() == "single":
                 # Single PDF mode
                 output_path = self.output_var.get() or "converted_images.pdf"
-                self.converter.convert_multiple_images(self.selected_images, output_path)
+                self.converter.convert_multiple_images(image_paths, output_path, workers=workers,
+                                                       progress=progress, cancel=cancel_token)
                 self.root.after(0, lambda: self.conversion_complete(f"Created: {output_path}"))
             
             else:
                 # Separate PDFs mode
                 output_dir = self.output_var.get() or os.getcwd()
-                created_files = []
-                
-                for i, image_path in enumerate(self.selected_images):
-                    try:
-                        output_name = Path(image_path).stem + '.pdf'
-                        output_path = os.path.join(output_dir, output_name)
-                        self.converter.convert_single_image(image_path, output_path)
-                        created_files.append(output_path)
-                        
-                        # Update progress
-                        progress_msg = f"Converting {i+1}/{len(self.selected_images)}: {Path(image_path).name}"
-                        self.root.after(0, lambda msg=progress_msg: self.update_status(msg))
-                    
-                    except Exception as e:
-                        print(f"Error converting {image_path}: {e}")
-                
-                completion_msg = f"Conversion completed! Created {len(created_files)} PDF files."
+                results = self.converter.convert_images(image_paths, output_dir, workers=workers,
+                                                        progress=progress, cancel=cancel_token)
+                created = sum(1 for _, pdf_path, _ in results if pdf_path)
+                completion_msg = f"Conversion completed! Created {created} PDF files."
                 self.root.after(0, lambda: self.conversion_complete(completion_msg))
         
+        except ConversionCancelled:
+            self.root.after(0, self.conversion_cancelled)
+        
         except Exception as e:
             error_msg = f"Conversion failed: {str(e)}"
             self.root.after(0, lambda: self.conversion_error(error_msg))
     
+    def _conversion_ended(self):
+        """Return the buttons to their idle state."""
+        self.cancel_token = None
+        self.convert_button.configure(state='normal')
+        self.cancel_button.configure(state='disabled')
+    
     def conversion_complete(self, message):
         """Handle successful conversion completion."""
-        self.progress.stop()
-        self.convert_button.configure(state='normal')
+        self._conversion_ended()
+        self.progress.configure(value=self.progress['maximum'])
         self.update_status(message)
         messagebox.showinfo("Success", message)
     
+    def conversion_cancelled(self):
+        """Handle a conversion stopped with the Cancel button."""
+        self._conversion_ended()
+        self.progress.configure(value=0)
+        self.update_status("Conversion cancelled")
+    
     def conversion_error(self, message):
         """Handle conversion error."""
-        self.progress.stop()
-        self.convert_button.configure(state='normal')
+        self._conversion_ended()
+        self.progress.configure(value=0)
         self.update_status("Conversion failed")
         messagebox.showerror("Error", message)
 
@@ -300,9 +493,20 @@ class ImageToPDFGUI:
 def main():
     """Main function to run the GUI application."""
     root = tk.Tk()
+    missing = missing_packages()
+    if missing:
+        root.withdraw()
+        messagebox.showerror("Import Error",
+                           f"Required packages not found: {', '.join(missing)}\n\n"
+                           "Please install: pip install Pillow reportlab")
+        sys.exit(1)
     app = ImageToPDFGUI(root)
     root.mainloop()
 
 
 if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # Needed for worker processes in frozen (PyInstaller) Windows builds
+        import multiprocessing
+        multiprocessing.freeze_support()
     main() 
\ No newline at end of file
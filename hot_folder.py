@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Hot Folder Watcher
+Polls a drop directory and converts images as they arrive, using a single
+long-lived converter so start-up costs are paid once rather than per run.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from image_to_pdf_converter import ImageToPDFConverter
+
+
+class HotFolderWatcher:
+    """
+    Convert images dropped into a directory, in small batches.
+
+    A file is considered finished once its size and modification time have
+    not changed for ``settle_time`` seconds, which works on every platform and
+    for files copied over the network. Finished files are collected into a
+    batch that is converted ``batch_window`` seconds after its first file
+    became ready, so a burst of arrivals is handled in one go.
+
+    Directory listings are kept between scans and read again only when the
+    directory's mtime changes, and converted files are not stat'ed again
+    while their directory is unchanged. Every ``FULL_SCAN_INTERVAL`` seconds
+    everything is listed and stat'ed anyway, which catches converted files
+    overwritten in place.
+    """
+
+    FULL_SCAN_INTERVAL = 30.0
+
+    # A listing taken this soon after its directory's mtime may have missed
+    # a file created within the same timestamp tick, so it is not reused
+    # (2 s covers the coarsest filesystem timestamps)
+    MTIME_RESOLUTION = 2.0
+
+    def __init__(self, converter: ImageToPDFConverter, directory: str, output_dir: str = None,
+                 poll_interval: float = 0.25, settle_time: float = 0.5,
+                 batch_window: float = 0.5, recursive: bool = False,
+                 merge: bool = False, workers: int = 1):
+        """
+        Initialize the watcher.
+
+        Args:
+            converter (ImageToPDFConverter): Converter reused for every batch
+            directory (str): Directory to watch
+            output_dir (str): Output directory for PDFs (optional, defaults to
+                the watched directory)
+            poll_interval (float): Seconds between directory scans
+            settle_time (float): Seconds a file must stay unchanged before it
+                is converted
+            batch_window (float): Seconds to keep collecting ready files
+                before converting them as one batch
+            recursive (bool): Also watch subdirectories
+            merge (bool): Merge each batch into one PDF instead of creating a
+                PDF per image
+            workers (int): Worker processes used for each batch
+        """
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+
+        self.converter = converter
+        self.directory = directory
+        self.output_dir = output_dir or directory
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.batch_window = batch_window
+        self.recursive = recursive
+        self.merge = merge
+        self.workers = workers
+
+        # path -> (size, mtime_ns, time the signature was first seen)
+        self._observed: Dict[str, Tuple[int, int, float]] = {}
+        # path -> (size, mtime_ns) of the version that was converted
+        self._converted: Dict[str, Tuple[int, int]] = {}
+        # directory -> (mtime_ns, time listed, image paths, subdirectories)
+        self._listings: Dict[str, Tuple[int, float, List[str], List[str]]] = {}
+        self._last_full_scan: Optional[float] = None
+        self._batch: List[str] = []
+        self._batch_started: Optional[float] = None
+        self._batch_count = 0
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def poll(self, now: float = None) -> List[str]:
+        """
+        Scan the directory once and return files that have just become ready.
+
+        Args:
+            now (float): Current monotonic time (optional)
+
+        Returns:
+            List[str]: Paths whose size and mtime have settled and that have
+            not been converted in their current version
+        """
+        if now is None:
+            now = time.monotonic()
+
+        full = self._last_full_scan is None or now - self._last_full_scan >= self.FULL_SCAN_INTERVAL
+        if full:
+            self._last_full_scan = now
+
+        ready = []
+        present = set()
+        for image_path, listed in self._scan(full):
+            present.add(image_path)
+            if image_path in self._converted and not listed:
+                # Unchanged directory; an in-place overwrite waits for a full scan
+                continue
+            try:
+                stat = os.stat(image_path)
+            except OSError:
+                # Removed between listing and stat
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._converted.get(image_path) == signature or image_path in self._batch:
+                continue
+
+            observed = self._observed.get(image_path)
+            if observed is None or observed[:2] != signature:
+                self._observed[image_path] = signature + (now,)
+            elif now - observed[2] >= self.settle_time and stat.st_size > 0:
+                ready.append(image_path)
+                del self._observed[image_path]
+
+        # Forget files that disappeared, settled or not
+        for paths in (self._observed, self._converted):
+            for image_path in [path for path in paths if path not in present]:
+                del paths[image_path]
+        return ready
+
+    def _scan(self, full: bool) -> List[Tuple[str, bool]]:
+        """
+        List the image files being watched.
+
+        Args:
+            full (bool): Read every directory again instead of reusing the
+                listings of unchanged ones
+
+        Returns:
+            List[Tuple[str, bool]]: ``(image_path, listed)`` for every image,
+            where ``listed`` is True if its directory was read again
+        """
+        images = []
+        listings = {}
+        directories = [self.directory]
+        while directories:
+            directory = directories.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            listing = self._listings.get(directory)
+            listed = (full or listing is None or listing[0] != mtime_ns
+                      or listing[1] - mtime_ns / 1e9 < self.MTIME_RESOLUTION)
+            if listed:
+                listing = self._list_directory(directory, mtime_ns)
+                if listing is None:
+                    continue
+            listings[directory] = listing
+            images.extend((image_path, listed) for image_path in listing[2])
+            if self.recursive:
+                directories.extend(listing[3])
+        # Directories that were removed are dropped along the way
+        self._listings = listings
+        return images
+
+    def _list_directory(self, directory: str, mtime_ns: int) -> Optional[Tuple[int, float, List[str], List[str]]]:
+        """Read one directory, returning its listing or None if it has gone."""
+        listed_at = time.time()
+        image_paths, subdirectories = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and self.converter.is_supported_format(entry.name):
+                        image_paths.append(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+        except OSError:
+            return None
+        return mtime_ns, listed_at, image_paths, subdirectories
+
+    def _batch_output_path(self) -> str:
+        self._batch_count += 1
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.output_dir, f"batch-{stamp}-{self._batch_count:04d}.pdf")
+
+    def flush(self) -> List[str]:
+        """
+        Convert the files collected so far.
+
+        Returns:
+            List[str]: Paths of the PDFs created
+        """
+        batch, self._batch, self._batch_started = self._batch, [], None
+        if not batch:
+            return []
+
+        signatures = {}
+        for image_path in batch:
+            try:
+                stat = os.stat(image_path)
+                signatures[image_path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                signatures[image_path] = None
+
+        created = []
+        if self.merge:
+            try:
+                created.append(self.converter.convert_multiple_images(
+                    batch, self._batch_output_path(), workers=self.workers))
+            except Exception as e:
+                print(f"✗ Error converting batch of {len(batch)} images: {e}")
+        else:
+            # Subdirectories are mirrored so equal names in different ones do not collide
+            results = self.converter.convert_images(batch, self.output_dir, workers=self.workers,
+                                                    source_dir=self.directory)
+            created = [output_pdf for _, output_pdf, error in results if error is None]
+
+        # Failed files are not retried until they change again
+        for image_path, signature in signatures.items():
+            if signature is not None:
+                self._converted[image_path] = signature
+        return created
+
+    def step(self, now: float = None) -> List[str]:
+        """
+        Poll once and convert the current batch if its window has elapsed.
+
+        Returns:
+            List[str]: Paths of the PDFs created in this step
+        """
+        if now is None:
+            now = time.monotonic()
+
+        ready = self.poll(now)
+        if ready:
+            if self._batch_started is None:
+                self._batch_started = now
+            self._batch.extend(ready)
+
+        if self._batch and now - self._batch_started >= self.batch_window:
+            return self.flush()
+        return []
+
+    def run(self, stop_event: threading.Event = None):
+        """
+        Watch the directory until interrupted or ``stop_event`` is set.
+
+        Files still waiting in a batch are converted before returning.
+        """
+        stop_event = stop_event or threading.Event()
+        print(f"Watching {self.directory} (Ctrl+C to stop)...")
+        try:
+            while not stop_event.is_set():
+                self.step()
+                stop_event.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.flush()
+        print("Stopped watching.")
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Image Probe
+Reads image dimensions, colour mode and resolution from file headers without
+decoding any pixel data, and caches the results per file version.
+"""
+
+import os
+import struct
+from collections import OrderedDict
+from typing import BinaryIO, NamedTuple, Optional, Tuple
+
+
+class ImageInfo(NamedTuple):
+    """Header-level facts about an image file."""
+    format: str
+    width: int
+    height: int
+    mode: str
+    dpi: Optional[Tuple[float, float]] = None
+    bits: int = 8
+    encoding: Optional[str] = None
+
+
+# JPEG start-of-frame markers mapped to the coding process they announce
+JPEG_SOF_ENCODINGS = {
+    0xC0: 'baseline',
+    0xC1: 'extended',
+    0xC2: 'progressive',
+    0xC3: 'lossless',
+    0xC5: 'differential-sequential',
+    0xC6: 'differential-progressive',
+    0xC7: 'differential-lossless',
+    0xC9: 'arithmetic-extended',
+    0xCA: 'arithmetic-progressive',
+    0xCB: 'arithmetic-lossless',
+    0xCD: 'arithmetic-differential-sequential',
+    0xCE: 'arithmetic-differential-progressive',
+    0xCF: 'arithmetic-differential-lossless',
+}
+
+JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+PNG_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+
+TIFF_COMPRESSIONS = {
+    1: 'raw',
+    2: 'group3-1d',
+    3: 'group3',
+    4: 'group4',
+    5: 'lzw',
+    6: 'jpeg-old',
+    7: 'jpeg',
+    8: 'deflate',
+    32773: 'packbits',
+    32946: 'deflate',
+}
+
+# TIFF field types we read values from, as (struct format, size in bytes)
+TIFF_FIELD_TYPES = {
+    1: ('B', 1),   # BYTE
+    3: ('H', 2),   # SHORT
+    4: ('I', 4),   # LONG
+    5: ('II', 8),  # RATIONAL
+}
+
+
+def _probe_jpeg(f: BinaryIO) -> Optional[ImageInfo]:
+    """Walk JPEG marker segments up to the start-of-frame header."""
+    f.seek(2)
+    dpi = None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            return None
+        marker = f.read(1)
+        while marker == b'\xff':
+            # Fill bytes before the real marker
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Markers without a length field
+            continue
+        if marker == 0xDA:
+            # Start of scan reached without a frame header
+            return None
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        segment_length = struct.unpack('>H', length_bytes)[0]
+
+        if marker in JPEG_SOF_ENCODINGS:
+            frame = f.read(6)
+            if len(frame) < 6:
+                return None
+            precision, height, width, components = struct.unpack('>BHHB', frame)
+            return ImageInfo('JPEG', width, height, JPEG_MODES.get(components, 'unknown'),
+                             dpi, precision, JPEG_SOF_ENCODINGS[marker])
+
+        if marker == 0xE0 and segment_length >= 14:
+            segment = f.read(segment_length - 2)
+            if segment[:5] == b'JFIF\x00':
+                units, x_density, y_density = struct.unpack('>BHH', segment[7:12])
+                if units == 1 and x_density and y_density:
+                    dpi = (float(x_density), float(y_density))
+                elif units == 2 and x_density and y_density:
+                    dpi = (x_density * 2.54, y_density * 2.54)
+            continue
+
+        f.seek(segment_length - 2, os.SEEK_CUR)
+
+
+def _probe_png(f: BinaryIO) -> Optional[ImageInfo]:
+    """Read the PNG IHDR chunk and any pHYs chunk ahead of the image data."""
+    f.seek(8)
+    chunk_header = f.read(8)
+    if len(chunk_header) < 8 or chunk_header[4:] != b'IHDR':
+        return None
+    ihdr = f.read(13)
+    if len(ihdr) < 13:
+        return None
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', ihdr[:10])
+    interlace = ihdr[12]
+    f.seek(4, os.SEEK_CUR)  # IHDR CRC
+
+    mode = PNG_MODES.get(color_type, 'unknown')
+    if color_type == 0 and bit_depth == 1:
+        mode = '1'
+    elif color_type == 0 and bit_depth == 16:
+        mode = 'I;16'
+
+    dpi = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_length = struct.unpack('>I', chunk_header[:4])[0]
+        chunk_type = chunk_header[4:]
+        if chunk_type in (b'IDAT', b'IEND'):
+            break
+        if chunk_type == b'tRNS' and mode in ('L', 'RGB'):
+            # A transparent colour key turns these into alpha images in Pillow
+            mode = 'LA' if mode == 'L' else 'RGBA'
+        if chunk_type == b'pHYs' and chunk_length == 9:
+            x_ppu, y_ppu, unit = struct.unpack('>IIB', f.read(9))
+            if unit == 1 and x_ppu and y_ppu:
+                dpi = (x_ppu * 0.0254, y_ppu * 0.0254)
+            f.seek(4, os.SEEK_CUR)
+            continue
+        f.seek(chunk_length + 4, os.SEEK_CUR)
+
+    return ImageInfo('PNG', width, height, mode, dpi, bit_depth,
+                     'deflate-interlaced' if interlace else 'deflate')
+
+
+def _probe_gif(f: BinaryIO) -> Optional[ImageInfo]:
+    """Read the GIF logical screen descriptor."""
+    f.seek(6)
+    screen = f.read(4)
+    if len(screen) < 4:
+        return None
+    width, height = struct.unpack('<HH', screen)
+    return ImageInfo('GIF', width, height, 'P', None, 8, 'lzw')
+
+
+def _probe_bmp(f: BinaryIO) -> Optional[ImageInfo]:
+    """Read the BMP DIB header."""
+    f.seek(14)
+    header = f.read(40)
+    if len(header) < 12:
+        return None
+    header_size = struct.unpack('<I', header[:4])[0]
+    if header_size == 12:
+        width, height, _, bits = struct.unpack('<HHHH', header[4:12])
+        dpi = None
+    elif header_size >= 40 and len(header) >= 40:
+        width, height, _, bits = struct.unpack('<iiHH', header[4:16])
+        x_ppm, y_ppm = struct.unpack('<ii', header[24:32])
+        dpi = (x_ppm * 0.0254, y_ppm * 0.0254) if x_ppm > 0 and y_ppm > 0 else None
+    else:
+        return None
+
+    if bits == 1:
+        mode = '1'
+    elif bits <= 8:
+        mode = 'P'
+    elif bits == 32:
+        mode = 'RGBA'
+    else:
+        mode = 'RGB'
+    # Negative heights mark top-down bitmaps
+    return ImageInfo('BMP', abs(width), abs(height), mode, dpi, min(bits, 8), 'raw')
+
+
+def _probe_webp(f: BinaryIO) -> Optional[ImageInfo]:
+    """Read the first WebP chunk (VP8, VP8L or VP8X)."""
+    f.seek(12)
+    chunk = f.read(18)
+    if len(chunk) < 18:
+        return None
+    chunk_type = chunk[:4]
+    payload = chunk[8:]
+
+    if chunk_type == b'VP8X':
+        flags = payload[0]
+        width = int.from_bytes(payload[4:7], 'little') + 1
+        height = int.from_bytes(payload[7:10], 'little') + 1
+        mode = 'RGBA' if flags & 0x10 else 'RGB'
+        encoding = 'animated' if flags & 0x02 else 'extended'
+        return ImageInfo('WEBP', width, height, mode, None, 8, encoding)
+    if chunk_type == b'VP8 ':
+        if payload[3:6] != b'\x9d\x01\x2a':
+            return None
+        width, height = struct.unpack('<HH', payload[6:10])
+        return ImageInfo('WEBP', width & 0x3FFF, height & 0x3FFF, 'RGB', None, 8, 'lossy')
+    if chunk_type == b'VP8L':
+        if payload[0] != 0x2F:
+            return None
+        bits = int.from_bytes(payload[1:5], 'little')
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        mode = 'RGBA' if (bits >> 28) & 1 else 'RGB'
+        return ImageInfo('WEBP', width, height, mode, None, 8, 'lossless')
+    return None
+
+
+def _probe_tiff(f: BinaryIO, byte_order: str) -> Optional[ImageInfo]:
+    """Read the tags of the first TIFF image file directory."""
+    f.seek(4)
+    ifd_offset = struct.unpack(byte_order + 'I', f.read(4))[0]
+    f.seek(ifd_offset)
+    count_bytes = f.read(2)
+    if len(count_bytes) < 2:
+        return None
+    entry_count = struct.unpack(byte_order + 'H', count_bytes)[0]
+    entries = f.read(entry_count * 12)
+
+    tags = {}
+    for i in range(entry_count):
+        entry = entries[i * 12:(i + 1) * 12]
+        if len(entry) < 12:
+            break
+        tag, field_type, count = struct.unpack(byte_order + 'HHI', entry[:8])
+        if field_type not in TIFF_FIELD_TYPES:
+            continue
+        value_format, value_size = TIFF_FIELD_TYPES[field_type]
+        if value_size * count <= 4:
+            tags[tag] = struct.unpack(byte_order + value_format, entry[8:8 + value_size])
+        elif tag in (258, 282, 283):
+            # Values stored out of line; only the first one is needed
+            position = f.tell()
+            f.seek(struct.unpack(byte_order + 'I', entry[8:12])[0])
+            tags[tag] = struct.unpack(byte_order + value_format, f.read(value_size))
+            f.seek(position)
+
+    if 256 not in tags or 257 not in tags:
+        return None
+    width, height = tags[256][0], tags[257][0]
+    bits = tags.get(258, (1,))[0]
+    samples = tags.get(277, (1,))[0]
+    photometric = tags.get(262, (None,))[0]
+    compression = TIFF_COMPRESSIONS.get(tags.get(259, (1,))[0], 'unknown')
+
+    if photometric in (0, 1):
+        mode = {1: '1', 8: 'L', 16: 'I;16'}.get(bits, 'L')
+        if samples == 2:
+            mode = 'LA'
+    elif photometric == 3:
+        mode = 'P'
+    elif photometric == 5:
+        mode = 'CMYK'
+    elif photometric in (2, 6):
+        mode = 'RGBA' if samples == 4 else 'RGB'
+    else:
+        mode = 'unknown'
+
+    dpi = None
+    if 282 in tags and 283 in tags:
+        x_res = tags[282][0] / tags[282][1] if tags[282][1] else 0
+        y_res = tags[283][0] / tags[283][1] if tags[283][1] else 0
+        unit = tags.get(296, (2,))[0]
+        if x_res and y_res and unit in (2, 3):
+            scale = 2.54 if unit == 3 else 1
+            dpi = (x_res * scale, y_res * scale)
+
+    return ImageInfo('TIFF', width, height, mode, dpi, bits, compression)
+
+
+def _probe_with_pillow(f: BinaryIO) -> ImageInfo:
+    """Fall back to Pillow, which also only parses headers on open."""
+    # Imported here so that probing common formats never loads Pillow
+    from PIL import Image
+
+    f.seek(0)
+    with Image.open(f) as img:
+        dpi = img.info.get('dpi')
+        return ImageInfo(img.format or 'unknown', img.width, img.height, img.mode,
+                         tuple(float(d) for d in dpi) if dpi else None)
+
+
+def probe_image(source) -> ImageInfo:
+    """
+    Read image metadata from the file header without decoding pixels.
+
+    JPEG, PNG, GIF, BMP, WebP and TIFF headers are parsed directly; anything
+    else (or a header these parsers do not understand) is handed to Pillow.
+
+    Args:
+        source: Path to the image file, or a seekable binary file object
+            whose first byte is the start of the image
+
+    Returns:
+        ImageInfo: Format, size, mode, resolution and encoding of the image
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        return _probe_stream(source)
+    with open(source, 'rb') as f:
+        try:
+            return _probe_stream(f)
+        except OSError as e:
+            from PIL import UnidentifiedImageError
+            if not isinstance(e, UnidentifiedImageError):
+                raise
+            # Name the file rather than the file object in the message
+            raise UnidentifiedImageError(
+                f"cannot identify image file {os.fspath(source)!r}") from None
+
+
+def _probe_stream(f: BinaryIO) -> ImageInfo:
+    """Probe an open image file from its first byte."""
+    info = None
+    f.seek(0)
+    signature = f.read(16)
+    try:
+        if signature[:2] == b'\xff\xd8':
+            info = _probe_jpeg(f)
+        elif signature[:8] == b'\x89PNG\r\n\x1a\n':
+            info = _probe_png(f)
+        elif signature[:6] in (b'GIF87a', b'GIF89a'):
+            info = _probe_gif(f)
+        elif signature[:2] == b'BM':
+            info = _probe_bmp(f)
+        elif signature[:4] == b'RIFF' and signature[8:12] == b'WEBP':
+            info = _probe_webp(f)
+        elif signature[:4] == b'II*\x00':
+            info = _probe_tiff(f, '<')
+        elif signature[:4] == b'MM\x00*':
+            info = _probe_tiff(f, '>')
+    except struct.error:
+        info = None
+
+    if info is None or info.width <= 0 or info.height <= 0:
+        info = _probe_with_pillow(f)
+    return info
+
+
+class ProbeCache:
+    """LRU cache of probe results keyed by path, modification time and size."""
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Number of files to remember before evicting the
+                least recently used one
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, image_path: str) -> ImageInfo:
+        """
+        Return the probe result for a file, probing it only if it changed.
+
+        Args:
+            image_path (str): Path to the image file
+
+        Returns:
+            ImageInfo: Cached or freshly probed image metadata
+        """
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        info = self._entries.get(key)
+        if info is not None:
+            self._entries.move_to_end(key)
+            return info
+
+        info = probe_image(image_path)
+        self._entries[key] = info
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return info
+
+    def clear(self):
+        """Forget every cached result."""
+        self._entries.clear()
@@ -8,19 +8,187 @@ Supports single image conversion and batch conversion of multiple images.
 import os
 import sys
 import argparse
-from pathlib import Path
-from typing import List, Tuple
-import glob
+import importlib.util
+import io
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+import re
+
+# Pillow and reportlab are imported where a conversion first needs them, so
+# that --help and start-up stay fast; here we only check they are installed.
+for _package in ('PIL', 'reportlab'):
+    if importlib.util.find_spec(_package) is None:
+        print(f"Error importing required packages: No module named '{_package}'")
+        print("Please install required packages: pip install Pillow reportlab")
+        sys.exit(1)
+
+from batch_manifest import ConversionManifest
+from conversion_metrics import ConversionMetrics
+from image_probe import ImageInfo, ProbeCache, probe_image
+from memory_budget import (BAND_BYTES, MemoryBudget, PngBands, TiffBands, check_decode_size,
+                           decoded_size, open_bands, open_image)
+from pdf_backends import BACKENDS, DEFAULT_BACKEND, DirectBackend, PDFBackend
+from pdf_writer import (PDFImage, encode_bilevel_image, encode_jpeg_image, encode_pil_bands,
+                        encode_pil_image, extract_png_image, is_grayscale, reduce_bands,
+                        reduce_color_type, reduced_band_mode, resample_image)
+
+
+# JPEG coding processes that PDF's DCTDecode filter can decode
+DCT_PASSTHROUGH_ENCODINGS = {'baseline', 'extended', 'progressive'}
+
+# Page sizes in points (the values of reportlab.lib.pagesizes)
+PAGE_SIZES = {
+    'A4': (595.2755905511812, 841.8897637795277),
+    'LETTER': (612.0, 792.0),
+}
+
+
+def natural_sort_key(name: str) -> list:
+    """
+    Sort key that orders embedded numbers by value, so that 'page2' sorts
+    before 'page10'. Comparison is case-insensitive.
+    """
+    return [int(part) if part.isdigit() else part
+            for part in re.split(r'(\d+)', name.casefold())]
+
+
+def iter_image_files(directory_path: str, recursive: bool = False, sort: bool = True):
+    """
+    Yield the paths of supported image files in a directory.
+    
+    Each directory is read once with os.scandir and every file is reported
+    exactly once, whatever the case of its extension. Symlinked
+    subdirectories are not followed.
+    
+    Args:
+        directory_path (str): Directory to search
+        recursive (bool): Also search subdirectories (depth-first)
+        sort (bool): Yield files and subdirectories in natural order. This
+            needs one directory's entries in memory at a time; without it,
+            paths are streamed in the order the filesystem returns them
+            
+    Yields:
+        str: Path of each image file
+    """
+    supported = ImageToPDFConverter.SUPPORTED_FORMATS
+    
+    with os.scandir(directory_path) as entries:
+        if sort:
+            entries = sorted(entries, key=lambda entry: natural_sort_key(entry.name))
+        subdirectories = []
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in supported:
+                yield entry.path
+            elif recursive and entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+    
+    for subdirectory in subdirectories:
+        yield from iter_image_files(subdirectory, recursive, sort)
+
+
+def _is_pil_image(obj) -> bool:
+    """Check for a PIL image without importing Pillow (a PIL image implies it is loaded)."""
+    pil_image = sys.modules.get('PIL.Image')
+    return pil_image is not None and isinstance(obj, pil_image.Image)
+
+
+def _frame_label(image_path: str, frame: int) -> str:
+    """Name one frame of a multi-frame image in progress output and metrics."""
+    return f"{image_path} (frame {frame + 1})"
+
+
+def _embedded_size(pdf_image: PDFImage) -> int:
+    """Bytes of image data a PDFImage embeds, its soft mask included."""
+    return len(pdf_image.data) + (len(pdf_image.smask.data) if pdf_image.smask is not None else 0)
+
+
+def _smaller_image(pdf_image: PDFImage, original: Optional[PDFImage]) -> PDFImage:
+    """Return ``original`` if there is one and it embeds no more data than ``pdf_image``."""
+    if original is not None and _embedded_size(original) <= _embedded_size(pdf_image):
+        return original
+    return pdf_image
 
-try:
-    from PIL import Image
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib.utils import ImageReader
-except ImportError as e:
-    print(f"Error importing required packages: {e}")
-    print("Please install required packages: pip install Pillow reportlab")
-    sys.exit(1)
+
+class ConversionCancelled(Exception):
+    """Raised by a conversion that was stopped through its CancelToken."""
+
+
+class CancelToken:
+    """
+    Thread-safe flag for stopping a running conversion.
+    
+    Pass the token to a conversion method and call cancel() from any other
+    thread. The conversion stops before its next image, discards a PDF it
+    was still writing and raises ConversionCancelled.
+    """
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        """Ask the conversion to stop."""
+        self._event.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancel() has been called."""
+        return self._event.is_set()
+    
+    def raise_if_cancelled(self):
+        """Raise ConversionCancelled if cancel() has been called."""
+        if self._event.is_set():
+            raise ConversionCancelled("Conversion cancelled")
+
+
+class ConversionProgress(NamedTuple):
+    """Progress of a conversion, passed to progress callbacks after each page or file."""
+    done: int
+    total: Optional[int]  # None while the total is unknown
+    path: str  # Image (or frame) that just finished
+    elapsed: float  # Seconds since the conversion started
+    
+    @property
+    def pages_per_second(self) -> float:
+        """Average throughput so far."""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+    
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until the conversion finishes, if the total is known."""
+        if self.total is None or not self.done:
+            return None
+        return (self.total - self.done) * self.elapsed / self.done
+
+
+class _ProgressTracker:
+    """Count finished pages or files for a progress callback and check the cancel token."""
+    
+    def __init__(self, total: Optional[int], callback: Callable[[ConversionProgress], None] = None,
+                 cancel: CancelToken = None):
+        self.total = total
+        self.callback = callback
+        self.cancel = cancel
+        self.done = 0
+        self._start = time.perf_counter()
+    
+    def check(self):
+        """Raise ConversionCancelled if the conversion has been cancelled."""
+        if self.cancel is not None:
+            self.cancel.raise_if_cancelled()
+    
+    def advance(self, path: str):
+        """Record one finished page or file."""
+        self.done += 1
+        if self.callback is not None:
+            self.callback(ConversionProgress(self.done, self.total, path,
+                                             time.perf_counter() - self._start))
+    
+    def iter_checked(self, items):
+        """Yield items, checking for cancellation before each one."""
+        for item in items:
+            self.check()
+            yield item
 
 
 class ImageToPDFConverter:
@@ -28,25 +196,121 @@ class ImageToPDFConverter:
     
     SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.gif', '.webp'}
     
-    def __init__(self, page_size='A4', margin=50):
+    # Encoded pages allowed in flight per worker when merging in parallel
+    PIPELINE_QUEUE_PER_WORKER = 2
+    
+    # Default JPEG quality used when a JPEG has to be re-encoded, e.g. after downsampling
+    DOWNSAMPLE_JPEG_QUALITY = 85
+    
+    # Probed formats accepted from in-memory sources, which have no extension
+    SUPPORTED_DATA_FORMATS = {'JPEG', 'PNG', 'BMP', 'TIFF', 'GIF', 'WEBP'}
+    
+    # Formats whose extra frames become extra pages with all_frames
+    MULTI_FRAME_FORMATS = {'TIFF', 'GIF', 'WEBP'}
+    
+    def __init__(self, page_size='A4', margin=50, jpeg_passthrough=True, target_dpi=None,
+                 all_frames=False, png_passthrough=True, backend=DEFAULT_BACKEND,
+                 optimize=False, flate_level=6, jpeg_quality=DOWNSAMPLE_JPEG_QUALITY,
+                 memory_budget: int = None, quiet=False, metrics: ConversionMetrics = None):
         """
         Initialize the converter.
         
         Args:
             page_size (str): Page size ('A4' or 'Letter')
             margin (int): Margin in points
+            jpeg_passthrough (bool): Embed baseline/progressive JPEGs as-is
+                instead of decoding and re-encoding them
+            target_dpi (float): Downsample images whose resolution on the page
+                exceeds this many dots per inch (optional)
+            all_frames (bool): Give every frame of multi-page TIFFs and
+                animated GIF/WebP files its own page instead of using only
+                the first frame
+            png_passthrough (bool): Embed the compressed data of eligible
+                PNGs as-is instead of decoding and re-compressing it
+            backend (str): PDF backend from pdf_backends.BACKENDS:
+                'reportlab' (default) or 'direct', the built-in writer
+            optimize (bool): Detect images that are really grayscale or
+                black and white (such as scanned paperwork saved as colour
+                JPEG/PNG) and embed them as 8-bit gray or 1-bit CCITT
+                Group 4/Flate images
+            flate_level (int): zlib compression level (0-9) for
+                Flate-encoded images
+            jpeg_quality (int): JPEG quality (1-95) for images that are
+                re-encoded as JPEG
+            memory_budget (int): Bytes of decoded image data to hold at
+                once (optional). Parallel conversions only start images
+                while the decoded sizes of those in flight, estimated from
+                their headers, fit the budget. Larger images are decoded
+                in bands if they are TIFFs with several strips or tiles
+                or non-interlaced PNGs (other than 16-bit colour), and
+                JPEGs at the largest DCT scale (1/2 to 1/8) that fits,
+                keeping their place on the page. Anything else, and JPEGs
+                too large even at 1/8, is decoded whole with nothing else
+                in flight. With or without a budget, TIFFs and PNGs over
+                Pillow's decompression-bomb limit are decoded in bands too
+            quiet (bool): Do not print a line for every converted image;
+                errors and summaries are still printed
+            metrics (ConversionMetrics): Receives stage timings and per-file
+                events (optional, a private instance is used otherwise)
         """
-        self.page_size = A4 if page_size.upper() == 'A4' else letter
+        self.page_size_name = page_size
+        self.page_size = PAGE_SIZES['A4'] if page_size.upper() == 'A4' else PAGE_SIZES['LETTER']
         self.margin = margin
+        self.jpeg_passthrough = jpeg_passthrough
+        self.target_dpi = target_dpi
+        self.all_frames = all_frames
+        self.png_passthrough = png_passthrough
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {backend}")
+        self.backend = backend
+        if not 0 <= flate_level <= 9:
+            raise ValueError(f"Flate level must be between 0 and 9: {flate_level}")
+        if not 1 <= jpeg_quality <= 95:
+            raise ValueError(f"JPEG quality must be between 1 and 95: {jpeg_quality}")
+        self.optimize = optimize
+        self.flate_level = flate_level
+        self.jpeg_quality = jpeg_quality
+        if memory_budget is not None and memory_budget < 1:
+            raise ValueError(f"Memory budget must be positive: {memory_budget}")
+        self.memory_budget = memory_budget
+        self.quiet = quiet
+        self.metrics = metrics if metrics is not None else ConversionMetrics()
+        self.probe_cache = ProbeCache()
+    
+    def _worker_options(self) -> dict:
+        """Return the constructor arguments needed to rebuild this converter in a worker process."""
+        return {'page_size': self.page_size_name, 'margin': self.margin,
+                'jpeg_passthrough': self.jpeg_passthrough, 'target_dpi': self.target_dpi,
+                'all_frames': self.all_frames, 'png_passthrough': self.png_passthrough,
+                'backend': self.backend, 'optimize': self.optimize,
+                'flate_level': self.flate_level, 'jpeg_quality': self.jpeg_quality,
+                'memory_budget': self.memory_budget}
         
+    def _output_options(self) -> dict:
+        """Return the options that affect the PDFs produced, for telling whether earlier output is still valid."""
+        options = self._worker_options()
+        # The backend and memory budget change how pages are written, not what they look like
+        del options['backend'], options['memory_budget']
+        return options
+    
+    def _log(self, message: str):
+        """Print a per-image progress line unless running quietly."""
+        if not self.quiet:
+            print(message)
+    
     def is_supported_format(self, file_path: str) -> bool:
         """Check if the file format is supported."""
-        return Path(file_path).suffix.lower() in self.SUPPORTED_FORMATS
+        return os.path.splitext(file_path)[1].lower() in self.SUPPORTED_FORMATS
+    
+    def get_image_info(self, image_path: str) -> ImageInfo:
+        """Get header-level image metadata, probing each file version only once."""
+        with self.metrics.stage('probe'):
+            return self.probe_cache.get(image_path)
     
     def get_image_dimensions(self, image_path: str) -> Tuple[int, int]:
         """Get image dimensions."""
-        with Image.open(image_path) as img:
-            return img.size
+        info = self.get_image_info(image_path)
+        return info.width, info.height
     
     def calculate_image_size(self, image_path: str) -> Tuple[float, float]:
         """
@@ -58,7 +322,10 @@ class ImageToPDFConverter:
         Returns:
             Tuple[float, float]: Width and height for the PDF
         """
-        img_width, img_height = self.get_image_dimensions(image_path)
+        return self._fit_size(*self.get_image_dimensions(image_path))
+    
+    def _fit_size(self, img_width: int, img_height: int) -> Tuple[float, float]:
+        """Scale pixel dimensions to fit inside the page margins, keeping the aspect ratio."""
         page_width, page_height = self.page_size
         
         # Calculate available space (accounting for margins)
@@ -74,6 +341,565 @@ class ImageToPDFConverter:
         
         return img_width * scale, img_height * scale
     
+    def _centered_placement(self, img_width: int, img_height: int) -> Tuple[float, float, float, float]:
+        """Return the ``(x, y, width, height)`` that centres an image on the page."""
+        pdf_width, pdf_height = self._fit_size(img_width, img_height)
+        page_width, page_height = self.page_size
+        return (page_width - pdf_width) / 2, (page_height - pdf_height) / 2, pdf_width, pdf_height
+    
+    def _can_passthrough_jpeg(self, info: ImageInfo) -> bool:
+        """
+        Check whether a JPEG can be embedded in the PDF byte-for-byte.
+        
+        Only 8-bit grayscale or YCbCr/RGB baseline and progressive JPEGs
+        qualify; CMYK, lossless, arithmetic-coded and 12-bit files go through
+        the regular decode path.
+        """
+        return (self.jpeg_passthrough
+                and info.format == 'JPEG'
+                and info.encoding in DCT_PASSTHROUGH_ENCODINGS
+                and info.bits == 8
+                and info.mode in ('L', 'RGB'))
+    
+    def _can_passthrough_png(self, info: ImageInfo) -> bool:
+        """
+        Predict from the header whether extract_png_image will embed a PNG
+        as-is (non-interlaced, 8-bit RGB or up to 8-bit gray, no tRNS).
+        """
+        return (self.png_passthrough
+                and info.format == 'PNG'
+                and info.encoding == 'deflate'
+                and (info.mode == 'RGB' and info.bits == 8
+                     or info.mode in ('1', 'L') and info.bits <= 8))
+    
+    def _resample_size(self, info: ImageInfo, pdf_width: float,
+                       pdf_height: float) -> Optional[Tuple[int, int]]:
+        """
+        Work out the pixel size an image needs to reach target_dpi on the page.
+        
+        Args:
+            info (ImageInfo): Probed image metadata
+            pdf_width (float): Width of the image on the page in points
+            pdf_height (float): Height of the image on the page in points
+            
+        Returns:
+            Optional[Tuple[int, int]]: Target pixel size, or None if the image
+            is already at or below the target resolution
+        """
+        if not self.target_dpi:
+            return None
+        
+        target_width = max(1, round(pdf_width / 72 * self.target_dpi))
+        target_height = max(1, round(pdf_height / 72 * self.target_dpi))
+        if target_width >= info.width or target_height >= info.height:
+            return None
+        return target_width, target_height
+    
+    @staticmethod
+    def _decoded_dimensions(info: ImageInfo, target_size: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+        """Return the pixel size an image is decoded at, which draft mode reduces for downsampled JPEGs."""
+        if target_size is None or info.format != 'JPEG':
+            return info.width, info.height
+        # Same choice of DCT scale as Pillow's JpegImageFile.draft
+        ratio = min(info.width // target_size[0], info.height // target_size[1])
+        scale = next(scale for scale in (8, 4, 2, 1) if ratio >= scale)
+        return -(-info.width // scale), -(-info.height // scale)
+    
+    def _needs_bands(self, width: int, height: int, mode: str) -> bool:
+        """
+        Check whether an image is better decoded in bands than whole: bigger
+        than memory_budget once decoded, or over Pillow's
+        decompression-bomb warning limit.
+        """
+        if self.memory_budget and decoded_size(width, height, mode) > self.memory_budget:
+            return True
+        from PIL import Image
+        
+        return bool(Image.MAX_IMAGE_PIXELS) and width * height > Image.MAX_IMAGE_PIXELS
+    
+    def _band_bytes(self) -> int:
+        """Return the decoded size of the bands that oversized images are read in."""
+        return min(BAND_BYTES, self.memory_budget) if self.memory_budget else BAND_BYTES
+    
+    def _budget_jpeg_size(self, info: ImageInfo,
+                          target_size: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """
+        Return the pixel size to decode a JPEG at within memory_budget.
+        
+        A JPEG that decodes to more than the budget, even at any downsampled
+        ``target_size``, is decoded with draft mode at the largest DCT scale
+        (1/2, 1/4 or 1/8) that fits, or at 1/8 if none does; its place on
+        the page stays the same, at a lower resolution.
+        
+        Args:
+            info (ImageInfo): Probed metadata of the JPEG
+            target_size (Tuple[int, int]): Pixel size it is downsampled to
+                already (optional)
+            
+        Returns:
+            Optional[Tuple[int, int]]: ``target_size``, or the smaller size
+            the budget calls for
+        """
+        if not self.memory_budget or decoded_size(
+                *self._decoded_dimensions(info, target_size), info.mode) <= self.memory_budget:
+            return target_size
+        for scale in (2, 4, 8):
+            size = (max(1, info.width // scale), max(1, info.height // scale))
+            decoded = self._decoded_dimensions(info, size)
+            if decoded_size(*decoded, info.mode) <= self.memory_budget:
+                break
+        if target_size is not None and target_size[0] * target_size[1] <= size[0] * size[1]:
+            return target_size
+        return size
+    
+    def _open_bands(self, raw, width: int, height: int, mode: str,
+                    frame: int = 0) -> Optional[Union[TiffBands, PngBands]]:
+        """
+        Prepare an image that _needs_bands for decoding a band at a time.
+        
+        Args:
+            raw: Binary file object over the image data
+            width (int): Width the image decodes at
+            height (int): Height the image decodes at
+            mode (str): Pillow mode the image decodes to
+            frame (int): Frame (TIFF page) of the image
+            
+        Returns:
+            Optional[Union[TiffBands, PngBands]]: The bands, or None if the
+            image is neither a TIFF with several strips or tiles nor a PNG
+            that can be banded (see memory_budget.PngBands.open), and has to
+            be decoded whole (even over memory_budget: pools, the server and
+            the job runner run such images with nothing else in flight)
+            
+        Raises:
+            PIL.Image.DecompressionBombError: If the image has to be decoded
+                whole and is over Pillow's limit
+        """
+        bands = open_bands(raw, frame)
+        if bands is None:
+            check_decode_size(width, height)
+        return bands
+    
+    def _encode_bands(self, bands: Union[TiffBands, PngBands], mode: str,
+                      target_size: Optional[Tuple[int, int]]) -> PDFImage:
+        """
+        Encode an image that is too large to decode whole, one band of rows at a time.
+        
+        Downsampled images are box-reduced band by band to the nearest
+        integer fraction above the target size and resized from there.
+        Other images are Flate-compressed as their bands are decoded; with
+        optimize, a first pass over the bands picks the colour type, and
+        black and white results stay 1-bit Flate because CCITT Group 4
+        needs the whole image. Decoding is timed as part of the stage that
+        consumes the bands.
+        
+        Args:
+            bands (Union[TiffBands, PngBands]): The image
+            mode (str): Pillow mode the image decodes to
+            target_size (Tuple[int, int]): Pixel size to downsample to
+                (optional)
+            
+        Returns:
+            PDFImage: Encoded image
+        """
+        metrics = self.metrics
+        rows = bands.band_rows(self._band_bytes(), mode)
+        if target_size is not None:
+            factor = max(1, min(bands.width // target_size[0], bands.height // target_size[1]))
+            with metrics.stage('resample'):
+                img = resample_image(reduce_bands(bands.iter_bands(rows), factor), target_size,
+                                     draft=False, bilevel=mode == '1')
+            with metrics.stage('encode'):
+                return self._encode_pixels(img)
+        
+        reduced_mode = None
+        if self.optimize:
+            with metrics.stage('optimize'):
+                reduced_mode = reduced_band_mode(bands.iter_bands(rows), bands.width * bands.height)
+        with metrics.stage('encode'):
+            return encode_pil_bands(bands.iter_bands(rows), bands.width, bands.height,
+                                    self.flate_level, reduced_mode)
+    
+    def _decode_cost(self, image) -> int:
+        """
+        Estimate from its header how many bytes of decoded image data
+        converting an image holds at once, for memory_budget admission.
+        
+        ``image`` is a path or the contents of an image file. Passthrough
+        images decode nothing, images decoded in bands hold one band, JPEGs
+        are decoded at the scale _budget_jpeg_size picks, and multi-frame
+        files are judged by their first frame. Unreadable images cost
+        nothing: they fail without decoding. Anything else is decoded
+        whole, so an image over the budget costs more than all of it and
+        runs on its own.
+        """
+        in_memory = not isinstance(image, (str, os.PathLike))
+        try:
+            info = probe_image(io.BytesIO(image)) if in_memory else self.get_image_info(image)
+        except (OSError, ValueError):
+            return 0
+        target_size = self._resample_size(info, *self._fit_size(info.width, info.height))
+        width, height = self._decoded_dimensions(info, target_size)
+        needs_bands = self._needs_bands(width, height, info.mode)
+        # Even optimize embeds images this large as-is where it can (see _encode_image)
+        if target_size is None and (not self.optimize or needs_bands) and (
+                self._can_passthrough_jpeg(info) or self._can_passthrough_png(info)):
+            return 0
+        if info.format == 'JPEG':
+            width, height = self._decoded_dimensions(info, self._budget_jpeg_size(info, target_size))
+        elif info.format in ('TIFF', 'PNG') and needs_bands:
+            try:
+                with (io.BytesIO(image) if in_memory else open(image, 'rb')) as raw:
+                    if open_bands(raw) is not None:
+                        return self._band_bytes()
+            except OSError:
+                return 0
+        return decoded_size(width, height, info.mode)
+    
+    def _image_key(self, data: bytes, target_size: Optional[Tuple[int, int]]) -> str:
+        """
+        Return a content address for an image as it will be embedded.
+        
+        The key covers the file bytes and every setting that changes the
+        encoded result, so two pages share an XObject exactly when they would
+        otherwise embed identical image data.
+        """
+        import hashlib
+        
+        digest = hashlib.sha256(data)
+        digest.update(repr((target_size, self.jpeg_passthrough, self.png_passthrough,
+                            self.optimize, self.flate_level, self.jpeg_quality)).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _read_file(self, image_path: str) -> bytes:
+        """Read a whole input file, counting it as the 'read' stage."""
+        with self.metrics.stage('read'):
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        self.metrics.count_read(len(data))
+        return data
+    
+    def _read_image(self, image_path: str, pdf_size: Tuple[float, float]) -> Tuple[bytes, str]:
+        """
+        Read an image file and compute its content key for a given on-page size.
+        
+        Returns:
+            Tuple[bytes, str]: The raw file bytes and their key from _image_key
+        """
+        data = self._read_file(image_path)
+        target_size = self._resample_size(self.get_image_info(image_path), *pdf_size)
+        return data, self._image_key(data, target_size)
+    
+    def _encode_image(self, info: ImageInfo, data: bytes,
+                      pdf_size: Tuple[float, float] = None) -> PDFImage:
+        """
+        Encode an image as a ready-to-embed PDF image XObject.
+        
+        Passthrough-eligible JPEGs keep their original bytes, and eligible
+        PNGs their compressed image data. Images above
+        target_dpi at ``pdf_size`` are downsampled first, using Pillow's
+        reduced-scale JPEG decoding so that discarded pixels are never
+        decoded, unless the image embedded as-is (or, when it was decoded
+        at full size anyway, its full-size encoding) is no larger; see
+        _downsampled_image. Everything else is decoded with Pillow and Flate-compressed.
+        With optimize, images that reduce to gray or black and white are
+        re-encoded in that colour type even if they could pass through.
+        Images too large to decode whole comfortably (see _needs_bands)
+        are embedded as-is if eligible, decoded in bands if they are TIFFs
+        with several strips or tiles or PNGs that allow it, JPEGs over
+        memory_budget are decoded at a reduced scale (_budget_jpeg_size),
+        and anything else is decoded whole after all.
+        
+        Args:
+            info (ImageInfo): Probed metadata of the image
+            data (bytes): Contents of the image file (any bytes-like object)
+            pdf_size (Tuple[float, float]): Size of the image on the page in
+                points (optional, needed for downsampling)
+            
+        Returns:
+            PDFImage: Encoded image
+        """
+        target_size = self._resample_size(info, *pdf_size) if pdf_size else None
+        
+        # Also worked out for downsampled images, which keep it if the
+        # downsampled encoding comes out no smaller
+        passthrough = None
+        if self._can_passthrough_jpeg(info):
+            color_space = 'DeviceGray' if info.mode == 'L' else 'DeviceRGB'
+            passthrough = PDFImage(info.width, info.height, color_space, 8, 'DCTDecode', data)
+        elif self.png_passthrough and info.format == 'PNG':
+            passthrough = extract_png_image(data)
+        elif info.encoding == 'group4':
+            with open_image(io.BytesIO(data)) as img:
+                passthrough = self._ccitt_passthrough(img, io.BytesIO(data))
+        
+        width, height = self._decoded_dimensions(info, target_size)
+        if self._needs_bands(width, height, info.mode):
+            # Not even optimize is worth decoding an image this large whole
+            if passthrough is not None and target_size is None:
+                return passthrough
+            if info.format == 'JPEG':
+                target_size = self._budget_jpeg_size(info, target_size)
+                width, height = self._decoded_dimensions(info, target_size)
+            bands = self._open_bands(io.BytesIO(data), width, height, info.mode)
+            if bands is not None:
+                return _smaller_image(self._encode_bands(bands, info.mode, target_size), passthrough)
+        
+        if self.optimize and info.mode != '1':
+            pdf_image = self._optimized_image(info, data, target_size, passthrough)
+            if pdf_image is not None:
+                return pdf_image
+        if passthrough is not None and target_size is None:
+            return passthrough
+        
+        metrics = self.metrics
+        with open_image(io.BytesIO(data)) as img:
+            with metrics.stage('decode'):
+                if target_size is not None:
+                    # Draft mode has to be chosen before the pixels are loaded
+                    img.draft(img.mode, target_size)
+                img.load()
+            
+            if target_size is None:
+                with metrics.stage('encode'):
+                    return encode_pil_image(img, self.flate_level)
+            
+            full_size = img.size == (info.width, info.height)
+            return self._downsampled_image(img, target_size, passthrough, full_size,
+                                           photo=info.format == 'JPEG')
+    
+    def _downsampled_image(self, img, target_size: Tuple[int, int], original: Optional[PDFImage],
+                           full_size: bool = True, photo: bool = False) -> PDFImage:
+        """
+        Resample a loaded image to ``target_size`` and encode it, unless the
+        image as embedded without downsampling comes out no larger.
+        
+        Downsampling does not always pay: flat artwork compresses to almost
+        nothing at any size, and anti-aliasing adds colours and gray levels
+        that compress worse than the original pixels.
+        
+        Args:
+            img (PIL.Image.Image): Loaded image
+            target_size (Tuple[int, int]): Pixel size to downsample to
+            original (PDFImage): The image embedded as-is, if eligible
+            full_size (bool): ``img`` was decoded at full size (not reduced
+                by JPEG draft mode), so without an ``original`` its
+                full-size encoding is the one compared against
+            photo (bool): As for _encode_pixels
+            
+        Returns:
+            PDFImage: The smaller of the two encodings
+        """
+        metrics = self.metrics
+        with metrics.stage('resample'):
+            resampled = resample_image(img, target_size, draft=False)
+        with metrics.stage('encode'):
+            pdf_image = self._encode_pixels(resampled, photo)
+            if original is None and full_size:
+                original = self._encode_pixels(img, photo)
+        return _smaller_image(pdf_image, original)
+    
+    def _encode_pixels(self, img, photo: bool = False) -> PDFImage:
+        """
+        Encode a decoded Pillow image, reducing its colour type first with optimize.
+        
+        Args:
+            img (PIL.Image.Image): Loaded image
+            photo (bool): The image came from a JPEG, so 8-bit gray and RGB
+                results are JPEG-encoded (Flate would make photos several
+                times larger)
+            
+        Returns:
+            PDFImage: Encoded image
+        """
+        if self.optimize:
+            img = reduce_color_type(img)
+        return self._encode_reduced(img, photo)
+    
+    def _encode_reduced(self, img, photo: bool = False) -> PDFImage:
+        """Encode an image whose colour type has already been chosen; see _encode_pixels."""
+        if img.mode == '1':
+            return encode_bilevel_image(img, self.flate_level)
+        if photo and img.mode in ('L', 'RGB'):
+            return encode_jpeg_image(img, self.jpeg_quality)
+        return encode_pil_image(img, self.flate_level)
+    
+    def _optimized_image(self, info: ImageInfo, data: bytes, target_size: Optional[Tuple[int, int]],
+                         passthrough: Optional[PDFImage]) -> Optional[PDFImage]:
+        """
+        Encode an image in the most compact colour type it reduces to.
+        
+        Colour JPEGs are first checked at 1/8 scale with draft mode, so
+        photos are rejected without a full decode. If the image does not
+        reduce, or its reduced encoding is no smaller than ``passthrough``,
+        the passthrough image is returned instead. Images that neither
+        reduce nor pass through are encoded as they would be without
+        optimize, so they are not decoded twice.
+        
+        Args:
+            info (ImageInfo): Probed metadata of the image
+            data (bytes): Contents of the image file
+            target_size (Tuple[int, int]): Pixel size to downsample to
+                (optional)
+            passthrough (PDFImage): The image embedded as-is, if eligible
+            
+        Returns:
+            Optional[PDFImage]: Encoded image, or None if a colour JPEG
+            without passthrough should go through the regular path
+        """
+        metrics = self.metrics
+        if info.format == 'JPEG' and info.mode == 'RGB':
+            with open_image(io.BytesIO(data)) as preview:
+                with metrics.stage('decode'):
+                    preview.draft('RGB', (max(1, info.width // 8), max(1, info.height // 8)))
+                    preview.load()
+                with metrics.stage('optimize'):
+                    if not is_grayscale(preview):
+                        return passthrough if target_size is None else None
+        
+        with open_image(io.BytesIO(data)) as img:
+            with metrics.stage('decode'):
+                if target_size is not None:
+                    img.draft(img.mode, target_size)
+                elif info.format == 'JPEG' and img.mode == 'RGB':
+                    # Skip the YCbCr to RGB conversion: the gray check needs chroma, not RGB
+                    img.draft('YCbCr', img.size)
+                img.load()
+            if target_size is not None:
+                with metrics.stage('resample'):
+                    img = resample_image(img, target_size)
+            original_mode = 'RGB' if img.mode == 'YCbCr' else img.mode
+            with metrics.stage('optimize'):
+                reduced = reduce_color_type(img)
+            if target_size is None and reduced.mode == original_mode:
+                # Nothing reduced: same result as without optimize
+                if passthrough is not None:
+                    return passthrough
+                with metrics.stage('encode'):
+                    return encode_pil_image(reduced, self.flate_level)
+            with metrics.stage('encode'):
+                pdf_image = self._encode_reduced(reduced, photo=info.format == 'JPEG')
+        return _smaller_image(pdf_image, passthrough)
+    
+    def _ccitt_passthrough(self, img, raw) -> Optional[PDFImage]:
+        """
+        Return the current TIFF frame as a CCITTFaxDecode image if its Group 4
+        data can be embedded without decoding.
+        
+        Only single-strip, MSB-first frames without uncompressed-mode runs
+        qualify; anything else goes through the regular decode path.
+        
+        Args:
+            img (PIL.Image.Image): Opened image, seeked to the frame
+            raw: Binary file object over the same image data, used to read
+                the compressed strip
+            
+        Returns:
+            Optional[PDFImage]: Encoded image, or None if not eligible
+        """
+        if img.format != 'TIFF':
+            return None
+        tags = img.tag_v2
+        photometric = tags.get(262, 0)
+        offsets = tags.get(273)
+        byte_counts = tags.get(279)
+        if (tags.get(259) != 4 or photometric not in (0, 1) or tags.get(266, 1) != 1
+                or tags.get(293, 0) & 2 or offsets is None or byte_counts is None):
+            return None
+        if isinstance(offsets, int):
+            offsets, byte_counts = (offsets,), (byte_counts,)
+        if len(offsets) != 1:
+            return None
+        
+        raw.seek(offsets[0])
+        data = raw.read(byte_counts[0])
+        # Decoded Group 4 data uses 0 for white; BlackIs1 keeps BlackIsZero files inverted
+        decode_parms = ('<< /K -1 /Columns %d /Rows %d /BlackIs1 %s >>'
+                        % (img.width, img.height, 'true' if photometric == 1 else 'false'))
+        return PDFImage(img.width, img.height, 'DeviceGray', 1, 'CCITTFaxDecode', data, decode_parms)
+    
+    def _frame_count(self, source, info: ImageInfo = None) -> int:
+        """
+        Return how many pages an image produces: its number of frames with
+        all_frames, otherwise 1.
+        
+        Args:
+            source: Image path, or a binary file object over the image data
+            info (ImageInfo): Probed metadata (optional for paths)
+        """
+        if not self.all_frames:
+            return 1
+        if info is None:
+            info = self.get_image_info(source)
+        if info.format not in self.MULTI_FRAME_FORMATS:
+            return 1
+        with self.metrics.stage('probe'):
+            # Counting frames walks TIFF directories or GIF blocks without decoding pixels
+            with open_image(source) as img:
+                return getattr(img, 'n_frames', 1)
+    
+    def _prepare_frame(self, img, raw) -> Tuple[None, PDFImage, Tuple[float, float, float, float]]:
+        """
+        Encode the current frame of an open multi-frame image and place it on its page.
+        
+        Only this frame is decoded (Group 4 TIFF frames are not decoded at
+        all, and large frames are decoded in bands where possible).
+        Frames are not deduplicated, so the returned key is None.
+        
+        Args:
+            img (PIL.Image.Image): Opened image, seeked to the frame
+            raw: Separate binary file object over the same image data
+            
+        Returns:
+            Tuple[None, PDFImage, Tuple[float, float, float, float]]: Same
+            shape as _prepare_page
+        """
+        metrics = self.metrics
+        placement = self._centered_placement(img.width, img.height)
+        target_size = self._resample_size(ImageInfo(img.format, img.width, img.height, img.mode),
+                                          *placement[2:])
+        passthrough = self._ccitt_passthrough(img, raw)
+        if passthrough is not None and target_size is None:
+            return None, passthrough, placement
+        if self._needs_bands(img.width, img.height, img.mode):
+            bands = self._open_bands(raw, img.width, img.height, img.mode, img.tell())
+            if bands is not None:
+                pdf_image = _smaller_image(self._encode_bands(bands, img.mode, target_size), passthrough)
+                return None, pdf_image, placement
+        
+        with metrics.stage('decode'):
+            img.load()
+        if target_size is not None:
+            return None, self._downsampled_image(img, target_size, passthrough), placement
+        with metrics.stage('encode'):
+            return None, self._encode_pixels(img), placement
+    
+    def _prepare_frame_at(self, image_path: str, frame: int) -> Tuple[None, PDFImage,
+                                                                      Tuple[float, float, float, float]]:
+        """Open an image, seek to one frame and prepare it (used by pooled workers)."""
+        with open(image_path, 'rb') as raw, open_image(image_path) as img:
+            img.seek(frame)
+            return self._prepare_frame(img, raw)
+    
+    def _iter_image_pages(self, image_path: str, known_keys=()):
+        """
+        Yield ``(label, (key, pdf_image, placement))`` for each page an image file produces.
+        
+        Multi-frame files (with all_frames) are read through one open image
+        and seeked forward a frame at a time, so only the current frame is
+        ever decoded. Other files produce a single page from _prepare_page.
+        """
+        frame_count = self._frame_count(image_path)
+        if frame_count == 1:
+            yield image_path, self._prepare_page(image_path, known_keys)
+            return
+        
+        self.metrics.count_read(os.path.getsize(image_path))
+        with open(image_path, 'rb') as raw, open_image(image_path) as img:
+            for frame in range(frame_count):
+                img.seek(frame)
+                yield _frame_label(image_path, frame), self._prepare_frame(img, raw)
+    
     def convert_single_image(self, image_path: str, output_path: str = None) -> str:
         """
         Convert a single image to PDF.
@@ -85,43 +911,251 @@ class ImageToPDFConverter:
         Returns:
             str: Path to the created PDF file
         """
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
+        try:
+            if not os.path.exists(image_path):
+                raise FileNotFoundError(f"Image file not found: {image_path}")
+            
+            if not self.is_supported_format(image_path):
+                raise ValueError(f"Unsupported image format: {os.path.splitext(image_path)[1]}")
+            
+            # Generate output path if not provided
+            if output_path is None:
+                output_path = os.path.splitext(image_path)[0] + '.pdf'
+            
+            # Create PDF, one page per frame with all_frames
+            with self._open_backend(output_path) as backend:
+                for _, prepared in self._iter_image_pages(image_path, backend.known_keys):
+                    with self.metrics.stage('page_write'):
+                        backend.add_page(*prepared)
+                with self.metrics.stage('save'):
+                    backend.close()
+            self.metrics.count_written(backend.bytes_written)
+        except Exception as e:
+            self.metrics.file_finished(image_path, error=str(e))
+            raise
         
-        if not self.is_supported_format(image_path):
-            raise ValueError(f"Unsupported image format: {Path(image_path).suffix}")
+        self.metrics.file_finished(image_path, output_path)
+        self._log(f"✓ Converted: {image_path} → {output_path}")
+        return output_path
+    
+    def _prepare_page(self, image_path: str, known_keys=()) -> Tuple[str, Optional[PDFImage],
+                                                                     Tuple[float, float, float, float]]:
+        """
+        Encode an image and work out where it goes on its page.
         
-        # Generate output path if not provided
-        if output_path is None:
-            output_path = str(Path(image_path).with_suffix('.pdf'))
+        Args:
+            image_path (str): Path to the image file
+            known_keys: Content keys already embedded in the document; images
+                with one of these keys are not encoded again
+            
+        Returns:
+            Tuple[str, Optional[PDFImage], Tuple[float, float, float, float]]:
+            The image's content key, the encoded image (None if the key was
+            already known) and its ``(x, y, width, height)`` placement in points
+        """
+        info = self.get_image_info(image_path)
+        x, y, pdf_width, pdf_height = self._centered_placement(info.width, info.height)
         
-        # Calculate image size for PDF
-        pdf_width, pdf_height = self.calculate_image_size(image_path)
-        page_width, page_height = self.page_size
+        data, key = self._read_image(image_path, (pdf_width, pdf_height))
+        pdf_image = None
+        if key not in known_keys:
+            pdf_image = self._encode_image(info, data, (pdf_width, pdf_height))
+        return key, pdf_image, (x, y, pdf_width, pdf_height)
+    
+    def _load_image_source(self, image):
+        """
+        Return the bytes of an in-memory image source, or the image itself
+        for a PIL image.
         
-        # Calculate position to center the image
-        x = (page_width - pdf_width) / 2
-        y = (page_height - pdf_height) / 2
+        bytes and memoryviews are used as they are, and BytesIO objects
+        through the bytes object they hold, so the image data is not copied.
+        Other file objects are read from their current position.
+        """
+        if _is_pil_image(image):
+            return image
+        if isinstance(image, (str, os.PathLike)):
+            return self._read_file(image)
         
-        # Create PDF
-        c = canvas.Canvas(output_path, pagesize=self.page_size)
-        c.drawImage(image_path, x, y, width=pdf_width, height=pdf_height)
-        c.save()
+        if isinstance(image, (bytes, bytearray)):
+            data = image
+        elif isinstance(image, memoryview):
+            data = image.cast('B')
+        elif isinstance(image, io.BytesIO):
+            # getvalue() hands over the BytesIO's own bytes object, whereas
+            # getbuffer() first copies a buffer still shared with the bytes
+            # the BytesIO was created from
+            position = image.tell()
+            data = image.getvalue()
+            if position:
+                data = memoryview(data)[position:]
+            image.seek(0, io.SEEK_END)
+        elif hasattr(image, 'read'):
+            with self.metrics.stage('read'):
+                data = image.read()
+        else:
+            raise TypeError(f"Unsupported image source: {type(image).__name__}")
+        self.metrics.count_read(len(data))
+        return data
+    
+    def _iter_source_pages(self, image, label: str, known_keys=()):
+        """
+        Like _iter_image_pages, for an image given as bytes, a file object or a PIL image.
         
-        print(f"✓ Converted: {image_path} → {output_path}")
-        return output_path
+        PIL images have no file bytes to address, so their key is None and
+        they are never deduplicated; only their current frame is used.
+        """
+        source = self._load_image_source(image)
+        metrics = self.metrics
+        
+        if _is_pil_image(source):
+            placement = self._centered_placement(source.width, source.height)
+            info = ImageInfo(source.format or 'unknown', source.width, source.height, source.mode)
+            target_size = self._resample_size(info, *placement[2:])
+            if target_size is not None:
+                yield label, (None, self._downsampled_image(source, target_size, None), placement)
+                return
+            with metrics.stage('encode'):
+                yield label, (None, self._encode_pixels(source), placement)
+            return
+        
+        with metrics.stage('probe'):
+            try:
+                info = probe_image(io.BytesIO(source))
+            except OSError as e:
+                from PIL import UnidentifiedImageError
+                if not isinstance(e, UnidentifiedImageError):
+                    raise
+                raise ValueError("Unrecognised image data") from None
+        if info.format not in self.SUPPORTED_DATA_FORMATS:
+            raise ValueError(f"Unsupported image format: {info.format}")
+        
+        frame_count = self._frame_count(io.BytesIO(source), info)
+        if frame_count > 1:
+            with open_image(io.BytesIO(source)) as img:
+                raw = io.BytesIO(source)
+                for frame in range(frame_count):
+                    img.seek(frame)
+                    yield _frame_label(label, frame), self._prepare_frame(img, raw)
+            return
+        
+        placement = self._centered_placement(info.width, info.height)
+        key = self._image_key(source, self._resample_size(info, *placement[2:]))
+        pdf_image = None
+        if key not in known_keys:
+            pdf_image = self._encode_image(info, source, placement[2:])
+        yield label, (key, pdf_image, placement)
+    
+    def _iter_prepared_pages(self, image_paths: List[str], workers: int = 1, known_keys=()):
+        """
+        Yield ``(label, (key, pdf_image, placement))`` for each page in input order.
+        
+        With more than one worker, pages are prepared in a process pool. At
+        most PIPELINE_QUEUE_PER_WORKER pages per worker are in flight or
+        waiting to be written, which caps the memory held by encoded pages.
+        In-process preparation checks ``known_keys`` (which the caller may
+        keep updating) to skip encoding duplicates; pooled workers always
+        encode and leave deduplication to the writer. Stage timings from
+        workers are added to this converter's metrics for the yielded page.
+        
+        With all_frames, each frame of a multi-frame file is a separate
+        page and, in a pool, a separate job that seeks straight to its frame.
+        With a memory_budget, a pooled page only starts while the decoded
+        sizes of the pages being prepared fit the budget.
+        """
+        if workers <= 1:
+            for image_path in image_paths:
+                yield from self._iter_image_pages(image_path, known_keys)
+            return
+        
+        def iter_jobs():
+            for image_path in image_paths:
+                frame_count = self._frame_count(image_path)
+                if frame_count == 1:
+                    yield image_path, None
+                else:
+                    for frame in range(frame_count):
+                        yield image_path, frame
+        
+        max_in_flight = workers * self.PIPELINE_QUEUE_PER_WORKER
+        for (image_path, frame), (prepared, pending) in _ordered_pool_map(
+                _prepare_page_job, iter_jobs(), workers, self._worker_options(), max_in_flight,
+                lambda job: self._decode_cost(job[0]), self.memory_budget):
+            self.metrics.add_pending(pending)
+            yield image_path if frame is None else _frame_label(image_path, frame), prepared
+    
+    def _open_backend(self, output, backend: str = None) -> PDFBackend:
+        """Create a PDF backend (this converter's own unless ``backend`` names another) for ``output``."""
+        return BACKENDS[backend or self.backend](output, self.page_size)
     
-    def convert_multiple_images(self, image_paths: List[str], output_path: str) -> str:
+    def _write_pages(self, backend: PDFBackend, prepared_pages, output_name: str,
+                     tracker: _ProgressTracker = None):
+        """
+        Add ``(label, (key, pdf_image, placement))`` pages to a backend,
+        reporting each one as a finished file (and to ``tracker``, which is
+        also checked for cancellation before the next page is prepared).
+        """
+        metrics = self.metrics
+        for label, prepared in prepared_pages:
+            with metrics.stage('page_write'):
+                backend.add_page(*prepared)
+            metrics.file_finished(label, output_name)
+            self._log(f"✓ Added to PDF: {label}")
+            if tracker is not None:
+                tracker.advance(label)
+                tracker.check()
+    
+    def convert_multiple_images(self, image_paths: List[str], output_path: str,
+                                streaming: bool = False, workers: int = 1,
+                                progress: Callable[[ConversionProgress], None] = None,
+                                cancel: CancelToken = None) -> str:
         """
         Convert multiple images into a single PDF with each image on a separate page.
         
         Args:
             image_paths (List[str]): List of image file paths
             output_path (str): Path for the output PDF
+            streaming (bool): Write each page to disk as soon as it is ready
+                instead of building the whole document in memory (uses the
+                'direct' backend whatever the converter's backend)
+            workers (int): Number of worker processes that decode and encode
+                pages in parallel for a single streaming writer (1 keeps
+                everything in-process, 0 or None uses every CPU; more than
+                one implies streaming)
+            progress (Callable[[ConversionProgress], None]): Called after
+                each page is written (optional; the total is unknown with
+                all_frames)
+            cancel (CancelToken): Token for stopping the conversion, in
+                which case the partial PDF is removed and
+                ConversionCancelled is raised (optional)
             
         Returns:
             str: Path to the created PDF file
         """
+        valid_paths = self._valid_merge_paths(image_paths)
+        if not workers:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(valid_paths))
+        
+        tracker = _ProgressTracker(None if self.all_frames else len(valid_paths), progress, cancel)
+        try:
+            tracker.check()
+            # Streaming keeps memory bounded, which parallel merges rely on
+            with self._open_backend(output_path, 'direct' if streaming or workers > 1 else None) as backend:
+                self._write_pages(backend, self._iter_prepared_pages(valid_paths, workers, backend.known_keys),
+                                  output_path, tracker)
+                with self.metrics.stage('save'):
+                    backend.close()
+            self.metrics.count_written(backend.bytes_written)
+        except Exception as e:
+            self.metrics.document_finished(output_path, len(valid_paths), error=str(e))
+            raise
+        
+        self.metrics.document_finished(output_path, len(valid_paths))
+        print(f"✓ Created multi-page PDF: {output_path}")
+        return output_path
+    
+    def _valid_merge_paths(self, image_paths: List[str]) -> List[str]:
+        """Return the existing, supported paths of a merge, warning about the rest."""
         if not image_paths:
             raise ValueError("No image paths provided")
         
@@ -138,38 +1172,404 @@ class ImageToPDFConverter:
         
         if not valid_paths:
             raise ValueError("No valid image files found")
+        return valid_paths
+    
+    def convert_sharded_images(self, image_paths: List[str], output_path: str,
+                               max_pages_per_file: int = None, max_bytes_per_file: int = None,
+                               workers: int = 1) -> List[str]:
+        """
+        Merge images into a series of PDFs ("shards") instead of one large PDF.
         
-        c = canvas.Canvas(output_path, pagesize=self.page_size)
-        page_width, page_height = self.page_size
+        Shards are named after ``output_path`` with a four-digit number
+        (``album.pdf`` becomes ``album-0001.pdf``, ``album-0002.pdf``, ...)
+        and described in ``album.index.json``, which lists the page range
+        and source images of every shard.
         
-        for i, image_path in enumerate(valid_paths):
-            # Calculate image size for PDF
-            pdf_width, pdf_height = self.calculate_image_size(image_path)
+        With only max_pages_per_file, the shards are planned up front and
+        each worker process writes whole shards, so shards are written
+        concurrently. With max_bytes_per_file, a shard's size is only known
+        once its pages are encoded: pages are then encoded by the workers
+        and shards are cut as they fill up, one at a time. Files are never
+        split across shards, so a multi-frame file with all_frames may
+        exceed max_pages_per_file, and a single page larger than
+        max_bytes_per_file gets a shard of its own.
+        
+        Args:
+            image_paths (List[str]): List of image file paths
+            output_path (str): Path the shard and index names are derived from
+            max_pages_per_file (int): Maximum number of pages per shard
+                (optional)
+            max_bytes_per_file (int): Target maximum size of each shard in
+                bytes (optional; the PDF trailer may add a few hundred bytes)
+            workers (int): Number of worker processes (1 keeps everything
+                in-process, 0 or None uses every CPU)
             
-            # Calculate position to center the image
-            x = (page_width - pdf_width) / 2
-            y = (page_height - pdf_height) / 2
+        Returns:
+            List[str]: Paths of the created shards, in page order
+        """
+        if not max_pages_per_file and not max_bytes_per_file:
+            raise ValueError("A page or byte limit per file is required for sharding")
+        valid_paths = self._valid_merge_paths(image_paths)
+        if not workers:
+            workers = os.cpu_count() or 1
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        if max_bytes_per_file:
+            shards = self._write_filled_shards(valid_paths, output_path, max_pages_per_file,
+                                               max_bytes_per_file, min(workers, len(valid_paths)))
+        else:
+            shards = self._write_planned_shards(valid_paths, output_path, max_pages_per_file, workers)
+        
+        index_path = self._write_shard_index(output_path, shards, max_pages_per_file, max_bytes_per_file)
+        print(f"✓ Created {len(shards)} PDF shards, listed in: {index_path}")
+        return [shard_path for shard_path, _, _ in shards]
+    
+    @staticmethod
+    def _shard_path(output_path: str, number: int) -> str:
+        """Return the path of shard ``number`` (1-based) of a sharded merge."""
+        root, extension = os.path.splitext(output_path)
+        return f"{root}-{number:04d}{extension or '.pdf'}"
+    
+    def _write_planned_shards(self, image_paths: List[str], output_path: str, max_pages: int,
+                              workers: int) -> List[Tuple[str, List[str], int]]:
+        """
+        Split images into shards of at most ``max_pages`` pages and write each
+        shard as a separate job, in parallel with more than one worker.
+        
+        Returns:
+            List[Tuple[str, List[str], int]]: ``(shard_path, page_labels,
+            bytes)`` for each shard, in order
+        """
+        jobs = []
+        batch, pages = [], 0
+        for image_path in image_paths:
+            frames = self._frame_count(image_path)
+            if batch and pages + frames > max_pages:
+                jobs.append((batch, self._shard_path(output_path, len(jobs) + 1)))
+                batch, pages = [], 0
+            batch.append(image_path)
+            pages += frames
+        jobs.append((batch, self._shard_path(output_path, len(jobs) + 1)))
+        
+        workers = min(workers, len(jobs))
+        if workers <= 1:
+            return [(shard_path,) + self._write_shard(paths, shard_path) for paths, shard_path in jobs]
+        
+        shards = []
+        for (_, shard_path), (labels, size, events) in _ordered_pool_map(
+                _write_shard_job, jobs, workers, self._worker_options(),
+                workers * self.PIPELINE_QUEUE_PER_WORKER,
+                lambda job: max(map(self._decode_cost, job[0])), self.memory_budget):
+            for event in events:
+                self.metrics.add_event(event)
+            self._log(f"✓ Created shard: {shard_path}")
+            shards.append((shard_path, labels, size))
+        return shards
+    
+    def _write_shard(self, image_paths: List[str], shard_path: str) -> Tuple[List[str], int]:
+        """
+        Write one shard with the 'direct' backend.
+        
+        Returns:
+            Tuple[List[str], int]: The page labels and the size of the shard
+        """
+        labels = []
+        
+        def labelled(prepared_pages):
+            for label, prepared in prepared_pages:
+                labels.append(label)
+                yield label, prepared
+        
+        try:
+            with self._open_backend(shard_path, 'direct') as backend:
+                self._write_pages(backend, labelled(self._iter_prepared_pages(image_paths, 1, backend.known_keys)),
+                                  shard_path)
+                with self.metrics.stage('save'):
+                    backend.close()
+            self.metrics.count_written(backend.bytes_written)
+        except Exception as e:
+            self.metrics.document_finished(shard_path, len(labels), error=str(e))
+            raise
+        self.metrics.document_finished(shard_path, len(labels))
+        return labels, backend.bytes_written
+    
+    def _write_filled_shards(self, image_paths: List[str], output_path: str, max_pages: Optional[int],
+                             max_bytes: int, workers: int) -> List[Tuple[str, List[str], int]]:
+        """
+        Write pages (prepared by ``workers`` processes) into shards, starting
+        a new shard whenever the next page would take the current one past
+        ``max_bytes`` or ``max_pages``.
+        
+        Returns:
+            List[Tuple[str, List[str], int]]: ``(shard_path, page_labels,
+            bytes)`` for each shard, in order
+        """
+        metrics = self.metrics
+        shards = []
+        backend, labels = None, []
+        
+        def finish_shard():
+            with metrics.stage('save'):
+                backend.close()
+            metrics.count_written(backend.bytes_written)
+            metrics.document_finished(backend.output, len(labels))
+            shards.append((backend.output, labels, backend.bytes_written))
+            self._log(f"✓ Created shard: {backend.output}")
+        
+        try:
+            # Pages are encoded before they are assigned to a shard, so
+            # duplicates are only shared within a shard, by the backend
+            for label, (key, pdf_image, placement) in self._iter_prepared_pages(image_paths, workers):
+                shared = backend is not None and key is not None and key in backend.known_keys
+                size = 0 if shared else len(pdf_image.data) + (len(pdf_image.smask.data) if pdf_image.smask else 0)
+                if backend is not None and backend.page_count and (
+                        backend.bytes_written + size > max_bytes
+                        or (max_pages and backend.page_count >= max_pages)):
+                    finish_shard()
+                    backend = None
+                if backend is None:
+                    backend, labels = self._open_backend(self._shard_path(output_path, len(shards) + 1),
+                                                         'direct'), []
+                with metrics.stage('page_write'):
+                    backend.add_page(key, pdf_image, placement)
+                labels.append(label)
+                metrics.file_finished(label, backend.output)
+                self._log(f"✓ Added to PDF: {label}")
+            finish_shard()
+        except Exception as e:
+            if backend is not None:
+                backend.abort()
+                metrics.document_finished(backend.output, len(labels), error=str(e))
+            raise
+        return shards
+    
+    def _write_shard_index(self, output_path: str, shards: List[Tuple[str, List[str], int]],
+                           max_pages: Optional[int], max_bytes: Optional[int]) -> str:
+        """
+        Write the JSON index of a sharded merge next to its shards.
+        
+        Returns:
+            str: Path of the index file
+        """
+        import json
+        
+        entries = []
+        first_page = 1
+        for shard_path, labels, size in shards:
+            entries.append({'file': os.path.basename(shard_path), 'first_page': first_page,
+                            'last_page': first_page + len(labels) - 1, 'pages': len(labels),
+                            'bytes': size, 'images': labels})
+            first_page += len(labels)
+        index = {'output': os.path.basename(output_path), 'pages': first_page - 1,
+                 'max_pages_per_file': max_pages, 'max_bytes_per_file': max_bytes,
+                 'shards': entries}
+        
+        index_path = os.path.splitext(output_path)[0] + '.index.json'
+        temp_path = index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(temp_path, index_path)
+        return index_path
+    
+    def convert_image_data(self, image, output=None) -> Optional[bytes]:
+        """
+        Convert one in-memory image to a single-page PDF without touching the disk.
+        
+        Args:
+            image: Image as bytes, bytearray, memoryview, a binary file
+                object or a PIL image
+            output: Writable binary stream (or path) for the PDF (optional)
             
-            # Add image to current page
-            c.drawImage(image_path, x, y, width=pdf_width, height=pdf_height)
+        Returns:
+            Optional[bytes]: The PDF, if no ``output`` was given
+        """
+        return self.convert_multiple_image_data([image], output)
+    
+    def convert_multiple_image_data(self, images, output=None) -> Optional[bytes]:
+        """
+        Convert in-memory images into one PDF, one page per image, without
+        touching the disk.
+        
+        Pages are written to ``output`` by the 'direct' backend as soon as
+        each image is encoded, so a caller-supplied stream (a socket file or
+        HTTP response, say) receives the document incrementally. Passthrough
+        JPEG data is written straight from the caller's buffer.
+        
+        Args:
+            images: Iterable of images, each given as bytes, bytearray,
+                memoryview, a binary file object or a PIL image
+            output: Writable binary stream (or path) for the PDF (optional)
             
-            # Add new page if not the last image
-            if i < len(valid_paths) - 1:
-                c.showPage()
+        Returns:
+            Optional[bytes]: The PDF, if no ``output`` was given
+        """
+        buffer = io.BytesIO() if output is None else output
+        output_name = '<memory>' if output is None else str(getattr(output, 'name', '<stream>'))
+        metrics = self.metrics
+        backend = DirectBackend(buffer, self.page_size)
+        
+        def iter_pages():
+            for index, image in enumerate(images):
+                label = image if isinstance(image, (str, os.PathLike)) else f"<image {index + 1}>"
+                yield from self._iter_source_pages(image, label, backend.known_keys)
+        
+        try:
+            with backend:
+                self._write_pages(backend, iter_pages(), output_name)
+                if not backend.page_count:
+                    raise ValueError("No images provided")
+                with metrics.stage('save'):
+                    backend.close()
+            metrics.count_written(backend.bytes_written)
+        except Exception as e:
+            metrics.document_finished(output_name, backend.page_count, error=str(e))
+            raise
+        
+        metrics.document_finished(output_name, backend.page_count)
+        return buffer.getvalue() if output is None else None
+    
+    def convert_images(self, image_paths: List[str], output_dir: str = None, workers: int = 1,
+                       progress: Callable[[ConversionProgress], None] = None,
+                       cancel: CancelToken = None,
+                       source_dir: str = None) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        Convert each image to its own PDF file, optionally using several worker processes.
+        
+        A failing image never stops the rest of the run; its error message is
+        returned in place of an output path instead.
+        
+        Args:
+            image_paths (List[str]): List of image file paths
+            output_dir (str): Output directory for PDF files (optional, defaults
+                to each image's own directory)
+            workers (int): Number of worker processes (1 converts in-process,
+                0 or None uses every CPU)
+            progress (Callable[[ConversionProgress], None]): Called after
+                each image is converted or has failed (optional)
+            cancel (CancelToken): Token for stopping the conversion before
+                the next image, in which case ConversionCancelled is raised;
+                PDFs already finished are kept (optional)
+            source_dir (str): Directory the images were collected from; with
+                an output_dir, images in its subdirectories are written to the
+                same subdirectories of output_dir, so equal file names in
+                different subdirectories do not overwrite each other (optional)
             
-            print(f"✓ Added to PDF: {image_path}")
+        Returns:
+            List[Tuple[str, Optional[str], Optional[str]]]: One
+            ``(image_path, pdf_path, error)`` entry per input, in input order
+        """
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
         
-        c.save()
-        print(f"✓ Created multi-page PDF: {output_path}")
-        return output_path
+        if source_dir is not None and output_dir is not None:
+            jobs = [(image_path, self._mirrored_output_path(image_path, source_dir, output_dir))
+                    for image_path in image_paths]
+        else:
+            jobs = [(image_path, self._separate_output_path(image_path, output_dir))
+                    for image_path in image_paths]
+        if workers:
+            workers = min(workers, len(jobs))
+        tracker = _ProgressTracker(len(jobs), progress, cancel)
+        return list(self._iter_convert_jobs(jobs, workers, tracker))
     
-    def batch_convert_directory(self, directory_path: str, output_dir: str = None) -> List[str]:
+    def _mirrored_output_path(self, image_path: str, source_dir: str, output_dir: str) -> str:
+        """
+        Return the PDF path for an image found below ``source_dir``, in the
+        same subdirectory of ``output_dir`` (which is created if needed).
+        """
+        relative_dir = os.path.relpath(os.path.dirname(image_path), source_dir)
+        image_output_dir = os.path.normpath(os.path.join(output_dir, relative_dir))
+        if relative_dir != os.curdir:
+            os.makedirs(image_output_dir, exist_ok=True)
+        return self._separate_output_path(image_path, image_output_dir)
+    
+    def _separate_output_path(self, image_path: str, output_dir: str = None) -> str:
+        """Return the PDF path used for an image converted on its own."""
+        if output_dir is None:
+            return os.path.splitext(image_path)[0] + '.pdf'
+        return os.path.join(output_dir, os.path.splitext(os.path.basename(image_path))[0] + '.pdf')
+    
+    def _iter_convert_jobs(self, jobs, workers: int = 1, tracker: _ProgressTracker = None):
+        """
+        Run ``(image_path, output_path)`` jobs and yield
+        ``(image_path, pdf_path, error)`` for each one in input order, as soon
+        as it and every job before it have finished.
+        
+        ``jobs`` may be any iterable, including a lazy one; with a pool only
+        PIPELINE_QUEUE_PER_WORKER jobs per worker are taken from it ahead of
+        the results being consumed, and with a memory_budget a job only
+        starts while the decoded sizes of the running ones fit the budget.
+        A job whose worker process dies is reported as failed and the rest
+        of the batch carries on in a rebuilt pool. A ``tracker`` is advanced
+        for every finished job and checked for cancellation before each new
+        one starts and after each result is consumed.
+        """
+        if not workers:
+            workers = os.cpu_count() or 1
+        if tracker is not None:
+            jobs = tracker.iter_checked(jobs)
+        
+        def crashed(job, error):
+            # The worker died mid-job, so it never reported the failure itself
+            message = "the worker process converting it died unexpectedly (out of memory?)"
+            self.metrics.file_finished(job[0], error=message)
+            return None, message, None
+        
+        if workers <= 1:
+            outcomes = ((job, _convert_job(job, self) + (None,)) for job in jobs)
+        else:
+            outcomes = _ordered_pool_map(_pooled_convert_job, jobs, workers, self._worker_options(),
+                                         workers * self.PIPELINE_QUEUE_PER_WORKER,
+                                         lambda job: self._decode_cost(job[0]), self.memory_budget,
+                                         crashed)
+        
+        for (image_path, _), (output_pdf, error, event) in outcomes:
+            if event is not None:
+                # Finished in a worker process, which reports quietly
+                self.metrics.add_event(event)
+                if error is None:
+                    self._log(f"✓ Converted: {image_path} → {output_pdf}")
+            if error is not None:
+                print(f"✗ Error converting {image_path}: {error}")
+            if tracker is not None:
+                tracker.advance(image_path)
+            yield image_path, output_pdf, error
+            if tracker is not None:
+                # Jobs are taken from ``jobs`` ahead of their results, so
+                # that check alone would miss a cancel near the end
+                tracker.check()
+    
+    def batch_convert_directory(self, directory_path: str, output_dir: str = None,
+                                workers: int = 1, incremental: bool = False,
+                                use_hash: bool = False, recursive: bool = False,
+                                progress: Callable[[ConversionProgress], None] = None,
+                                cancel: CancelToken = None) -> List[str]:
         """
         Convert all images in a directory to individual PDF files.
         
+        Images are discovered lazily and converted while the directory is
+        still being read, so huge directories are never listed up front.
+        
         Args:
             directory_path (str): Path to the directory containing images
             output_dir (str): Output directory for PDF files (optional)
+            workers (int): Number of worker processes (1 converts in-process,
+                0 or None uses every CPU)
+            incremental (bool): Skip images already converted with the same
+                options according to the manifest in the output directory,
+                and record each new conversion there as it completes
+            use_hash (bool): In incremental mode, also record content hashes
+                so that touched but unchanged images are still skipped
+            recursive (bool): Also convert images in subdirectories, mirroring
+                the subdirectory layout under the output directory
+            progress (Callable[[ConversionProgress], None]): Called after
+                each image is converted or has failed; the total is unknown
+                because the directory is read lazily (optional)
+            cancel (CancelToken): Token for stopping the conversion before
+                the next image, in which case ConversionCancelled is raised
+                (optional)
             
         Returns:
             List[str]: List of created PDF file paths
@@ -177,39 +1577,253 @@ class ImageToPDFConverter:
         if not os.path.exists(directory_path):
             raise FileNotFoundError(f"Directory not found: {directory_path}")
         
-        # Find all image files in the directory
-        image_files = []
-        for ext in self.SUPPORTED_FORMATS:
-            pattern = os.path.join(directory_path, f"*{ext}")
-            image_files.extend(glob.glob(pattern))
-            pattern = os.path.join(directory_path, f"*{ext.upper()}")
-            image_files.extend(glob.glob(pattern))
-        
-        if not image_files:
-            print(f"No supported image files found in: {directory_path}")
-            return []
-        
         # Set output directory
         if output_dir is None:
             output_dir = directory_path
         else:
             os.makedirs(output_dir, exist_ok=True)
         
+        found = 0
+        tracker = _ProgressTracker(None, progress, cancel)
+        
+        def iter_jobs():
+            nonlocal found
+            for image_file in iter_image_files(directory_path, recursive=recursive, sort=False):
+                found += 1
+                yield image_file, self._mirrored_output_path(image_file, directory_path, output_dir)
+        
+        if not incremental:
+            created_pdfs = [output_pdf for _, output_pdf, error in self._iter_convert_jobs(iter_jobs(), workers, tracker)
+                            if error is None]
+            if not found:
+                print(f"No supported image files found in: {directory_path}")
+                return []
+            print(f"✓ Batch conversion completed. Created {len(created_pdfs)} PDF files.")
+            return created_pdfs
+        
         created_pdfs = []
-        for image_file in image_files:
-            try:
-                output_pdf = os.path.join(output_dir, Path(image_file).stem + '.pdf')
-                self.convert_single_image(image_file, output_pdf)
-                created_pdfs.append(output_pdf)
-            except Exception as e:
-                print(f"✗ Error converting {image_file}: {e}")
+        skipped = 0
+        with ConversionManifest(output_dir, self._output_options(), use_hash) as manifest:
+            def iter_pending():
+                nonlocal skipped
+                for image_file, output_pdf in iter_jobs():
+                    if manifest.is_up_to_date(image_file, output_pdf):
+                        created_pdfs.append(output_pdf)
+                        skipped += 1
+                    else:
+                        yield image_file, output_pdf
+            
+            for image_file, output_pdf, error in self._iter_convert_jobs(iter_pending(), workers, tracker):
+                if error is None:
+                    manifest.record(image_file, output_pdf)
+                    created_pdfs.append(output_pdf)
+            manifest.compact()
         
-        print(f"✓ Batch conversion completed. Created {len(created_pdfs)} PDF files.")
+        if not found:
+            print(f"No supported image files found in: {directory_path}")
+            return []
+        print(f"✓ Batch conversion completed. Created {len(created_pdfs) - skipped} PDF files, "
+              f"{skipped} already up to date.")
         return created_pdfs
 
 
+# Converter owned by each worker process, built once by _init_worker so that
+# every job in the pool reuses it instead of constructing a new one.
+_worker_converter = None
+
+
+def _init_worker(options: dict):
+    """Build the per-process converter used by _convert_job."""
+    global _worker_converter
+    _worker_converter = ImageToPDFConverter(quiet=True, **options)
+
+
+def _convert_job(job: Tuple[str, str], converter: ImageToPDFConverter = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Convert one image for convert_images, reporting failures instead of raising.
+    
+    Args:
+        job (Tuple[str, str]): ``(image_path, output_path)`` pair
+        converter (ImageToPDFConverter): Converter to use (defaults to the
+            worker process converter)
+        
+    Returns:
+        Tuple[Optional[str], Optional[str]]: ``(pdf_path, None)`` on success or
+        ``(None, error_message)`` on failure
+    """
+    image_path, output_path = job
+    try:
+        return (converter or _worker_converter).convert_single_image(image_path, output_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _pooled_convert_job(job: Tuple[str, str]) -> Tuple[Optional[str], Optional[str], dict]:
+    """Run _convert_job in a worker process and return its metrics event as well."""
+    output_pdf, error = _convert_job(job)
+    return output_pdf, error, _worker_converter.metrics.last_event
+
+
+def _ordered_pool_map(function, items, workers: int, options: dict, max_in_flight: int,
+                      cost: Callable[[object], int] = None, budget: int = None,
+                      on_crash: Callable[[object, BaseException], object] = None):
+    """
+    Apply a worker function to items in a process pool, yielding
+    ``(item, result)`` in input order.
+    
+    At most ``max_in_flight`` items are submitted but not yet yielded, so
+    ``items`` may be a lazy iterable of any length. An exception raised by
+    the function propagates when its item's turn comes.
+    
+    With a ``budget``, items are also admitted in order only while the
+    ``cost`` of the items still running, plus the next one, stays within
+    it. An item is always admitted when nothing else is running, so one
+    that costs more than the whole budget runs on its own.
+    
+    A worker that dies (crashes or is killed, e.g. when out of memory)
+    breaks the whole pool and fails every item in flight with it. The pool
+    is then rebuilt and those items are run again one at a time, so the one
+    that breaks the pool a second time is known for certain. Its result is
+    ``on_crash(item, error)``, or the BrokenProcessPool error propagates
+    when it has no ``on_crash``; the other items are unaffected.
+    """
+    from collections import deque
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+    from itertools import islice
+    
+    def new_executor():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,))
+    
+    remaining = iter(items)
+    executor = new_executor()
+    pending = deque()  # [item, future, run on its own] in input order
+    running = MemoryBudget(budget)  # Futures and their cost, until they are done
+    held = []  # The next item and its cost, while the budget holds it back
+    
+    def admit():
+        for future in running:
+            if future.done():
+                running.finish(future)
+        while len(pending) < max_in_flight:
+            if not held:
+                for item in islice(remaining, 1):
+                    held.append((item, cost(item) if budget else 0))
+                if not held:
+                    return
+            item, item_cost = held[0]
+            if not running.fits(item_cost):
+                return
+            try:
+                future = executor.submit(function, item)
+            except BrokenProcessPool:
+                return  # Submitted again once the pool is rebuilt
+            held.clear()
+            pending.append([item, future, False])
+            if budget:
+                running.start(future, item_cost)
+    
+    def rerun_alone():
+        # Wait for the broken pool to fail every future it still had, then
+        # run the items it took down one at a time in a fresh pool
+        nonlocal executor
+        executor.shutdown(wait=True)
+        executor = new_executor()
+        running.clear()
+        for entry in pending:
+            if not isinstance(entry[1].exception(), BrokenProcessPool):
+                continue
+            entry[1] = executor.submit(function, entry[0])
+            entry[2] = True
+            if isinstance(entry[1].exception(), BrokenProcessPool):
+                executor.shutdown(wait=True)
+                executor = new_executor()
+    
+    try:
+        admit()
+        while pending:
+            item, future, alone = pending[0]
+            while held and not future.done():
+                wait(list(running), return_when=FIRST_COMPLETED)
+                admit()
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                if not alone:
+                    rerun_alone()
+                    admit()
+                    continue
+                if on_crash is None:
+                    raise error
+                result = on_crash(item, error)
+            else:
+                result = future.result()
+            pending.popleft()
+            admit()
+            yield item, result
+    finally:
+        # When stopped early (an error, cancellation or the consumer
+        # closing us), drop queued jobs instead of waiting for them
+        for _, future, _ in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _write_shard_job(job: Tuple[List[str], str]) -> Tuple[List[str], int, List[dict]]:
+    """
+    Write one shard of a sharded merge in a worker process.
+    
+    ``job`` is ``(image_paths, shard_path)``. Returns the page labels, the
+    shard size and the metrics events of the shard.
+    """
+    image_paths, shard_path = job
+    events = []
+    _worker_converter.metrics.add_listener(events.append)
+    try:
+        labels, size = _worker_converter._write_shard(image_paths, shard_path)
+    finally:
+        _worker_converter.metrics.remove_listener(events.append)
+    return labels, size, events
+
+
+def _prepare_page_job(job: Tuple[str, Optional[int]]) -> Tuple[Tuple[Optional[str], Optional[PDFImage],
+                                                                     Tuple[float, float, float, float]], dict]:
+    """
+    Prepare one merged-PDF page in a worker process, returning its stage timings too.
+    
+    ``job`` is ``(image_path, frame)``; frame is None for a single-frame image.
+    """
+    image_path, frame = job
+    if frame is None:
+        prepared = _worker_converter._prepare_page(image_path)
+    else:
+        prepared = _worker_converter._prepare_frame_at(image_path, frame)
+    return prepared, _worker_converter.metrics.take_pending()
+
+
+def _parse_byte_size(text: str) -> int:
+    """Parse a size such as ``500000``, ``64K``, ``200M`` or ``2G`` (powers of 1024) for argparse."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*', text, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    size = float(match.group(1)) * 1024 ** ' KMG'.index(match.group(2).upper() or ' ')
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"size must be positive: {text!r}")
+    return int(size)
+
+
 def main():
     """Main function to handle command line arguments."""
+    if sys.argv[1:2] == ['serve']:
+        # HTTP service mode has its own options
+        from conversion_server import main as serve_main
+        serve_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['run-jobs']:
+        # Manifest mode: a whole batch of jobs in one process
+        from job_runner import main as run_jobs_main
+        run_jobs_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
         description="Convert images to PDF format",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -220,61 +1834,157 @@ Examples:
   python image_to_pdf_converter.py img1.jpg img2.png -m -o combined.pdf
   python image_to_pdf_converter.py -d /path/to/images/
   python image_to_pdf_converter.py -d /path/to/images/ --merge-all combined.pdf
+  python image_to_pdf_converter.py -d /path/to/images/ --jobs 8
+  python image_to_pdf_converter.py --watch /path/to/dropbox/ -o /path/to/pdfs/
+  python image_to_pdf_converter.py serve --port 8080   (see "serve --help")
+  python image_to_pdf_converter.py run-jobs jobs.jsonl --results results.jsonl   (see "run-jobs --help")
         """
     )
     
     # Input options
     parser.add_argument('images', nargs='*', help='Image file(s) to convert')
     parser.add_argument('-d', '--directory', help='Directory containing images to convert')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                       help='Include images in subdirectories of --directory or --watch')
+    parser.add_argument('--watch', metavar='DIR',
+                       help='Keep running and convert images as they are dropped into DIR')
+    parser.add_argument('--poll-interval', type=float, default=0.25,
+                       help='Seconds between scans in --watch mode (default: 0.25)')
+    parser.add_argument('--settle-time', type=float, default=0.5,
+                       help='Seconds a file must stay unchanged before --watch converts it (default: 0.5)')
     
     # Output options
     parser.add_argument('-o', '--output', help='Output PDF file path')
     parser.add_argument('-m', '--merge', action='store_true', 
                        help='Merge multiple images into a single PDF')
     parser.add_argument('--merge-all', help='Merge all images in directory into single PDF')
+    parser.add_argument('--streaming', action='store_true',
+                       help='Write merged PDFs page by page to keep memory use flat')
+    parser.add_argument('--max-pages-per-file', type=int, metavar='N',
+                       help='Split merged output into numbered PDFs of at most N pages, '
+                            'written in parallel with --jobs, plus an .index.json file')
+    parser.add_argument('--max-bytes-per-file', type=_parse_byte_size, metavar='SIZE',
+                       help='Split merged output into numbered PDFs of about SIZE bytes '
+                            '(e.g. 500M or 2G), plus an .index.json file')
     
     # PDF options
     parser.add_argument('--page-size', choices=['A4', 'Letter'], default='A4',
                        help='PDF page size (default: A4)')
     parser.add_argument('--margin', type=int, default=50,
                        help='Page margin in points (default: 50)')
+    parser.add_argument('--no-jpeg-passthrough', action='store_true',
+                       help='Decode and re-encode JPEGs instead of embedding them unchanged')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only convert new or changed images in directory mode, '
+                            'resuming interrupted runs')
+    parser.add_argument('--hash', action='store_true',
+                       help='With --incremental, compare content hashes as well as size and mtime')
+    parser.add_argument('--max-dpi', type=float,
+                       help='Downsample images above this resolution on the page')
+    parser.add_argument('--no-png-passthrough', action='store_true',
+                       help='Decode and re-compress PNGs instead of embedding their image data unchanged')
+    parser.add_argument('--all-frames', action='store_true',
+                       help='Add a page for every frame of multi-page TIFFs and animated '
+                            'GIF/WebP files instead of only the first')
+    parser.add_argument('--optimize', action='store_true',
+                       help='Embed images that are really grayscale or black and white '
+                            '(e.g. scanned documents) as 8-bit gray or 1-bit CCITT G4/Flate')
+    parser.add_argument('--flate-level', type=int, choices=range(10), default=6, metavar='0-9',
+                       help='zlib compression level for Flate-encoded images (default: 6)')
+    parser.add_argument('--jpeg-quality', type=int, choices=range(1, 96), metavar='1-95',
+                       default=ImageToPDFConverter.DOWNSAMPLE_JPEG_QUALITY,
+                       help='Quality for re-encoded JPEGs (default: '
+                            f'{ImageToPDFConverter.DOWNSAMPLE_JPEG_QUALITY})')
+    
+    # Performance options
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                       help='PDF writer: reportlab, or direct for the lighter built-in writer '
+                            f'(default: {DEFAULT_BACKEND})')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                       help='Worker processes for conversion; merges with more than one '
+                            'worker are written in streaming mode (0 = all CPUs, default: 1)')
+    parser.add_argument('--memory-budget', type=_parse_byte_size, metavar='SIZE',
+                       help='Decoded image data to hold at once (e.g. 2G): parallel jobs wait '
+                            'until their images fit, larger TIFFs and PNGs are decoded in bands '
+                            'and larger JPEGs at a reduced scale; other formats run alone')
+    
+    # Reporting options
+    parser.add_argument('-q', '--quiet', action='store_true',
+                       help='Only print errors and summaries, not a line per image')
+    parser.add_argument('--metrics-json', metavar='FILE',
+                       help='Write per-stage timings, byte counts and per-file events to FILE')
     
     args = parser.parse_args()
     
     # Initialize converter
-    converter = ImageToPDFConverter(page_size=args.page_size, margin=args.margin)
+    metrics = ConversionMetrics(keep_events=bool(args.metrics_json))
+    converter = ImageToPDFConverter(page_size=args.page_size, margin=args.margin,
+                                    jpeg_passthrough=not args.no_jpeg_passthrough,
+                                    target_dpi=args.max_dpi, all_frames=args.all_frames,
+                                    png_passthrough=not args.no_png_passthrough,
+                                    backend=args.backend, optimize=args.optimize,
+                                    flate_level=args.flate_level, jpeg_quality=args.jpeg_quality,
+                                    memory_budget=args.memory_budget, quiet=args.quiet,
+                                    metrics=metrics)
+    
+    if args.max_pages_per_file is not None and args.max_pages_per_file < 1:
+        parser.error("--max-pages-per-file must be at least 1")
+    
+    def merge(image_paths, output_path):
+        if args.max_pages_per_file or args.max_bytes_per_file:
+            converter.convert_sharded_images(image_paths, output_path,
+                                             max_pages_per_file=args.max_pages_per_file,
+                                             max_bytes_per_file=args.max_bytes_per_file,
+                                             workers=args.jobs)
+        else:
+            converter.convert_multiple_images(image_paths, output_path,
+                                              streaming=args.streaming,
+                                              workers=args.jobs)
     
     try:
-        if args.directory:
+        if args.watch:
+            # Hot-folder mode: one warm converter for the lifetime of the process
+            from hot_folder import HotFolderWatcher
+            watcher = HotFolderWatcher(converter, args.watch, args.output,
+                                       poll_interval=args.poll_interval,
+                                       settle_time=args.settle_time,
+                                       recursive=args.recursive,
+                                       merge=args.merge,
+                                       workers=args.jobs)
+            watcher.run()
+        
+        elif args.directory:
             # Directory mode
             if args.merge_all:
                 # Merge all images in directory into one PDF
-                image_files = []
-                for ext in converter.SUPPORTED_FORMATS:
-                    pattern = os.path.join(args.directory, f"*{ext}")
-                    image_files.extend(glob.glob(pattern))
-                    pattern = os.path.join(args.directory, f"*{ext.upper()}")
-                    image_files.extend(glob.glob(pattern))
+                image_files = list(iter_image_files(args.directory, recursive=args.recursive))
                 
                 if image_files:
-                    converter.convert_multiple_images(image_files, args.merge_all)
+                    merge(image_files, args.merge_all)
                 else:
                     print(f"No supported image files found in: {args.directory}")
             else:
                 # Convert each image to separate PDF
                 converter.batch_convert_directory(args.directory, 
-                                                args.output if args.output else None)
+                                                args.output if args.output else None,
+                                                workers=args.jobs,
+                                                incremental=args.incremental,
+                                                use_hash=args.hash,
+                                                recursive=args.recursive)
         
         elif args.images:
             # Image file(s) mode
             if args.merge or (len(args.images) > 1 and args.output):
                 # Merge multiple images into one PDF
-                output_path = args.output or 'merged_images.pdf'
-                converter.convert_multiple_images(args.images, output_path)
+                merge(args.images, args.output or 'merged_images.pdf')
             else:
                 # Convert each image to separate PDF
-                for image_path in args.images:
-                    converter.convert_single_image(image_path, args.output)
+                if len(args.images) == 1:
+                    converter.convert_single_image(args.images[0], args.output)
+                else:
+                    results = converter.convert_images(args.images, workers=args.jobs)
+                    if any(error is not None for _, _, error in results):
+                        sys.exit(1)
         
         else:
             parser.print_help()
@@ -284,7 +1994,15 @@ Examples:
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
+    
+    finally:
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
 
 
 if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # Needed for worker processes in frozen (PyInstaller) Windows builds
+        import multiprocessing
+        multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+Job Runner
+Runs a whole JSONL manifest of conversion jobs in one process: a pool of warm
+worker processes takes jobs in priority order, retries failures, kills jobs
+that run past their timeout and appends one result line per job to a JSONL
+results log.
+
+Each manifest line is one job, for example:
+  {"id": "invoice-42", "inputs": ["scans/42/"], "output": "out/invoice-42.pdf",
+   "priority": 10, "retries": 2, "timeout": 300, "optimize": true}
+"""
+
+import argparse
+import contextlib
+import glob
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing.connection import wait
+from typing import Dict, IO, List, NamedTuple, Optional, Tuple
+
+from image_to_pdf_converter import ImageToPDFConverter, _parse_byte_size, iter_image_files
+from memory_budget import MemoryBudget
+
+
+# 'merge' writes all inputs into one PDF (or shards), 'separate' one PDF per image
+JOB_MODES = ('merge', 'separate')
+
+# Manifest keys passed straight to ImageToPDFConverter
+CONVERTER_OPTIONS = ('page_size', 'margin', 'jpeg_passthrough', 'png_passthrough', 'target_dpi',
+                     'all_frames', 'optimize', 'flate_level', 'jpeg_quality', 'backend', 'memory_budget')
+
+# Other keys a job may have
+JOB_KEYS = ('id', 'inputs', 'output', 'mode', 'recursive', 'streaming', 'max_pages_per_file',
+            'max_bytes_per_file', 'priority', 'retries', 'timeout')
+
+
+class ManifestError(ValueError):
+    """Raised for a manifest line that is not a valid job."""
+
+
+class Job(NamedTuple):
+    """One validated manifest entry."""
+    id: str
+    line: int  # Line number in the manifest, which also breaks priority ties
+    spec: dict  # The manifest entry, as given
+    priority: int
+    retries: int
+    timeout: Optional[float]
+
+
+def parse_job(spec, line: int, default_retries: int = 0, default_timeout: float = None) -> Job:
+    """
+    Validate a manifest entry.
+
+    Args:
+        spec: Decoded JSON of the manifest line
+        line (int): Line number, used as the default job id
+        default_retries (int): Retries for jobs that do not set ``retries``
+        default_timeout (float): Timeout for jobs that do not set ``timeout``
+
+    Returns:
+        Job: The validated job
+
+    Raises:
+        ManifestError: If the entry is not a valid job
+    """
+    if not isinstance(spec, dict):
+        raise ManifestError("Job must be a JSON object")
+    unknown = set(spec) - set(JOB_KEYS) - set(CONVERTER_OPTIONS)
+    if unknown:
+        raise ManifestError(f"Unknown job keys: {', '.join(sorted(unknown))}")
+
+    inputs = spec.get('inputs')
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if not inputs or not all(isinstance(path, str) for path in inputs):
+        raise ManifestError("'inputs' must be a path or a non-empty list of paths")
+    mode = spec.get('mode', 'merge')
+    if mode not in JOB_MODES:
+        raise ManifestError(f"'mode' must be one of: {', '.join(JOB_MODES)}")
+    if mode == 'merge' and not isinstance(spec.get('output'), str):
+        raise ManifestError("Merge jobs need an 'output' PDF path")
+    for name in ('max_bytes_per_file', 'memory_budget'):
+        if name in spec:
+            try:
+                _job_byte_size(spec[name])
+            except (TypeError, argparse.ArgumentTypeError) as e:
+                raise ManifestError(f"'{name}': {e}")
+
+    priority = spec.get('priority', 0)
+    retries = spec.get('retries', default_retries)
+    timeout = spec.get('timeout', default_timeout)
+    if not isinstance(priority, int):
+        raise ManifestError("'priority' must be an integer")
+    if not isinstance(retries, int) or retries < 0:
+        raise ManifestError("'retries' must be a non-negative integer")
+    if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+        raise ManifestError("'timeout' must be a positive number of seconds")
+    return Job(str(spec.get('id', line)), line, spec, priority, retries, timeout)
+
+
+def _job_byte_size(value) -> int:
+    """Accept a byte count as a number or a string such as '500M'."""
+    return value if isinstance(value, int) and value > 0 else _parse_byte_size(value)
+
+
+def read_manifest(lines, default_retries: int = 0,
+                  default_timeout: float = None) -> Tuple[List[Job], List[dict]]:
+    """
+    Parse manifest lines, skipping blank lines and ``#`` comments.
+
+    Returns:
+        Tuple[List[Job], List[dict]]: The valid jobs, and an ``invalid``
+        result record for every line that is not one
+    """
+    jobs, invalid = [], []
+    seen = set()
+    for number, text in enumerate(lines, 1):
+        text = text.strip()
+        if not text or text.startswith('#'):
+            continue
+        spec = None
+        try:
+            try:
+                spec = json.loads(text)
+            except ValueError as e:
+                raise ManifestError(f"Invalid JSON: {e}")
+            job = parse_job(spec, number, default_retries, default_timeout)
+            if job.id in seen:
+                raise ManifestError(f"Duplicate job id: {job.id}")
+        except ManifestError as e:
+            job_id = spec.get('id', number) if isinstance(spec, dict) else number
+            invalid.append({'id': str(job_id), 'line': number, 'status': 'invalid',
+                            'attempts': 0, 'outputs': [], 'pages': 0, 'seconds': 0.0, 'error': str(e)})
+            continue
+        seen.add(job.id)
+        jobs.append(job)
+    return jobs, invalid
+
+
+def _expand_inputs(spec: dict) -> List[str]:
+    """Return the image paths of a job, listing the images of any input directories."""
+    inputs = spec['inputs']
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(iter_image_files(path, recursive=spec.get('recursive', False)))
+        else:
+            paths.append(path)
+    return paths
+
+
+def _converter_options(spec: dict) -> dict:
+    options = {name: spec[name] for name in CONVERTER_OPTIONS if name in spec}
+    if 'memory_budget' in options:
+        options['memory_budget'] = _job_byte_size(options['memory_budget'])
+    return options
+
+
+def run_job(spec: dict, converters: Dict[tuple, ImageToPDFConverter] = None) -> dict:
+    """
+    Run one job in the current process.
+
+    Args:
+        spec (dict): Validated manifest entry
+        converters (Dict[tuple, ImageToPDFConverter]): Converters already
+            built for earlier jobs, keyed by their options; reused and
+            extended (optional)
+
+    Returns:
+        dict: ``outputs`` (created PDFs) and ``pages`` (images converted)
+
+    Raises:
+        Exception: If the job failed; for 'separate' jobs, if any image failed
+    """
+    options = _converter_options(spec)
+    key = tuple(sorted(options.items()))
+    converter = converters.get(key) if converters is not None else None
+    if converter is None:
+        converter = ImageToPDFConverter(quiet=True, **options)
+        if converters is not None:
+            converters[key] = converter
+
+    image_paths = _expand_inputs(spec)
+    if not image_paths:
+        raise ValueError("No input images found")
+    converted_before = converter.metrics.files_converted
+
+    if spec.get('mode', 'merge') == 'separate':
+        results = converter.convert_images(image_paths, spec.get('output'))
+        errors = [f"{image_path}: {error}" for image_path, _, error in results if error is not None]
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {len(results)} images failed: {'; '.join(errors[:3])}")
+        outputs = [pdf_path for _, pdf_path, _ in results]
+    elif spec.get('max_pages_per_file') or spec.get('max_bytes_per_file'):
+        max_bytes = spec.get('max_bytes_per_file')
+        outputs = converter.convert_sharded_images(
+            image_paths, spec['output'], max_pages_per_file=spec.get('max_pages_per_file'),
+            max_bytes_per_file=_job_byte_size(max_bytes) if max_bytes else None)
+    else:
+        # Sharded merges and separate PDFs create their output directory themselves
+        output_dir = os.path.dirname(spec['output'])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        outputs = [converter.convert_multiple_images(image_paths, spec['output'],
+                                                     streaming=spec.get('streaming', False))]
+    return {'outputs': outputs, 'pages': converter.metrics.files_converted - converted_before}
+
+
+def _planned_outputs(spec: dict) -> List[str]:
+    """Return the files a job may write, for cleaning up after an interrupted attempt."""
+    if spec.get('mode', 'merge') == 'separate':
+        output_dir = spec.get('output')
+        try:
+            image_paths = _expand_inputs(spec)
+        except OSError:
+            return []
+        return [os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.pdf')
+                if output_dir else os.path.splitext(path)[0] + '.pdf'
+                for path in image_paths]
+    root, extension = os.path.splitext(spec['output'])
+    return ([spec['output'], root + '.index.json']
+            + glob.glob(glob.escape(root) + '-[0-9][0-9][0-9][0-9]' + glob.escape(extension or '.pdf')))
+
+
+def _output_stats(spec: dict) -> Dict[str, Tuple[int, int, int]]:
+    """
+    Return ``(size, mtime_ns, inode)`` of each planned output that exists.
+
+    Taken before an attempt starts, so that after a kill the files it
+    created or rewrote can be told apart from older ones by comparing,
+    rather than by timestamps that may be coarser than the clock.
+    """
+    stats = {}
+    for path in _planned_outputs(spec):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    return stats
+
+
+def _worker_main(connection):
+    """
+    Worker process loop: receive job specs, run them and send back results
+    until None is received.
+
+    Converters are kept per option set, so jobs with the same settings share
+    a warm converter. The converter's own console output is discarded; the
+    runner reports each job instead.
+    """
+    converters = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        while True:
+            try:
+                spec = connection.recv()
+            except EOFError:
+                return
+            if spec is None:
+                return
+            try:
+                result = ('ok', run_job(spec, converters))
+            except Exception as e:
+                result = ('error', f"{type(e).__name__}: {e}")
+            connection.send(result)
+
+
+class _Worker:
+    """A worker process and the job attempt it is running."""
+
+    def __init__(self):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_connection,),
+                                               daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.job: Optional[Job] = None
+        self.attempt = 0
+        self.started = 0.0
+        self.started_wall = 0.0
+        self.outputs_before: Dict[str, Tuple[int, int, int]] = {}
+
+    @property
+    def deadline(self) -> Optional[float]:
+        if self.job is None or self.job.timeout is None:
+            return None
+        return self.started + self.job.timeout
+
+    def start(self, job: Job, attempt: int, spec: dict):
+        self.job, self.attempt = job, attempt
+        self.started, self.started_wall = time.monotonic(), time.time()
+        self.outputs_before = _output_stats(spec)
+        self.connection.send(spec)
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.process.join()
+        self.connection.close()
+
+
+class JobRunner:
+    """
+    Run jobs on a pool of warm worker processes.
+
+    Jobs start in priority order (highest first, then manifest order). A
+    job that fails, crashes its worker or runs past its timeout is retried
+    up to its ``retries`` count; timed-out and crashed workers are killed and
+    replaced. Any files an attempt that did not succeed wrote are removed,
+    so a retry starts from the state before the job. Each
+    job's final outcome is appended to the results log as one JSON line as
+    soon as it is known.
+
+    With a memory_budget, all workers share it: the next job only starts
+    while its cost (the decoded size of its largest image, estimated from
+    the image headers) fits beside the costs of the jobs running, and jobs
+    after it wait their turn. A job costing more than the whole budget runs
+    once no other job is running.
+    """
+
+    def __init__(self, workers: int = None, results: IO[str] = None, quiet: bool = False,
+                 memory_budget: int = None):
+        """
+        Initialize the runner.
+
+        Args:
+            workers (int): Worker processes (defaults to every CPU)
+            results (IO[str]): Text stream for the JSONL results log
+                (optional)
+            quiet (bool): Only print failures and the summary
+            memory_budget (int): Bytes of decoded image data all workers
+                may hold at once (optional); also the converter
+                ``memory_budget`` of jobs that do not set their own
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.results = results
+        self.quiet = quiet
+        self.memory_budget = memory_budget
+        self._cost_converters: Dict[tuple, ImageToPDFConverter] = {}
+
+    def _job_spec(self, job: Job) -> dict:
+        """Return the spec a worker runs for a job, with the runner's memory budget filled in."""
+        if self.memory_budget and 'memory_budget' not in job.spec:
+            return dict(job.spec, memory_budget=self.memory_budget)
+        return job.spec
+
+    def _job_cost(self, spec: dict) -> int:
+        """
+        Estimate the decoded bytes a job holds at once: jobs convert one
+        image at a time, so that of its largest image.
+        """
+        if not self.memory_budget:
+            return 0
+        options = _converter_options(spec)
+        key = tuple(sorted(options.items()))
+        converter = self._cost_converters.get(key)
+        if converter is None:
+            converter = self._cost_converters[key] = ImageToPDFConverter(quiet=True, **options)
+        try:
+            image_paths = _expand_inputs(spec)
+        except OSError:
+            return 0  # Fails without decoding anything
+        return max(map(converter._decode_cost, image_paths), default=0)
+
+    def log_result(self, record: dict) -> dict:
+        """Append a result record to the results log."""
+        if self.results is not None:
+            self.results.write(json.dumps(record) + '\n')
+            self.results.flush()
+        return record
+
+    def run(self, jobs: List[Job]) -> List[dict]:
+        """
+        Run every job and return their result records, in completion order.
+
+        Records have ``id``, ``status`` ('succeeded', 'failed' or
+        'timed_out'), ``attempts``, ``outputs``, ``pages``, ``seconds`` (of
+        the last attempt), ``error``, ``started_at`` and ``finished_at``.
+        """
+        queue = [(-job.priority, job.line, 1, job) for job in jobs]
+        heapq.heapify(queue)
+        workers = [_Worker() for _ in range(min(self.workers, len(jobs)))]
+        budget = MemoryBudget(self.memory_budget)
+        costs = {}  # Job id -> cost, worked out once for all attempts
+        records = []
+        try:
+            while queue or any(worker.job is not None for worker in workers):
+                for worker in workers:
+                    if worker.job is None and queue:
+                        _, _, attempt, job = queue[0]
+                        spec = self._job_spec(job)
+                        if job.id not in costs:
+                            costs[job.id] = self._job_cost(spec)
+                        if not budget.fits(costs[job.id]):
+                            break  # Until running jobs make room
+                        heapq.heappop(queue)
+                        budget.start(job.id, costs[job.id])
+                        worker.start(job, attempt, spec)
+
+                busy = [worker for worker in workers if worker.job is not None]
+                deadlines = [worker.deadline for worker in busy if worker.deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                ready = wait([worker.connection for worker in busy], timeout)
+
+                for index, worker in enumerate(workers):
+                    if worker.job is None:
+                        continue
+                    if worker.connection in ready:
+                        try:
+                            status, result = worker.connection.recv()
+                        except (EOFError, OSError):
+                            # The pipe closes just before the process can be reaped
+                            worker.process.join(5)
+                            status, result = 'crashed', (f"Worker process exited with code "
+                                                         f"{worker.process.exitcode}")
+                    elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                        status, result = 'timed_out', f"Timed out after {worker.job.timeout:g} s"
+                    else:
+                        continue
+
+                    job, attempt, before = worker.job, worker.attempt, worker.outputs_before
+                    budget.finish(job.id)
+                    record = self._finish_attempt(worker, status, result)
+                    if status in ('crashed', 'timed_out'):
+                        worker.stop(kill=True)
+                        workers[index] = worker = _Worker()
+                    worker.job = None
+                    if status != 'ok':
+                        self._remove_partial_outputs(job, before)
+
+                    if record['status'] != 'succeeded' and attempt <= job.retries:
+                        print(f"⚠ Job {job.id} attempt {attempt} {record['status']}, retrying: "
+                              f"{record['error']}")
+                        heapq.heappush(queue, (-job.priority, job.line, attempt + 1, job))
+                    else:
+                        records.append(self.log_result(record))
+                        self._report(record)
+        finally:
+            for worker in workers:
+                worker.stop(kill=worker.job is not None)
+                if worker.job is not None:
+                    self._remove_partial_outputs(worker.job, worker.outputs_before)
+        return records
+
+    def _finish_attempt(self, worker: _Worker, status: str, result) -> dict:
+        """Build the result record of the attempt a worker just finished."""
+        succeeded = status == 'ok'
+        return {
+            'id': worker.job.id,
+            'line': worker.job.line,
+            'status': 'succeeded' if succeeded else 'timed_out' if status == 'timed_out' else 'failed',
+            'attempts': worker.attempt,
+            'outputs': result['outputs'] if succeeded else [],
+            'pages': result['pages'] if succeeded else 0,
+            'seconds': round(time.monotonic() - worker.started, 3),
+            'error': None if succeeded else result,
+            'started_at': _timestamp(worker.started_wall),
+            'finished_at': _timestamp(time.time()),
+        }
+
+    def _report(self, record: dict):
+        if record['status'] == 'succeeded':
+            if not self.quiet:
+                print(f"✓ Job {record['id']}: {len(record['outputs'])} PDF(s), {record['pages']} images "
+                      f"in {record['seconds']:.2f} s")
+        else:
+            print(f"✗ Job {record['id']} {record['status']} after {record['attempts']} attempt(s): "
+                  f"{record['error']}")
+
+    @staticmethod
+    def _remove_partial_outputs(job: Job, before: Dict[str, Tuple[int, int, int]]):
+        """
+        Remove files a failed or killed attempt may have left behind, half
+        written or not: planned outputs that did not exist when it started
+        (``before``, from _output_stats) or have changed since.
+        """
+        for path, stat in _output_stats(job.spec).items():
+            if before.get(path) != stat:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _timestamp(seconds: float) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+
+def main(argv: List[str] = None):
+    """Run a job manifest from the command line."""
+    parser = argparse.ArgumentParser(
+        prog='image_to_pdf_converter.py run-jobs',
+        description="Run a JSONL manifest of conversion jobs on a pool of warm worker processes",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Each manifest line is one job. Keys: id, inputs (paths or directories),
+output, mode (merge or separate), recursive, streaming, max_pages_per_file,
+max_bytes_per_file, priority (higher runs first), retries, timeout (seconds)
+and the converter options page_size, margin, jpeg_passthrough,
+png_passthrough, target_dpi, all_frames, optimize, flate_level,
+jpeg_quality, backend and memory_budget (bytes, or a size such as "1G").
+
+Examples:
+  python image_to_pdf_converter.py run-jobs jobs.jsonl --results results.jsonl -j 8
+  python image_to_pdf_converter.py run-jobs jobs.jsonl --retries 2 --timeout 600
+        """
+    )
+    parser.add_argument('manifest', help="JSONL job manifest ('-' reads standard input)")
+    parser.add_argument('--results', metavar='FILE',
+                        help='Append one JSON result line per job to FILE')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='Worker processes (0 = all CPUs, default: 0)')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='Retries for jobs that do not set "retries" (default: 0)')
+    parser.add_argument('--timeout', type=float,
+                        help='Timeout in seconds for jobs that do not set "timeout" (default: none)')
+    parser.add_argument('--memory-budget', type=_parse_byte_size, metavar='SIZE',
+                        help='Decoded image data all workers may hold at once (e.g. 4G); a job '
+                             'waits until its largest image fits beside the running jobs, and '
+                             'jobs that set no "memory_budget" use it as theirs')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Only print failures and the summary, not a line per job')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.manifest == '-':
+            jobs, invalid = read_manifest(sys.stdin, args.retries, args.timeout)
+        else:
+            with open(args.manifest, encoding='utf-8') as f:
+                jobs, invalid = read_manifest(f, args.retries, args.timeout)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    with contextlib.ExitStack() as stack:
+        results = None
+        if args.results:
+            results = stack.enter_context(open(args.results, 'a', encoding='utf-8'))
+        runner = JobRunner(workers=args.jobs, results=results, quiet=args.quiet,
+                           memory_budget=args.memory_budget)
+        for record in invalid:
+            runner.log_result(record)
+            print(f"✗ Manifest line {record['line']}: {record['error']}")
+        try:
+            records = runner.run(jobs)
+        except KeyboardInterrupt:
+            print("Stopped; unfinished jobs have no result line.")
+            sys.exit(130)
+
+    succeeded = sum(1 for record in records if record['status'] == 'succeeded')
+    summary = f"✓ Ran {len(records)} jobs: {succeeded} succeeded, {len(records) - succeeded} failed"
+    if invalid:
+        summary += f", {len(invalid)} invalid manifest lines skipped"
+    print(summary)
+    if succeeded < len(records) or invalid:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
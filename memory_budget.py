@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+Memory Budget
+Estimates how much memory an image takes once decoded, from its header
+alone, admits work against a shared budget of decoded bytes, and decodes
+TIFF and PNG images that are too large to hold in memory one band of rows
+at a time.
+"""
+
+import io
+import os
+import re
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from pdf_writer import PNG_SIGNATURE, _png_chunk
+
+
+# Bytes per pixel of Pillow's in-memory image modes ('RGB' is stored padded
+# to four bytes); modes not listed take four
+MODE_BYTES = {'1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'I;16B': 2, 'I;16L': 2}
+
+# Decoded size aimed for when an image is read in bands
+BAND_BYTES = 16 * 1024 * 1024
+
+# Sizes of the TIFF field types, by type number
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
+# Tags copied into the TIFF each band is decoded from: everything needed to
+# interpret the pixel data (bits and samples, compression, photometric
+# interpretation, predictor, colour map, JPEG tables, YCbCr layout...)
+TIFF_DECODE_TAGS = {258, 259, 262, 266, 277, 284, 292, 293, 317, 320, 338, 339,
+                    347, 529, 530, 531, 532}
+
+# Pillow mode and raw mode of the PNG layouts that can be decoded in bands,
+# by (bit depth, colour type); the same as Pillow's own PNG decoder uses.
+# 16-bit RGB and RGBA are left out: no 8-bit colour type has their 6 and 8
+# bytes per pixel (see PngBands)
+PNG_BAND_LAYOUTS = {(1, 0): ('1', '1'), (2, 0): ('L', 'L;2'), (4, 0): ('L', 'L;4'),
+                    (8, 0): ('L', 'L'), (16, 0): ('I;16', 'I;16B'), (8, 2): ('RGB', 'RGB'),
+                    (1, 3): ('P', 'P;1'), (2, 3): ('P', 'P;2'), (4, 3): ('P', 'P;4'),
+                    (8, 3): ('P', 'P'), (8, 4): ('LA', 'LA'), (16, 4): ('RGBA', 'LA;16B'),
+                    (8, 6): ('RGBA', 'RGBA')}
+
+# Samples per pixel of the PNG colour types
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# 8-bit PNG colour type and Pillow mode with 1, 2, 3 and 4 bytes per pixel
+PNG_BYTE_VIEWS = {1: (0, 'L'), 2: (4, 'LA'), 3: (2, 'RGB'), 4: (6, 'RGBA')}
+
+
+def decoded_size(width: int, height: int, mode: str) -> int:
+    """Return the bytes Pillow needs to hold a decoded ``width`` x ``height`` image in ``mode``."""
+    return width * height * MODE_BYTES.get(mode, 4)
+
+
+def open_image(source):
+    """
+    Open an image with Pillow, leaving the decompression-bomb check of TIFF
+    and JPEG files to the caller.
+
+    Image.open rejects an image of over twice ``Image.MAX_IMAGE_PIXELS``
+    as soon as it reads the header, yet a huge TIFF can still be decoded
+    in bands and a huge JPEG at a reduced scale. Those two formats are
+    opened through their Pillow plugins directly, which make no such check
+    and leave Pillow's process-wide limit alone, so callers must check the
+    size they go on to decode. Other formats go through Image.open.
+
+    Args:
+        source: Path or binary file object, as for ``PIL.Image.open``
+
+    Returns:
+        PIL.Image.Image: The opened, not yet loaded, image
+    """
+    from PIL import Image, JpegImagePlugin, TiffImagePlugin
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            prefix = f.read(4)
+    else:
+        source.seek(0)
+        prefix = source.read(4)
+        source.seek(0)
+    if prefix in TiffImagePlugin.PREFIXES:
+        return TiffImagePlugin.TiffImageFile(source)
+    if prefix[:3] == b'\xff\xd8\xff':
+        return JpegImagePlugin.JpegImageFile(source)
+    return Image.open(source)
+
+
+def check_decode_size(width: int, height: int):
+    """
+    Apply Pillow's decompression-bomb limit to an image about to be decoded whole.
+
+    Raises:
+        PIL.Image.DecompressionBombError: Over twice ``Image.MAX_IMAGE_PIXELS``,
+            the size at which Image.open itself refuses an image
+    """
+    from PIL import Image
+
+    limit = Image.MAX_IMAGE_PIXELS
+    if limit and width * height > 2 * limit:
+        raise Image.DecompressionBombError(
+            f"Image size ({width * height} pixels) exceeds limit of {2 * limit} pixels, "
+            f"could be decompression bomb DOS attack.")
+
+
+class MemoryBudget:
+    """
+    Admission control against one budget of decoded image bytes shared by
+    all work running at once.
+
+    Work is started with its estimated cost (ImageToPDFConverter's
+    _decode_cost) and finished when done. Work fits while the costs of the
+    work running, plus its own, stay within the budget; with nothing
+    running anything fits, so work that costs more than the whole budget
+    runs on its own. Without a budget everything fits. Callers admit work
+    in order and hold back everything behind work that does not fit yet,
+    so large work is not starved by smaller work after it.
+    """
+
+    def __init__(self, budget: Optional[int]):
+        """
+        Args:
+            budget (int): Bytes of decoded image data allowed at once, or
+                None for no limit
+        """
+        self.budget = budget
+        self._running: Dict[object, int] = {}
+
+    def __iter__(self) -> Iterator:
+        """Iterate over (a copy of) the keys of the running work."""
+        return iter(list(self._running))
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    @property
+    def in_use(self) -> int:
+        """Total cost of the running work."""
+        return sum(self._running.values())
+
+    def fits(self, cost: int) -> bool:
+        """Check whether work of ``cost`` may start now."""
+        return not self.budget or not self._running or self.in_use + cost <= self.budget
+
+    def start(self, key, cost: int):
+        """Count work of ``cost``, identified by ``key``, as running."""
+        self._running[key] = cost
+
+    def finish(self, key):
+        """Stop counting the work identified by ``key``."""
+        self._running.pop(key, None)
+
+    def clear(self):
+        """Stop counting all work."""
+        self._running.clear()
+
+
+def open_bands(f: BinaryIO, frame: int = 0) -> Optional[Union['TiffBands', 'PngBands']]:
+    """
+    Prepare one image of a file for decoding a band of rows at a time.
+
+    Args:
+        f (BinaryIO): Seekable binary file object over the image file
+        frame (int): Index of the image (TIFF page) in the file
+
+    Returns:
+        Optional[Union[TiffBands, PngBands]]: The bands, or None if the
+        image cannot be decoded in bands (see TiffBands.open and
+        PngBands.open; other formats never can)
+    """
+    bands = TiffBands.open(f, frame)
+    if bands is None:
+        bands = PngBands.open(f, frame)
+    return bands
+
+
+class TiffBands:
+    """
+    Decode one image of a TIFF file a horizontal band of rows at a time.
+
+    Every band is decoded from a small stand-alone TIFF assembled in memory
+    from the decoding tags of the original image directory and only the
+    strips or tiles that cover the band, so neither the whole image nor its
+    whole compressed data is ever held at once. Uncompressed images can be
+    cut at any row, compressed ones at strip or tile-row boundaries.
+    """
+
+    def __init__(self, f: BinaryIO, byte_order: str, entries: Dict[int, Tuple[int, int, bytes]]):
+        """
+        Use ``open()``, which checks that the directory can be read in bands.
+
+        Args:
+            f (BinaryIO): The TIFF file
+            byte_order (str): '<' or '>' (struct byte order of the file)
+            entries (Dict[int, Tuple[int, int, bytes]]): The image directory,
+                as ``tag: (field type, count, 4-byte value field)``
+        """
+        self.f = f
+        self.byte_order = byte_order
+        self.entries = entries
+        self.width = self._value(256)
+        self.height = self._value(257)
+        self.compression = self._value(259, 1)
+        self.planes = self._value(277, 1) if self._value(284, 1) == 2 else 1
+        self.tiled = 322 in entries
+        if self.tiled:
+            self.tile_width = self._value(322)
+            self.tile_length = self._value(323)
+            self.offsets = self._values(324)
+            self.byte_counts = self._values(325)
+            self.unit = self.tile_length
+            per_plane = -(-self.width // self.tile_width) * -(-self.height // self.tile_length)
+        else:
+            self.rows_per_strip = min(self._value(278, self.height), self.height)
+            self.offsets = self._values(273)
+            self.byte_counts = self._values(279)
+            # Uncompressed strips can be split at any row
+            self.unit = 1 if self.compression == 1 else self.rows_per_strip
+            per_plane = -(-self.height // self.rows_per_strip)
+        self.per_plane = per_plane
+
+    @classmethod
+    def open(cls, f: BinaryIO, frame: int = 0) -> Optional['TiffBands']:
+        """
+        Read the directory of one image of a TIFF file.
+
+        Args:
+            f (BinaryIO): Seekable binary file object positioned anywhere
+                in the file
+            frame (int): Index of the image (page) in the file
+
+        Returns:
+            Optional[TiffBands]: The image, or None if the file is not a TIFF
+            or the image cannot be decoded in more than one band (a single
+            compressed strip, old-style JPEG compression or a damaged
+            directory)
+        """
+        try:
+            f.seek(0)
+            header = f.read(8)
+            if header[:4] == b'II*\x00':
+                byte_order = '<'
+            elif header[:4] == b'MM\x00*':
+                byte_order = '>'
+            else:
+                return None
+            offset = struct.unpack(byte_order + 'I', header[4:8])[0]
+            for _ in range(frame):
+                f.seek(offset)
+                count = struct.unpack(byte_order + 'H', f.read(2))[0]
+                f.seek(count * 12, io.SEEK_CUR)
+                offset = struct.unpack(byte_order + 'I', f.read(4))[0]
+                if not offset:
+                    return None
+
+            f.seek(offset)
+            count = struct.unpack(byte_order + 'H', f.read(2))[0]
+            data = f.read(count * 12)
+            entries = {}
+            for index in range(count):
+                tag, field_type, value_count = struct.unpack(byte_order + 'HHI', data[index * 12:index * 12 + 8])
+                if field_type in TIFF_TYPE_SIZES:
+                    entries[tag] = (field_type, value_count, data[index * 12 + 8:index * 12 + 12])
+
+            if not {256, 257}.issubset(entries) or not (
+                    {322, 323, 324, 325}.issubset(entries) or {273, 279}.issubset(entries)):
+                return None
+            bands = cls(f, byte_order, entries)
+        except (struct.error, ZeroDivisionError):
+            return None
+
+        if (bands.compression == 6 or bands.width <= 0 or bands.height <= 0
+                or len(bands.offsets) != bands.per_plane * bands.planes
+                or len(bands.byte_counts) != len(bands.offsets)
+                or bands.unit >= bands.height):
+            return None
+        return bands
+
+    def _raw(self, tag: int) -> bytes:
+        """Return the bytes of a tag's values, reading them from the file if stored out of line."""
+        field_type, count, field = self.entries[tag]
+        size = TIFF_TYPE_SIZES[field_type] * count
+        if size <= 4:
+            return field[:size]
+        self.f.seek(struct.unpack(self.byte_order + 'I', field)[0])
+        return self.f.read(size)
+
+    def _values(self, tag: int) -> Tuple[int, ...]:
+        """Return the values of a SHORT, LONG or BYTE tag."""
+        field_type, count, _ = self.entries[tag]
+        value_format = {1: 'B', 3: 'H', 4: 'I'}.get(field_type)
+        if value_format is None:
+            raise struct.error(f"unexpected type {field_type} for tag {tag}")
+        return struct.unpack(f'{self.byte_order}{count}{value_format}', self._raw(tag))
+
+    def _value(self, tag: int, default: int = None) -> int:
+        """Return the first value of a SHORT, LONG or BYTE tag, or ``default`` if absent."""
+        if tag not in self.entries:
+            if default is None:
+                raise struct.error(f"missing tag {tag}")
+            return default
+        return self._values(tag)[0]
+
+    def band_rows(self, max_bytes: int, mode: str) -> int:
+        """
+        Return how many rows to decode per band.
+
+        Args:
+            max_bytes (int): Decoded size each band should stay within
+            mode (str): Pillow mode the image decodes to
+
+        Returns:
+            int: Rows per band, a multiple of the strip or tile height (at
+            least one strip or tile row, whatever its size)
+        """
+        rows = max_bytes // max(1, decoded_size(self.width, 1, mode))
+        return max(self.unit, rows - rows % self.unit)
+
+    def iter_bands(self, rows: int) -> Iterator:
+        """
+        Decode the image band by band, top to bottom.
+
+        Each band is only valid until the next one is requested; callers
+        that keep pixels must copy them.
+
+        Args:
+            rows (int): Rows per band, as from band_rows()
+
+        Yields:
+            PIL.Image.Image: Loaded image of each band
+        """
+        for top in range(0, self.height, rows):
+            with open_image(io.BytesIO(self._band_tiff(top, min(top + rows, self.height)))) as band:
+                band.load()
+                yield band
+
+    def _band_tiff(self, top: int, bottom: int) -> bytes:
+        """Assemble a TIFF holding rows ``top`` to ``bottom`` of the image."""
+        if self.tiled:
+            first, last = top // self.tile_length, -(-bottom // self.tile_length)
+            across = -(-self.width // self.tile_width)
+            chunks = [self._read(plane * self.per_plane + row * across + column)
+                      for plane in range(self.planes)
+                      for row in range(first, last) for column in range(across)]
+            layout = {322: self.tile_width, 323: self.tile_length}
+            offset_tag, count_tag = 324, 325
+        elif self.compression == 1:
+            chunks = [self._uncompressed_rows(plane, top, bottom) for plane in range(self.planes)]
+            layout = {278: bottom - top}
+            offset_tag, count_tag = 273, 279
+        else:
+            first, last = top // self.rows_per_strip, -(-bottom // self.rows_per_strip)
+            chunks = [self._read(plane * self.per_plane + strip)
+                      for plane in range(self.planes) for strip in range(first, last)]
+            layout = {278: self.rows_per_strip}
+            offset_tag, count_tag = 273, 279
+
+        tags = {tag: (self.entries[tag][0], self.entries[tag][1], self._raw(tag))
+                for tag in TIFF_DECODE_TAGS if tag in self.entries}
+        order = self.byte_order
+        for tag, value in layout.items():
+            tags[tag] = (4, 1, struct.pack(order + 'I', value))
+        tags[256] = (4, 1, struct.pack(order + 'I', self.width))
+        tags[257] = (4, 1, struct.pack(order + 'I', bottom - top))
+        tags[count_tag] = (4, len(chunks), struct.pack(f'{order}{len(chunks)}I', *map(len, chunks)))
+        tags[offset_tag] = (4, len(chunks), bytes(4 * len(chunks)))  # Filled in below
+
+        # Header, directory, out-of-line values (word aligned), then the pixel data
+        position = 8 + 2 + len(tags) * 12 + 4
+        cursor = position + sum(len(value) + len(value) % 2 for _, _, value in tags.values() if len(value) > 4)
+        chunk_offsets = []
+        for chunk in chunks:
+            chunk_offsets.append(cursor)
+            cursor += len(chunk)
+        tags[offset_tag] = (4, len(chunks), struct.pack(f'{order}{len(chunks)}I', *chunk_offsets))
+
+        out_of_line = []
+        directory = [struct.pack(order + 'H', len(tags))]
+        for tag in sorted(tags):
+            field_type, count, value = tags[tag]
+            if len(value) <= 4:
+                directory.append(struct.pack(order + 'HHI', tag, field_type, count) + value.ljust(4, b'\0'))
+            else:
+                directory.append(struct.pack(order + 'HHII', tag, field_type, count, position))
+                padded = value + b'\0' * (len(value) % 2)
+                out_of_line.append(padded)
+                position += len(padded)
+        directory.append(b'\0\0\0\0')
+        header = (b'II*\x00' if order == '<' else b'MM\x00*') + struct.pack(order + 'I', 8)
+        return b''.join([header] + directory + out_of_line + chunks)
+
+    def _read(self, index: int) -> bytes:
+        """Read the compressed data of one strip or tile."""
+        self.f.seek(self.offsets[index])
+        return self.f.read(self.byte_counts[index])
+
+    def _uncompressed_rows(self, plane: int, top: int, bottom: int) -> bytes:
+        """Read rows ``top`` to ``bottom`` of one plane of an uncompressed, stripped image."""
+        bits = self._value(258, 1)
+        samples = 1 if self.planes > 1 else self._value(277, 1)
+        row_bytes = (self.width * bits * samples + 7) // 8
+        pieces: List[bytes] = []
+        row = top
+        while row < bottom:
+            strip, strip_row = divmod(row, self.rows_per_strip)
+            count = min(bottom - row, self.rows_per_strip - strip_row)
+            self.f.seek(self.offsets[plane * self.per_plane + strip] + strip_row * row_bytes)
+            pieces.append(self.f.read(count * row_bytes))
+            row += count
+        return b''.join(pieces)
+
+
+class PngBands:
+    """
+    Decode a PNG image a horizontal band of rows at a time.
+
+    The compressed image data is inflated only as far as each band needs.
+    A band's scanlines are still filtered against the rows above them, so
+    they are decoded by Pillow as a "byte view": a PNG of 8-bit samples
+    with as many bytes per pixel as the original layout, which unfilters
+    the same way, headed by the last unfiltered row of the band above.
+    Its bytes are the band's unfiltered scanlines, which Pillow then
+    unpacks with the raw mode its own PNG decoder would use.
+    """
+
+    def __init__(self, f: BinaryIO, width: int, height: int, bits: int, color_type: int,
+                 idat: List[Tuple[int, int]], palette: Optional[bytes], transparency: Optional[bytes]):
+        """
+        Use ``open()``, which checks that the image can be read in bands.
+
+        Args:
+            f (BinaryIO): The PNG file
+            width (int): Image width
+            height (int): Image height
+            bits (int): Bit depth
+            color_type (int): PNG colour type
+            idat (List[Tuple[int, int]]): Offset and length of each IDAT chunk's data
+            palette (bytes): Contents of the PLTE chunk, if any
+            transparency (bytes): Contents of the tRNS chunk, if any
+        """
+        self.f = f
+        self.width = width
+        self.height = height
+        self.mode, self.rawmode = PNG_BAND_LAYOUTS[(bits, color_type)]
+        self.idat = idat
+        self.palette = palette
+        self.transparency = transparency
+        self.row_bytes = (width * bits * PNG_CHANNELS[color_type] + 7) // 8
+        self.pixel_bytes = max(1, bits * PNG_CHANNELS[color_type] // 8)
+
+    @classmethod
+    def open(cls, f: BinaryIO, frame: int = 0) -> Optional['PngBands']:
+        """
+        Read the header chunks of a PNG file.
+
+        Args:
+            f (BinaryIO): Seekable binary file object positioned anywhere
+                in the file
+            frame (int): Index of the image; only the first can be banded
+
+        Returns:
+            Optional[PngBands]: The image, or None if the file is not a PNG
+            or the image cannot be decoded in bands (interlaced, 16-bit
+            RGB or RGBA, a later APNG frame, a single row or damaged chunks)
+        """
+        try:
+            f.seek(0)
+            if frame or f.read(8) != PNG_SIGNATURE:
+                return None
+            header = None
+            palette = transparency = None
+            idat = []
+            while True:
+                length, chunk_type = struct.unpack('>I4s', f.read(8))
+                if chunk_type == b'IDAT':
+                    idat.append((f.tell(), length))
+                elif idat or chunk_type == b'IEND':
+                    break
+                elif chunk_type == b'IHDR':
+                    header = struct.unpack('>IIBBBBB', f.read(13))
+                    length -= 13
+                elif chunk_type in (b'PLTE', b'tRNS'):
+                    data = f.read(length)
+                    length = 0
+                    if chunk_type == b'PLTE':
+                        palette = data
+                    else:
+                        transparency = data
+                f.seek(length + 4, io.SEEK_CUR)
+        except struct.error:
+            return None
+
+        if header is None or not idat:
+            return None
+        width, height, bits, color_type, _, _, interlace = header
+        if (interlace or (bits, color_type) not in PNG_BAND_LAYOUTS or width <= 0 or height <= 1
+                or (color_type == 3 and palette is None)):
+            return None
+        return cls(f, width, height, bits, color_type, idat, palette, transparency)
+
+    def band_rows(self, max_bytes: int, mode: str) -> int:
+        """
+        Return how many rows to decode per band.
+
+        Args:
+            max_bytes (int): Memory each band should stay within: its
+                decoded pixels, its byte view and the scanlines behind it
+            mode (str): Pillow mode the image decodes to
+
+        Returns:
+            int: Rows per band (at least one)
+        """
+        view_mode = PNG_BYTE_VIEWS[self.pixel_bytes][1]
+        row = (decoded_size(self.width, 1, mode)
+               + decoded_size(self.row_bytes // self.pixel_bytes, 1, view_mode) + 3 * self.row_bytes)
+        return max(1, max_bytes // row)
+
+    def iter_bands(self, rows: int) -> Iterator:
+        """
+        Decode the image band by band, top to bottom.
+
+        Args:
+            rows (int): Rows per band, as from band_rows()
+
+        Yields:
+            PIL.Image.Image: Loaded image of each band
+
+        Raises:
+            OSError: If the image data is damaged or ends early
+        """
+        from PIL import Image
+
+        view_type, _ = PNG_BYTE_VIEWS[self.pixel_bytes]
+        view_width = self.row_bytes // self.pixel_bytes
+        inflate = zlib.decompressobj()
+        compressed = self._iter_idat()
+        previous = bytes(self.row_bytes)  # Filters see zeros above the first row
+        for top in range(0, self.height, rows):
+            count = min(rows, self.height - top)
+            needed = count * (self.row_bytes + 1)
+            pieces = []
+            while needed:
+                # Inflate no more than the band needs, however well the data compressed
+                piece = inflate.unconsumed_tail or next(compressed, b'')
+                if not piece:
+                    raise OSError("PNG image data ends early")
+                try:
+                    pieces.append(inflate.decompress(piece, needed))
+                except zlib.error as e:
+                    raise OSError(f"Damaged PNG image data: {e}") from None
+                needed -= len(pieces[-1])
+
+            view = (PNG_SIGNATURE
+                    + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', view_width, count + 1, 8, view_type, 0, 0, 0))
+                    + _png_chunk(b'IDAT', zlib.compress(b''.join([b'\0', previous] + pieces), 0))
+                    + _png_chunk(b'IEND', b''))
+            with Image.open(io.BytesIO(view)) as view_image:
+                unfiltered = view_image.tobytes()
+            previous = unfiltered[-self.row_bytes:]
+            band = Image.frombytes(self.mode, (self.width, count), unfiltered[self.row_bytes:],
+                                   'raw', self.rawmode)
+            if self.palette is not None and self.mode == 'P':
+                band.putpalette(self.palette)
+            if self.transparency is not None:
+                self._set_transparency(band)
+            yield band
+
+    def _iter_idat(self) -> Iterator[bytes]:
+        """Read the IDAT chunks' data one chunk at a time."""
+        for offset, length in self.idat:
+            self.f.seek(offset)
+            yield self.f.read(length)
+
+    def _set_transparency(self, band):
+        """Record the tRNS chunk in ``band.info`` the way Pillow's PNG decoder does."""
+        data = self.transparency
+        if band.mode == 'P':
+            if re.fullmatch(b'\xff*\x00\xff*', data):
+                band.info['transparency'] = data.index(b'\0')
+            else:
+                band.info['transparency'] = data
+        elif band.mode == '1':
+            band.info['transparency'] = 255 if struct.unpack('>H', data[:2])[0] else 0
+        elif band.mode in ('L', 'I;16'):
+            band.info['transparency'] = struct.unpack('>H', data[:2])[0]
+        elif band.mode == 'RGB':
+            band.info['transparency'] = struct.unpack('>HHH', data[:6])
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+PDF Backends
+Writers that put already-encoded images (PDFImage) onto PDF pages for
+ImageToPDFConverter. 'reportlab' builds the document with a reportlab canvas
+and is the default; 'direct' uses the built-in StreamingPDFWriter, which
+imports nothing beyond the standard library and writes each page as it goes.
+"""
+
+import functools
+import io
+import os
+from typing import Optional, Tuple
+
+from pdf_writer import PDFImage, StreamingPDFWriter, decode_pdf_image
+
+# reportlab internals ReportlabBackend embeds encoded images through; none
+# of them is public API, so they are checked for before use
+_CANVAS_INTERNALS = ('_doc', '_setXObjects', '_code', '_formsinuse')
+_DOCUMENT_INTERNALS = ('idToObject', 'getXObjectName', 'Reference', 'addForm')
+_PDFDOC_INTERNALS = ('PDFImageXObject', 'PDFStream', 'PDFName', 'PDFObjectReference')
+
+
+class PDFBackend:
+    """
+    Interface for PDF backends.
+
+    Each add_page() call starts a new page showing one image. Images passed
+    with the same content key are embedded once and shared by every page
+    that shows them; a key of None always embeds the image. close() finishes
+    the document and abort() discards it. Used as a context manager, the
+    backend is aborted if the block raises.
+    """
+
+    def __init__(self, output, page_size: Tuple[float, float]):
+        """
+        Args:
+            output: Path for the output PDF, or a writable binary stream
+            page_size (Tuple[float, float]): Page width and height in points
+        """
+        self.output = output
+        self.page_size = page_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        return False
+
+    @property
+    def known_keys(self):
+        """Container of content keys already embedded, so duplicates need not be encoded."""
+        raise NotImplementedError
+
+    @property
+    def page_count(self) -> int:
+        """Number of pages added so far."""
+        raise NotImplementedError
+
+    @property
+    def bytes_written(self) -> int:
+        """Number of bytes written to the output so far."""
+        raise NotImplementedError
+
+    def add_page(self, key: Optional[str], pdf_image: Optional[PDFImage],
+                 placement: Tuple[float, float, float, float]):
+        """
+        Add a page showing one image.
+
+        Args:
+            key (str): Content key of the image, or None
+            pdf_image (PDFImage): Encoded image; may be None if ``key`` is
+                in known_keys
+            placement (Tuple[float, float, float, float]): x, y, width and
+                height of the image on the page in points
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the document."""
+        raise NotImplementedError
+
+    def abort(self):
+        """Discard the document, removing any partly written output file."""
+        raise NotImplementedError
+
+
+class DirectBackend(PDFBackend):
+    """Write pages straight to the output with StreamingPDFWriter."""
+
+    def __init__(self, output, page_size: Tuple[float, float]):
+        super().__init__(output, page_size)
+        self._writer = StreamingPDFWriter(output)
+        self._image_ids = {}
+
+    @property
+    def known_keys(self):
+        return self._image_ids
+
+    @property
+    def page_count(self) -> int:
+        return self._writer.page_count
+
+    @property
+    def bytes_written(self) -> int:
+        return self._writer.bytes_written
+
+    def add_page(self, key: Optional[str], pdf_image: Optional[PDFImage],
+                 placement: Tuple[float, float, float, float]):
+        image_id = self._image_ids.get(key) if key is not None else None
+        if image_id is None:
+            image_id = self._writer.add_image(pdf_image)
+            if key is not None:
+                self._image_ids[key] = image_id
+        self._writer.add_page(self.page_size, [(image_id,) + tuple(placement)])
+
+    def close(self):
+        self._writer.close()
+
+    def abort(self):
+        self._writer.abort()
+
+
+class _CanvasImageKeys:
+    """Content keys already registered as image XObjects in a reportlab canvas."""
+
+    def __init__(self, c):
+        self._doc = c._doc
+
+    def __contains__(self, key) -> bool:
+        return key is not None and self._doc.idToObject.get(self._doc.getXObjectName(key)) is not None
+
+
+def _has_canvas_internals(c) -> bool:
+    """Check whether a reportlab canvas has every internal ReportlabBackend uses to embed images."""
+    from reportlab.pdfbase import pdfdoc
+
+    return (all(hasattr(c, name) for name in _CANVAS_INTERNALS)
+            and all(hasattr(c._doc, name) for name in _DOCUMENT_INTERNALS)
+            and all(hasattr(pdfdoc, name) for name in _PDFDOC_INTERNALS))
+
+
+@functools.lru_cache(maxsize=None)
+def _image_xobject_class():
+    """
+    Return a reportlab image XObject class for already-encoded data, with
+    optional /DecodeParms (reportlab's own class has no way to set them).
+    """
+    from reportlab.pdfbase import pdfdoc
+
+    class ImageXObject(pdfdoc.PDFImageXObject):
+        decodeParms = None
+
+        def format(self, document):
+            stream = pdfdoc.PDFStream(content=bytes(self.streamContent))
+            entries = stream.dictionary
+            entries['Type'] = pdfdoc.PDFName('XObject')
+            entries['Subtype'] = pdfdoc.PDFName('Image')
+            entries['Width'] = self.width
+            entries['Height'] = self.height
+            entries['BitsPerComponent'] = self.bitsPerComponent
+            entries['ColorSpace'] = pdfdoc.PDFName(self.colorSpace)
+            entries['Filter'] = pdfdoc.PDFName(self._filters[0])
+            if self.decodeParms:
+                # Preformatted PDF dictionary syntax, written out verbatim
+                entries['DecodeParms'] = self.decodeParms
+            if getattr(self, 'smask', None):
+                entries['SMask'] = self.smask
+            return stream.format(document)
+
+    return ImageXObject
+
+
+class ReportlabBackend(PDFBackend):
+    """
+    Build the document with a reportlab canvas, holding it in memory until
+    close() writes it out.
+
+    Images are registered on the canvas directly rather than through
+    drawImage, so encoded data is embedded without reportlab decoding it
+    again. That relies on reportlab internals (requirements.txt caps the
+    version); should a release lack any of them, images are decoded and
+    drawn with the public drawImage instead, which is slower and embeds
+    everything but JPEG data as 8-bit Flate.
+    """
+
+    def __init__(self, output, page_size: Tuple[float, float]):
+        super().__init__(output, page_size)
+        from reportlab.pdfgen import canvas
+
+        self._canvas = canvas.Canvas(output if isinstance(output, (str, os.PathLike)) else io.BytesIO(),
+                                     pagesize=page_size)
+        self._internals = _has_canvas_internals(self._canvas)
+        if self._internals:
+            self._xobject_class = _image_xobject_class()
+            self._known_keys = _CanvasImageKeys(self._canvas)
+        else:
+            # drawImage shares identical images by itself, but every page needs its image
+            self._known_keys = frozenset()
+        self._pages = 0
+        self._bytes_written = 0
+
+    @property
+    def known_keys(self):
+        return self._known_keys
+
+    @property
+    def page_count(self) -> int:
+        return self._pages
+
+    @property
+    def bytes_written(self) -> int:
+        return self._bytes_written
+
+    def _register_image(self, name: str, pdf_image: PDFImage) -> str:
+        """
+        Add an encoded image to the canvas document as an image XObject.
+
+        Mirrors what canvas.drawImage does for a newly seen image.
+
+        Returns:
+            str: Registered XObject name to use with the ``Do`` operator
+        """
+        from reportlab.pdfbase import pdfdoc
+
+        c = self._canvas
+        reg_name = c._doc.getXObjectName(name)
+        xobject = self._xobject_class(name)
+        xobject.width = pdf_image.width
+        xobject.height = pdf_image.height
+        xobject.bitsPerComponent = pdf_image.bits
+        xobject.colorSpace = pdf_image.color_space
+        xobject._filters = (pdf_image.filter,)
+        xobject.decodeParms = pdf_image.decode_parms
+        xobject.streamContent = pdf_image.data
+        xobject.mask = None
+        if pdf_image.smask is not None:
+            smask_name = self._register_image(name + '-smask', pdf_image.smask)
+            xobject.smask = pdfdoc.PDFObjectReference(smask_name)
+
+        c._setXObjects(xobject)
+        c._doc.Reference(xobject, reg_name)
+        c._doc.addForm(name, xobject)
+        return reg_name
+
+    def add_page(self, key: Optional[str], pdf_image: Optional[PDFImage],
+                 placement: Tuple[float, float, float, float]):
+        c = self._canvas
+        if self._pages:
+            c.showPage()
+        self._pages += 1
+
+        if not self._internals:
+            self._draw_image(pdf_image, placement)
+            return
+
+        x, y, width, height = placement
+        name = key if key is not None else 'page%d' % c.getPageNumber()
+        reg_name = c._doc.getXObjectName(name)
+        if c._doc.idToObject.get(reg_name) is None:
+            self._register_image(name, pdf_image)
+        c._currentPageHasImages = 1
+        c.saveState()
+        c.translate(x, y)
+        c.scale(width, height)
+        c._code.append('/%s Do' % reg_name)
+        c.restoreState()
+        c._formsinuse.append(name)
+
+    def _draw_image(self, pdf_image: PDFImage, placement: Tuple[float, float, float, float]):
+        """Draw an encoded image with the public drawImage, which embeds JPEG data as it is."""
+        from reportlab import rl_config
+        from reportlab.lib.utils import ImageReader
+
+        if pdf_image.filter == 'DCTDecode' and pdf_image.smask is None:
+            image = ImageReader(io.BytesIO(pdf_image.data))
+        else:
+            image = ImageReader(decode_pdf_image(pdf_image))
+        # Binary streams, not ASCII85 text that is a quarter larger
+        use_a85, rl_config.useA85 = rl_config.useA85, 0
+        try:
+            self._canvas.drawImage(image, *placement, mask='auto')
+        finally:
+            rl_config.useA85 = use_a85
+
+    def close(self):
+        data = self._canvas.getpdfdata()
+        if isinstance(self.output, (str, os.PathLike)):
+            with open(self.output, 'wb') as f:
+                f.write(data)
+        else:
+            self.output.write(data)
+            self.output.flush()
+        self._bytes_written = len(data)
+
+    def abort(self):
+        # Nothing reaches the output before close()
+        pass
+
+
+# Available backends by name; ImageToPDFConverter uses DEFAULT_BACKEND unless told otherwise
+BACKENDS = {
+    'reportlab': ReportlabBackend,
+    'direct': DirectBackend,
+}
+
+DEFAULT_BACKEND = 'reportlab'
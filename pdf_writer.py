@@ -0,0 +1,750 @@
+#!/usr/bin/env python3
+"""
+Streaming PDF Writer
+A minimal PDF writer for image-only documents. Every image XObject and page is
+written to disk as soon as it is added, so memory use does not grow with the
+number of pages.
+"""
+
+import io
+import os
+import struct
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# (colour type, bit depth) of PNGs whose scanlines a PDF reader can decode
+# as they are, with the number of colour components
+PNG_PASSTHROUGH_LAYOUTS = {
+    (0, 1): 1, (0, 2): 1, (0, 4): 1, (0, 8): 1,  # grayscale
+    (2, 8): 3,  # RGB
+}
+
+# Colour-type detection used by reduce_color_type: an RGB image counts as
+# gray if no more than GRAY_MAX_FRACTION of its pixels have a Cb or Cr
+# chroma value further than GRAY_TOLERANCE from neutral (scanner and JPEG
+# chroma noise stay below it, small coloured marks such as stamps do not)
+GRAY_TOLERANCE = 12
+GRAY_MAX_FRACTION = 0.0002
+
+# ...and a gray image counts as bilevel if no more than BILEVEL_MAX_FRACTION
+# of its pixels are midtones, strictly between BILEVEL_DARK and BILEVEL_LIGHT
+# (anti-aliased text edges); it is then thresholded at BILEVEL_THRESHOLD
+BILEVEL_DARK = 64
+BILEVEL_LIGHT = 192
+BILEVEL_MAX_FRACTION = 0.03
+BILEVEL_THRESHOLD = 128
+
+
+class PDFImage(NamedTuple):
+    """An image encoded and ready to be embedded as a PDF image XObject."""
+    width: int
+    height: int
+    color_space: str
+    bits: int
+    filter: str
+    data: bytes
+    decode_parms: Optional[str] = None
+    smask: Optional['PDFImage'] = None
+
+
+def to_pdf_mode(img):
+    """
+    Convert an image to one of the modes that map directly onto PDF images:
+    '1', 'L', 'LA', 'RGB', 'RGBA' or 'CMYK'.
+
+    Args:
+        img (PIL.Image.Image): Image in any mode
+
+    Returns:
+        PIL.Image.Image: The image itself if its mode is already one of
+        those, otherwise a converted copy
+    """
+    if img.mode == 'P':
+        return img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode in ('L', 'RGB') and 'transparency' in img.info:
+        return img.convert('LA' if img.mode == 'L' else 'RGBA')
+    if img.mode == 'PA':
+        return img.convert('RGBA')
+    if img.mode.startswith('I;16'):
+        # Scale 16-bit samples down to 8 bits instead of clipping them
+        return img.convert('I').point(lambda value: value / 256).convert('L')
+    if img.mode in ('I', 'F'):
+        return img.convert('L')
+    if img.mode not in ('1', 'L', 'LA', 'RGB', 'RGBA', 'CMYK'):
+        return img.convert('RGB')
+    return img
+
+
+def resample_image(img, size: Tuple[int, int], draft: bool = True, bilevel: bool = None):
+    """
+    Downsample an image to an exact pixel size.
+
+    Should be called before the image is loaded: for JPEGs, Pillow's draft
+    mode then decodes at the smallest DCT scale (1/2, 1/4 or 1/8) that is
+    still at least ``size``, so pixels that would be thrown away are never
+    decoded. Black and white images are resampled in gray and thresholded
+    back to '1', so they stay 1-bit.
+
+    Args:
+        img (PIL.Image.Image): Freshly opened image
+        size (Tuple[int, int]): Target width and height in pixels
+        draft (bool): Use draft mode, which changes ``img`` in place; pass
+            False for images that belong to the caller
+        bilevel (bool): Threshold the result to '1' (defaults to whether
+            ``img`` is a '1' image; pass True for black and white images
+            already widened to 'L')
+
+    Returns:
+        PIL.Image.Image: Resampled image
+    """
+    from PIL import Image
+
+    if draft:
+        img.draft(img.mode, size)
+    if bilevel is None:
+        bilevel = img.mode == '1'
+    img = to_pdf_mode(img)
+    if img.mode == '1':
+        img = img.convert('L')
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+    return _threshold(img) if bilevel else img
+
+
+def is_grayscale(img) -> bool:
+    """
+    Check whether an 'RGB' or 'YCbCr' Pillow image is really grayscale.
+
+    Only the histograms of the chroma channels are inspected, so no pixel is
+    visited from Python; JPEGs decoded as YCbCr need no colour conversion
+    at all.
+    """
+    limit = GRAY_MAX_FRACTION * img.width * img.height
+    if img.width >= 64 and img.height >= 64:
+        # Each coloured 4x4 average has at least one coloured pixel behind it,
+        # so colour images are rejected without converting every pixel
+        if _colored_pixels(img.reduce(4).convert('YCbCr')) > limit:
+            return False
+    if img.mode != 'YCbCr':
+        img = img.convert('YCbCr')
+    return _colored_pixels(img) <= limit
+
+
+def _colored_pixels(img) -> int:
+    """Count the pixels of a 'YCbCr' image with Cb or Cr outside GRAY_TOLERANCE (lower bound)."""
+    histogram = img.histogram()
+    low, high = 128 - GRAY_TOLERANCE, 128 + GRAY_TOLERANCE + 1
+    return max(sum(channel[:low]) + sum(channel[high:])
+               for channel in (histogram[256:512], histogram[512:]))
+
+
+def is_bilevel(img) -> bool:
+    """Check whether an 'L' Pillow image is really black and white, from its histogram."""
+    midtones = sum(img.histogram()[BILEVEL_DARK + 1:BILEVEL_LIGHT])
+    return midtones <= BILEVEL_MAX_FRACTION * img.width * img.height
+
+
+def reduce_color_type(img):
+    """
+    Convert an image to the most compact colour type that represents it.
+
+    Opaque RGB (or YCbCr) images that are really grayscale become 'L', and
+    grayscale images that are really black and white become '1'. Other
+    images are returned unchanged, apart from the conversions of
+    to_pdf_mode.
+
+    Args:
+        img (PIL.Image.Image): Loaded image
+
+    Returns:
+        PIL.Image.Image: Image in mode '1', 'L' or its original PDF mode
+    """
+    if img.mode == 'YCbCr':
+        # The luma channel is the gray image, no conversion needed
+        img = img.getchannel('Y') if is_grayscale(img) else img.convert('RGB')
+    img = to_pdf_mode(img)
+    if img.mode == 'RGB' and is_grayscale(img):
+        img = img.convert('L')
+    if img.mode == 'L' and is_bilevel(img):
+        img = _threshold(img)
+    return img
+
+
+def _threshold(img):
+    """Convert an 'L' image to '1' at BILEVEL_THRESHOLD."""
+    return img.point([0] * BILEVEL_THRESHOLD + [255] * (256 - BILEVEL_THRESHOLD), '1')
+
+
+def reduced_band_mode(bands, pixel_count: int) -> Optional[str]:
+    """
+    Choose the colour type reduce_color_type would give an image that is
+    only available as a sequence of bands.
+
+    The chroma and luma histograms of every band are added up, with the
+    same thresholds as is_grayscale and is_bilevel; decoding stops at the
+    first band that shows the image is in colour.
+
+    Args:
+        bands: Iterable of the image's bands, top to bottom
+        pixel_count (int): Number of pixels in the whole image
+
+    Returns:
+        Optional[str]: 'L' or '1', or None if the image does not reduce
+        (colour, alpha, CMYK or already bilevel)
+    """
+    colored = 0
+    luma = [0] * 256
+    for band in bands:
+        band = to_pdf_mode(band)
+        if band.mode not in ('L', 'RGB'):
+            return None
+        if band.mode == 'RGB':
+            band = band.convert('YCbCr')
+            colored += _colored_pixels(band)
+            if colored > GRAY_MAX_FRACTION * pixel_count:
+                return None
+        luma = [total + count for total, count in zip(luma, band.histogram()[:256])]
+    midtones = sum(luma[BILEVEL_DARK + 1:BILEVEL_LIGHT])
+    return '1' if midtones <= BILEVEL_MAX_FRACTION * pixel_count else 'L'
+
+
+def reduce_bands(bands, factor: int):
+    """
+    Shrink an image given as a sequence of bands by an integer factor,
+    averaging each ``factor`` x ``factor`` box of pixels.
+
+    Rows left over at the bottom of a band are carried into the next one,
+    so the boxes line up exactly as if the whole image were reduced at once.
+
+    Args:
+        bands: Iterable of the image's bands, top to bottom
+        factor (int): Reduction factor (1 only converts to a PDF mode)
+
+    Returns:
+        PIL.Image.Image: The reduced image, in an 8-bit PDF mode
+    """
+    from PIL import Image
+
+    pieces = []
+    carry = None
+    for band in bands:
+        band = to_pdf_mode(band)
+        if band.mode == '1':
+            band = band.convert('L')
+        if carry is not None:
+            joined = Image.new(band.mode, (band.width, carry.height + band.height))
+            joined.paste(carry, (0, 0))
+            joined.paste(band, (0, carry.height))
+            band = joined
+        whole_rows = band.height - band.height % factor
+        if whole_rows:
+            pieces.append(band.crop((0, 0, band.width, whole_rows)).reduce(factor))
+        carry = band.crop((0, whole_rows, band.width, band.height)) if whole_rows < band.height else None
+    if carry is not None:
+        pieces.append(carry.reduce(factor))
+
+    reduced = Image.new(pieces[0].mode, (pieces[0].width, sum(piece.height for piece in pieces)))
+    top = 0
+    for piece in pieces:
+        reduced.paste(piece, (0, top))
+        top += piece.height
+    return reduced
+
+
+def encode_ccitt_image(img) -> Optional[PDFImage]:
+    """
+    Encode a '1' Pillow image as a CCITT Group 4 (CCITTFaxDecode) PDF image.
+
+    Uses Pillow's libtiff encoder, writing the whole image as one strip.
+
+    Args:
+        img (PIL.Image.Image): Bilevel image to encode
+
+    Returns:
+        Optional[PDFImage]: Encoded image, or None if Pillow was built
+        without libtiff
+    """
+    from PIL import Image, features
+
+    if not features.check('libtiff'):
+        return None
+    buffer = io.BytesIO()
+    img.save(buffer, 'TIFF', compression='group4', tiffinfo={278: img.height})
+    buffer.seek(0)
+    with Image.open(buffer) as tiff:
+        tags = tiff.tag_v2
+        offset, byte_count, photometric = tags[273], tags[279], tags.get(262, 0)
+    if not isinstance(offset, int):
+        offset, byte_count = offset[0], byte_count[0]
+    data = buffer.getbuffer()[offset:offset + byte_count].tobytes()
+    # Decoded Group 4 data uses 0 for white; BlackIs1 keeps BlackIsZero data inverted
+    decode_parms = ('<< /K -1 /Columns %d /Rows %d /BlackIs1 %s >>'
+                    % (img.width, img.height, 'true' if photometric == 1 else 'false'))
+    return PDFImage(img.width, img.height, 'DeviceGray', 1, 'CCITTFaxDecode', data, decode_parms)
+
+
+def encode_bilevel_image(img, compression_level: int = 6) -> PDFImage:
+    """
+    Encode a '1' Pillow image as CCITT Group 4, or as 1-bit Flate if libtiff
+    is unavailable or Flate comes out smaller.
+
+    Args:
+        img (PIL.Image.Image): Bilevel image to encode
+        compression_level (int): zlib compression level (0-9) for Flate
+
+    Returns:
+        PDFImage: Encoded image
+    """
+    flate = encode_pil_image(img, compression_level)
+    ccitt = encode_ccitt_image(img)
+    if ccitt is not None and len(ccitt.data) < len(flate.data):
+        return ccitt
+    return flate
+
+
+def encode_jpeg_image(img, quality: int = 85) -> PDFImage:
+    """
+    Encode an 'L' or 'RGB' Pillow image as a DCTDecode PDF image.
+
+    Args:
+        img (PIL.Image.Image): Image to encode
+        quality (int): JPEG quality (1-95)
+
+    Returns:
+        PDFImage: Encoded image
+    """
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    color_space = 'DeviceGray' if img.mode == 'L' else 'DeviceRGB'
+    return PDFImage(img.width, img.height, color_space, 8, 'DCTDecode', buffer.getvalue())
+
+
+def extract_png_image(data) -> Optional[PDFImage]:
+    """
+    Embed a PNG's compressed image data as-is.
+
+    PNG stores its pixels as a zlib stream of scanlines, each prefixed by a
+    filter type byte, which is exactly what FlateDecode with PNG predictors
+    (/Predictor 15) undoes. The concatenated IDAT chunks therefore become
+    the image stream without being decompressed. Only non-interlaced
+    grayscale and 8-bit RGB PNGs without a tRNS chunk qualify; palette,
+    alpha, 16-bit and interlaced files return None.
+
+    Args:
+        data: Contents of the PNG file (any bytes-like object)
+
+    Returns:
+        Optional[PDFImage]: Encoded image, or None if not eligible
+    """
+    view = memoryview(data)
+    if bytes(view[:8]) != PNG_SIGNATURE or bytes(view[12:16]) != b'IHDR' or len(view) < 33:
+        return None
+    width, height, bits, color_type, _, _, interlace = struct.unpack('>IIBBBBB', view[16:29])
+    colors = PNG_PASSTHROUGH_LAYOUTS.get((color_type, bits))
+    if colors is None or interlace:
+        return None
+
+    idat = []
+    position = 8
+    while position + 12 <= len(view):
+        length, chunk_type = struct.unpack('>I4s', view[position:position + 8])
+        end = position + 12 + length
+        if end > len(view) or chunk_type == b'tRNS':
+            return None
+        if chunk_type == b'IDAT':
+            idat.append(view[position + 8:end - 4])
+        elif chunk_type == b'IEND':
+            break
+        position = end
+    if not idat:
+        return None
+
+    return PDFImage(width, height, 'DeviceGray' if colors == 1 else 'DeviceRGB', bits,
+                    'FlateDecode', b''.join(idat), _predictor_parms(colors, bits, width))
+
+
+def _predictor_parms(colors: int, bits: int, width: int) -> str:
+    """Return the /DecodeParms of Flate data made of PNG-filtered scanlines."""
+    return ('<< /Predictor 15 /Colors %d /BitsPerComponent %d /Columns %d >>'
+            % (colors, bits, width))
+
+
+def _png_encode(img, compression_level: int) -> PDFImage:
+    """Encode an 8-bit 'L' or 'RGB' image as PNG and embed its IDAT data."""
+    if 'transparency' in img.info:
+        # Pillow would write it as a tRNS chunk, which extract_png_image refuses
+        img = img.copy()
+        del img.info['transparency']
+    buffer = io.BytesIO()
+    # Pillow picks a filter for each row, which is what makes PNGs of
+    # smooth images several times smaller than their plain zlib stream
+    img.save(buffer, 'PNG', compress_level=compression_level)
+    return extract_png_image(buffer.getvalue())
+
+
+def _filtered_rows(band, previous_row) -> bytes:
+    """
+    Return the PNG-filtered scanlines of an 8-bit 'L' or 'RGB' band.
+
+    The last row of the band above is filtered along with the band and then
+    dropped, so the first row is predicted from it exactly as it would be
+    in the whole image.
+    """
+    from PIL import Image
+
+    if previous_row is not None:
+        joined = Image.new(band.mode, (band.width, band.height + 1))
+        joined.paste(previous_row, (0, 0))
+        joined.paste(band, (0, 1))
+        band = joined
+    # Level 0 only stores the rows, which are decompressed again straight away
+    rows = zlib.decompress(_png_encode(band, 0).data)
+    if previous_row is None:
+        return rows
+    return rows[1 + band.width * len(band.getbands()):]
+
+
+def _color_space(mode: str) -> Tuple[str, int]:
+    """Return the PDF colour space and bits per component of an opaque PDF-mode image."""
+    if mode == '1':
+        return 'DeviceGray', 1
+    if mode == 'L':
+        return 'DeviceGray', 8
+    if mode == 'CMYK':
+        return 'DeviceCMYK', 8
+    return 'DeviceRGB', 8
+
+
+def encode_pil_image(img, compression_level: int = 6) -> PDFImage:
+    """
+    Encode a Pillow image as a Flate-compressed PDF image.
+
+    Alpha channels are split off into a separate soft mask; palette and
+    high-bit-depth images are converted to 8-bit gray or RGB first. 8-bit
+    gray and RGB pixels are stored as PNG-filtered scanlines (/Predictor
+    15); 1-bit and CMYK pixels, which PNG filters do not help, as they are.
+
+    Args:
+        img (PIL.Image.Image): Image to encode
+        compression_level (int): zlib compression level (0-9)
+
+    Returns:
+        PDFImage: Encoded image
+    """
+    img = to_pdf_mode(img)
+
+    smask = None
+    if img.mode in ('LA', 'RGBA'):
+        alpha = img.getchannel('A')
+        if alpha.getextrema() != (255, 255):
+            smask = PDFImage(img.width, img.height, 'DeviceGray', 8, 'FlateDecode',
+                             zlib.compress(alpha.tobytes(), compression_level))
+        img = img.convert('L' if img.mode == 'LA' else 'RGB')
+
+    if img.mode in ('L', 'RGB'):
+        return _png_encode(img, compression_level)._replace(smask=smask)
+    color_space, bits = _color_space(img.mode)
+    return PDFImage(img.width, img.height, color_space, bits, 'FlateDecode',
+                    zlib.compress(img.tobytes(), compression_level), smask=smask)
+
+
+def encode_pil_bands(bands, width: int, height: int, compression_level: int = 6,
+                     mode: str = None) -> PDFImage:
+    """
+    Encode an image given as a sequence of bands as a Flate-compressed PDF
+    image, compressing each band as it arrives so only one is ever held.
+
+    Produces the same image as encode_pil_image on the whole image.
+
+    Args:
+        bands: Iterable of the image's bands, top to bottom
+        width (int): Width of the image in pixels
+        height (int): Height of the image in pixels
+        compression_level (int): zlib compression level (0-9)
+        mode (str): 'L' or '1' to convert every band to (optional, e.g.
+            from reduced_band_mode)
+
+    Returns:
+        PDFImage: Encoded image
+    """
+    pixels = zlib.compressobj(compression_level)
+    alpha = zlib.compressobj(compression_level)
+    data, alpha_data = [], []
+    band_mode, opaque = None, True
+    previous_row = None
+    for band in bands:
+        band = to_pdf_mode(band)
+        if band.mode in ('LA', 'RGBA'):
+            band_alpha = band.getchannel('A')
+            opaque = opaque and band_alpha.getextrema() == (255, 255)
+            alpha_data.append(alpha.compress(band_alpha.tobytes()))
+            band = band.convert('L' if band.mode == 'LA' else 'RGB')
+        if mode is not None and band.mode != mode:
+            band = band.convert('L')
+            if mode == '1':
+                band = _threshold(band)
+        band_mode = band.mode
+        if band_mode in ('L', 'RGB'):
+            data.append(pixels.compress(_filtered_rows(band, previous_row)))
+            previous_row = band.crop((0, band.height - 1, band.width, band.height))
+        else:
+            data.append(pixels.compress(band.tobytes()))
+    data.append(pixels.flush())
+
+    smask = None
+    if alpha_data and not opaque:
+        alpha_data.append(alpha.flush())
+        smask = PDFImage(width, height, 'DeviceGray', 8, 'FlateDecode', b''.join(alpha_data))
+
+    color_space, bits = _color_space(band_mode)
+    decode_parms = None
+    if band_mode in ('L', 'RGB'):
+        decode_parms = _predictor_parms(1 if band_mode == 'L' else 3, 8, width)
+    return PDFImage(width, height, color_space, bits, 'FlateDecode', b''.join(data),
+                    decode_parms, smask)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Return one PNG chunk: length, type, data and CRC."""
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+
+def _group4_tiff(pdf_image: PDFImage) -> bytes:
+    """Wrap CCITTFaxDecode data as a single-strip Group 4 TIFF file."""
+    # Inverse of encode_ccitt_image: BlackIs1 data came from a BlackIsZero file
+    photometric = 1 if '/BlackIs1 true' in (pdf_image.decode_parms or '') else 0
+    data_offset = 8 + 2 + 12 * 9 + 4
+    entries = [(256, 4, pdf_image.width), (257, 4, pdf_image.height), (258, 3, 1), (259, 3, 4),
+               (262, 3, photometric), (273, 4, data_offset), (277, 3, 1),
+               (278, 4, pdf_image.height), (279, 4, len(pdf_image.data))]
+    ifd = struct.pack('<H', len(entries))
+    for tag, field_type, value in entries:
+        # SHORT values sit left-justified in the 4-byte value field
+        packed = struct.pack('<HH', value, 0) if field_type == 3 else struct.pack('<I', value)
+        ifd += struct.pack('<HHI', tag, field_type, 1) + packed
+    return b'II*\0' + struct.pack('<I', 8) + ifd + struct.pack('<I', 0) + bytes(pdf_image.data)
+
+
+def decode_pdf_image(pdf_image: PDFImage):
+    """
+    Decode an encoded PDF image back into a Pillow image, the inverse of
+    the encoders above. A soft mask becomes the image's alpha channel.
+
+    Args:
+        pdf_image (PDFImage): Image with DCTDecode, FlateDecode (with or
+            without PNG predictors) or Group 4 CCITTFaxDecode data
+
+    Returns:
+        PIL.Image.Image: Decoded image
+    """
+    from PIL import Image
+
+    size = (pdf_image.width, pdf_image.height)
+    if pdf_image.filter == 'DCTDecode':
+        img = Image.open(io.BytesIO(pdf_image.data))
+    elif pdf_image.filter == 'CCITTFaxDecode':
+        img = Image.open(io.BytesIO(_group4_tiff(pdf_image)))
+    elif pdf_image.filter == 'FlateDecode' and '/Predictor' in (pdf_image.decode_parms or ''):
+        # PNG-filtered scanlines are a PNG file's IDAT data
+        color_type = 0 if pdf_image.color_space == 'DeviceGray' else 2
+        header = struct.pack('>IIBBBBB', pdf_image.width, pdf_image.height, pdf_image.bits,
+                             color_type, 0, 0, 0)
+        img = Image.open(io.BytesIO(PNG_SIGNATURE + _png_chunk(b'IHDR', header)
+                                    + _png_chunk(b'IDAT', bytes(pdf_image.data))
+                                    + _png_chunk(b'IEND', b'')))
+    elif pdf_image.filter == 'FlateDecode':
+        mode = {('DeviceGray', 1): '1', ('DeviceGray', 8): 'L', ('DeviceRGB', 8): 'RGB',
+                ('DeviceCMYK', 8): 'CMYK'}[pdf_image.color_space, pdf_image.bits]
+        img = Image.frombytes(mode, size, zlib.decompress(pdf_image.data))
+    else:
+        raise ValueError(f"Cannot decode {pdf_image.filter} image data")
+    img.load()
+
+    if pdf_image.smask is not None:
+        if img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB' if img.mode == 'CMYK' else 'L')
+        img.putalpha(decode_pdf_image(pdf_image.smask))
+    return img
+
+
+class StreamingPDFWriter:
+    """
+    Write an image-only PDF incrementally.
+
+    Objects 1 and 2 are reserved for the catalog and the page tree, which are
+    only written by close() once every page is known. Everything else goes to
+    the output immediately; only the byte offset of each object is kept.
+    Offsets are counted rather than asked of the output, so any writable
+    binary stream works, including non-seekable ones.
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, output):
+        """
+        Open the output and write the PDF header.
+
+        Args:
+            output: Path for the output PDF, or a writable binary stream. A
+                stream is left open by close() and is not cleaned up by abort()
+        """
+        if isinstance(output, (str, os.PathLike)):
+            self.output_path = output
+            self._file = open(output, 'wb')
+        else:
+            self.output_path = None
+            self._file = output
+        self._position = 0
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 3
+        self._page_ids: List[int] = []
+        self._closed = False
+        # The binary comment marks the file as binary for transfer tools
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    @property
+    def page_count(self) -> int:
+        """Number of pages written so far."""
+        return len(self._page_ids)
+
+    @property
+    def bytes_written(self) -> int:
+        """Number of bytes written to the output so far."""
+        return self._position
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._position += len(data)
+
+    def _reserve_id(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _write_object(self, object_id: int, body: bytes):
+        self._offsets[object_id] = self._position
+        self._write(b'%d 0 obj\n' % object_id)
+        self._write(body)
+        self._write(b'\nendobj\n')
+
+    def _write_stream(self, object_id: int, dictionary: str, data: bytes):
+        self._offsets[object_id] = self._position
+        self._write(b'%d 0 obj\n<< %s /Length %d >>\nstream\n'
+                    % (object_id, dictionary.encode('ascii'), len(data)))
+        self._write(data)
+        self._write(b'\nendstream\nendobj\n')
+
+    def add_image(self, image: PDFImage) -> int:
+        """
+        Write an image XObject (and its soft mask, if any).
+
+        Args:
+            image (PDFImage): Encoded image
+
+        Returns:
+            int: Object number of the image XObject
+        """
+        smask_id = self.add_image(image.smask) if image.smask is not None else None
+
+        dictionary = ('/Type /XObject /Subtype /Image /Width %d /Height %d '
+                      '/ColorSpace /%s /BitsPerComponent %d /Filter /%s'
+                      % (image.width, image.height, image.color_space, image.bits, image.filter))
+        if image.decode_parms:
+            dictionary += ' /DecodeParms %s' % image.decode_parms
+        if smask_id is not None:
+            dictionary += ' /SMask %d 0 R' % smask_id
+
+        object_id = self._reserve_id()
+        self._write_stream(object_id, dictionary, image.data)
+        return object_id
+
+    def add_page(self, page_size: Tuple[float, float],
+                 placements: List[Tuple[int, float, float, float, float]]) -> int:
+        """
+        Write a page that draws previously added images.
+
+        Args:
+            page_size (Tuple[float, float]): Page width and height in points
+            placements (List[Tuple[int, float, float, float, float]]):
+                ``(image_id, x, y, width, height)`` for each image on the page
+
+        Returns:
+            int: Object number of the page
+        """
+        content = []
+        xobjects = []
+        for index, (image_id, x, y, width, height) in enumerate(placements):
+            content.append('q %.4f 0 0 %.4f %.4f %.4f cm /Im%d Do Q' % (width, height, x, y, index))
+            xobjects.append('/Im%d %d 0 R' % (index, image_id))
+
+        content_id = self._reserve_id()
+        self._write_stream(content_id, '', '\n'.join(content).encode('ascii'))
+
+        page_id = self._reserve_id()
+        page_width, page_height = page_size
+        self._write_object(page_id, (
+            '<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f] '
+            '/Resources << /XObject << %s >> >> /Contents %d 0 R >>'
+            % (self.PAGES_ID, page_width, page_height, ' '.join(xobjects), content_id)
+        ).encode('ascii'))
+        self._page_ids.append(page_id)
+        return page_id
+
+    def add_image_page(self, image: PDFImage, page_size: Tuple[float, float],
+                       x: float, y: float, width: float, height: float) -> int:
+        """
+        Write an image and a page showing it in one step.
+
+        Returns:
+            int: Object number of the page
+        """
+        image_id = self.add_image(image)
+        return self.add_page(page_size, [(image_id, x, y, width, height)])
+
+    def close(self):
+        """Write the page tree, catalog, cross-reference table and trailer."""
+        if self._closed:
+            return
+        kids = ' '.join('%d 0 R' % page_id for page_id in self._page_ids)
+        self._write_object(self.PAGES_ID, ('<< /Type /Pages /Kids [%s] /Count %d >>'
+                                           % (kids, len(self._page_ids))).encode('ascii'))
+        self._write_object(self.CATALOG_ID, ('<< /Type /Catalog /Pages %d 0 R >>'
+                                             % self.PAGES_ID).encode('ascii'))
+
+        xref_offset = self._position
+        self._write(b'xref\n0 %d\n0000000000 65535 f \n' % self._next_id)
+        self._write(b''.join(b'%010d 00000 n \n' % self._offsets[object_id]
+                             for object_id in range(1, self._next_id)))
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                    % (self._next_id, self.CATALOG_ID, xref_offset))
+        if self.output_path is not None:
+            self._file.close()
+        else:
+            self._file.flush()
+        self._closed = True
+
+    def abort(self):
+        """Stop writing and, for file output, remove the incomplete file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self.output_path is None:
+            return
+        self._file.close()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
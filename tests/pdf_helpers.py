@@ -0,0 +1,129 @@
+"""
+Helpers shared by the tests: sample images and reading PDFs back with pypdf.
+"""
+
+import os
+import struct
+import zlib
+from typing import Dict, List
+
+import pypdf
+from PIL import Image
+
+
+def gradient(size=(120, 90)):
+    """An RGB image with a different gradient in each channel."""
+    g = Image.linear_gradient('L').resize(size)
+    return Image.merge('RGB', (g, g.rotate(90).resize(size), g.transpose(Image.FLIP_LEFT_RIGHT)))
+
+
+def bilevel(size=(120, 90)):
+    """A black and white image with a diagonal edge and some stripes."""
+    g = Image.linear_gradient('L').resize(size)
+    img = g.point(lambda v: 255 if v > 128 else 0)
+    for x in range(0, size[0], 8):
+        img.paste(0, (x, 0, x + 2, size[1] // 3))
+    return img.convert('1')
+
+
+def save(img, directory: str, name: str, **params) -> str:
+    """Save ``img`` under ``directory`` and return the path."""
+    path = os.path.join(directory, name)
+    img.save(path, **params)
+    return path
+
+
+def sample_images(directory: str) -> Dict[str, str]:
+    """
+    Write one sample of each source layout the converter handles differently.
+
+    Returns:
+        Dict[str, str]: Sample name to path
+    """
+    rgb = gradient()
+    rgba = rgb.convert('RGBA')
+    rgba.putalpha(Image.linear_gradient('L').rotate(90).resize(rgb.size))
+    return {
+        'rgb.png': save(rgb, directory, 'rgb.png'),
+        'rgba.png': save(rgba, directory, 'rgba.png'),
+        'palette.png': save(rgb.quantize(64), directory, 'palette.png'),
+        'bilevel.png': save(bilevel(), directory, 'bilevel.png'),
+        'gray16.png': save(Image.linear_gradient('L').resize(rgb.size).convert('I')
+                           .point(lambda v: v * 257).convert('I;16'), directory, 'gray16.png'),
+        'cmyk.jpg': save(rgb.convert('CMYK'), directory, 'cmyk.jpg', quality=95),
+        'rgb.jpg': save(rgb, directory, 'rgb.jpg', quality=95),
+        'strips.tif': save(rgb, directory, 'strips.tif', compression='tiff_lzw',
+                           tiffinfo={278: 16}),
+        'group4.tif': save(bilevel(), directory, 'group4.tif', compression='group4'),
+    }
+
+
+def png_unfilter(data: bytes, width: int, colors: int, bits: int) -> bytes:
+    """Undo PNG row filters (PDF /Predictor 10-15) on decompressed data."""
+    stride = (width * colors * bits + 7) // 8
+    distance = max(1, colors * bits // 8)
+    previous = bytearray(stride)
+    rows = []
+    for start in range(0, len(data), stride + 1):
+        kind, row = data[start], bytearray(data[start + 1:start + 1 + stride])
+        for i in range(stride):
+            a = row[i - distance] if i >= distance else 0
+            b = previous[i]
+            c = previous[i - distance] if i >= distance else 0
+            if kind == 1:
+                row[i] = (row[i] + a) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + b) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (a + b) // 2) & 0xFF
+            elif kind == 4:
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                row[i] = (row[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+        rows.append(bytes(row))
+        previous = row
+    return b''.join(rows)
+
+
+def page_images(pdf_path: str) -> List[Image.Image]:
+    """Decode the image on each page of a PDF with pypdf."""
+    reader = pypdf.PdfReader(pdf_path, strict=True)
+    images = []
+    for page in reader.pages:
+        image = page.images[0].image
+        xobject = list(page['/Resources']['/XObject'].values())[0].get_object()
+        parms = xobject.get('/DecodeParms')
+        if parms is not None and parms.get('/Predictor', 1) >= 10 and image.mode == '1':
+            # pypdf unfilters PNG predictor rows of 1-bit images with the
+            # wrong byte distance, so undo the filters here
+            data = png_unfilter(zlib.decompress(xobject._data), parms['/Columns'],
+                                parms['/Colors'], parms['/BitsPerComponent'])
+            image = Image.frombytes(image.mode, image.size, data)
+        images.append(image)
+    return images
+
+
+def page_xobjects(pdf_path: str) -> List:
+    """The image XObject dictionary on each page of a PDF."""
+    reader = pypdf.PdfReader(pdf_path, strict=True)
+    return [list(page['/Resources']['/XObject'].values())[0].get_object()
+            for page in reader.pages]
+
+
+def png_idat(png_path: str) -> bytes:
+    """The concatenated IDAT chunk data of a PNG file."""
+    with open(png_path, 'rb') as f:
+        data = f.read()
+    chunks = []
+    position = 8
+    while position < len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        if kind == b'IDAT':
+            chunks.append(data[position + 8:position + 8 + length])
+        position += 12 + length
+    return b''.join(chunks)
+
+
+def same_pixels(a, b) -> bool:
+    """Whether two images have the same mode, size and pixel data."""
+    return a.mode == b.mode and a.size == b.size and a.tobytes() == b.tobytes()
@@ -0,0 +1,214 @@
+"""
+Tests that both PDF backends embed every source layout losslessly and
+identically, checked by decoding the output with pypdf.
+"""
+
+import io
+import random
+
+import pypdf
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageStat, features
+
+import pdf_backends
+from image_to_pdf_converter import ImageToPDFConverter
+from pdf_backends import BACKENDS, _has_canvas_internals
+from pdf_helpers import (bilevel, gradient, page_images, page_xobjects, png_idat,
+                         sample_images, same_pixels, save)
+from pdf_writer import (StreamingPDFWriter, decode_pdf_image, encode_ccitt_image,
+                        encode_pil_image, to_pdf_mode)
+
+SAMPLES = ['rgb.png', 'rgba.png', 'palette.png', 'bilevel.png', 'gray16.png',
+           'cmyk.jpg', 'rgb.jpg', 'strips.tif', 'group4.tif']
+LOSSLESS = [name for name in SAMPLES if name != 'rgb.jpg']
+
+needs_libtiff = pytest.mark.skipif(not features.check('libtiff'),
+                                   reason='Pillow was built without libtiff')
+
+
+@pytest.fixture(scope='module')
+def samples(tmp_path_factory):
+    return sample_images(str(tmp_path_factory.mktemp('samples')))
+
+
+@pytest.fixture(scope='module')
+def converted(samples, tmp_path_factory):
+    """Each sample converted with each backend: {(backend, name): pdf path}."""
+    directory = tmp_path_factory.mktemp('converted')
+    outputs = {}
+    for backend in sorted(BACKENDS):
+        converter = ImageToPDFConverter(quiet=True, backend=backend)
+        for name in SAMPLES:
+            outputs[backend, name] = converter.convert_single_image(
+                samples[name], str(directory / ('%s.%s.pdf' % (name, backend))))
+    return outputs
+
+
+def line_art(size=(1200, 800)):
+    """A black and white drawing of overlapping ellipses, where Group 4 beats Flate."""
+    rng = random.Random(7)
+    img = Image.new('1', size, 1)
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    for _ in range(40):
+        left, top = rng.randrange(width // 2), rng.randrange(height // 2)
+        draw.ellipse((left, top, rng.randrange(left + 10, width), rng.randrange(top + 10, height)),
+                     outline=0, width=3)
+    return img
+
+
+def decoded_source(path):
+    """The source image as the PDF should reproduce it."""
+    with Image.open(path) as img:
+        img.load()
+        return to_pdf_mode(img)
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_backends_embed_the_same_image(converted, name):
+    reportlab, direct = converted['reportlab', name], converted['direct', name]
+    assert same_pixels(page_images(reportlab)[0], page_images(direct)[0])
+
+    expected, actual = page_xobjects(reportlab)[0], page_xobjects(direct)[0]
+    for key in ('/Width', '/Height', '/ColorSpace', '/BitsPerComponent', '/Filter', '/DecodeParms'):
+        assert actual.get(key) == expected.get(key), key
+    assert ('/SMask' in actual) == ('/SMask' in expected)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('name', LOSSLESS)
+def test_lossless_sources_round_trip(samples, converted, backend, name):
+    assert same_pixels(page_images(converted[backend, name])[0], decoded_source(samples[name]))
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_alpha_becomes_a_soft_mask(converted, backend):
+    xobject = page_xobjects(converted[backend, 'rgba.png'])[0]
+    assert xobject['/ColorSpace'] == '/DeviceRGB'
+    assert xobject['/SMask'].get_object()['/ColorSpace'] == '/DeviceGray'
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_jpeg_passthrough_embeds_the_file(samples, converted, backend):
+    with open(samples['rgb.jpg'], 'rb') as f:
+        jpeg = f.read()
+    with open(converted[backend, 'rgb.jpg'], 'rb') as f:
+        assert jpeg in f.read()
+    assert page_xobjects(converted[backend, 'rgb.jpg'])[0]['/Filter'] == '/DCTDecode'
+
+    decoded = page_images(converted[backend, 'rgb.jpg'])[0]
+    difference = ImageChops.difference(decoded, decoded_source(samples['rgb.jpg']))
+    assert max(ImageStat.Stat(difference).mean) < 2
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('name, colors, bits', [('rgb.png', 3, 8), ('bilevel.png', 1, 1)])
+def test_png_passthrough_embeds_idat(samples, converted, backend, name, colors, bits):
+    xobject = page_xobjects(converted[backend, name])[0]
+    assert xobject['/Filter'] == '/FlateDecode'
+    parms = xobject['/DecodeParms']
+    assert (parms['/Predictor'], parms['/Colors'], parms['/BitsPerComponent'],
+            parms['/Columns']) == (15, colors, bits, 120)
+    with open(converted[backend, name], 'rb') as f:
+        assert png_idat(samples[name]) in f.read()
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_png_passthrough_can_be_disabled(samples, tmp_path, backend):
+    # Re-encoded at another level, so the data cannot match the file's IDAT by chance
+    converter = ImageToPDFConverter(quiet=True, backend=backend, png_passthrough=False,
+                                    flate_level=1)
+    output = converter.convert_single_image(samples['rgb.png'], str(tmp_path / 'out.pdf'))
+    with open(output, 'rb') as f:
+        assert png_idat(samples['rgb.png']) not in f.read()
+    assert same_pixels(page_images(output)[0], decoded_source(samples['rgb.png']))
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_group4_tiff_passthrough_embeds_the_strip(samples, converted, backend):
+    with Image.open(samples['group4.tif']) as img:
+        offset, byte_count = img.tag_v2[273], img.tag_v2[279]
+    offset = offset[0] if isinstance(offset, tuple) else offset
+    byte_count = byte_count[0] if isinstance(byte_count, tuple) else byte_count
+    with open(samples['group4.tif'], 'rb') as f:
+        f.seek(offset)
+        strip = f.read(byte_count)
+
+    xobject = page_xobjects(converted[backend, 'group4.tif'])[0]
+    assert xobject['/Filter'] == '/CCITTFaxDecode'
+    assert xobject['/DecodeParms']['/K'] == -1
+    with open(converted[backend, 'group4.tif'], 'rb') as f:
+        assert strip in f.read()
+
+
+def test_reportlab_has_the_canvas_internals_the_backend_uses():
+    from reportlab.pdfgen import canvas
+
+    assert _has_canvas_internals(canvas.Canvas(io.BytesIO()))
+
+
+def test_reportlab_falls_back_to_draw_image(samples, converted, tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_backends, '_has_canvas_internals', lambda c: False)
+    output = str(tmp_path / 'merged.pdf')
+    converter = ImageToPDFConverter(quiet=True, backend='reportlab')
+    assert converter.convert_multiple_images([samples[name] for name in SAMPLES] * 2, output)
+
+    pages = page_images(output)
+    assert len(pages) == 2 * len(SAMPLES)
+    # drawImage embeds everything but JPEG data as 8-bit gray or RGB
+    for name, page in zip(SAMPLES * 2, pages):
+        expected = page_images(converted['reportlab', name])[0]
+        assert same_pixels(page.convert('RGB'), expected.convert('RGB')), name
+    xobjects = page_xobjects(output)
+    assert '/SMask' in xobjects[SAMPLES.index('rgba.png')]
+    assert xobjects[SAMPLES.index('rgb.jpg')]['/Filter'] in ('/DCTDecode', ['/DCTDecode'])
+    # Repeated images are still embedded once
+    assert (xobjects[0].indirect_reference
+            == xobjects[len(SAMPLES)].indirect_reference)
+
+
+@pytest.mark.parametrize('name', LOSSLESS)
+def test_decode_pdf_image_inverts_the_encoders(samples, name):
+    source = decoded_source(samples[name])
+    assert same_pixels(decode_pdf_image(encode_pil_image(source)), source)
+    if source.mode == '1' and features.check('libtiff'):
+        assert same_pixels(decode_pdf_image(encode_ccitt_image(source)), source)
+
+
+@needs_libtiff
+def test_ccitt_encoding_round_trips():
+    image = bilevel()
+    pdf_image = encode_ccitt_image(image)
+    assert (pdf_image.filter, pdf_image.bits, pdf_image.color_space) == ('CCITTFaxDecode', 1,
+                                                                        'DeviceGray')
+    output = io.BytesIO()
+    with StreamingPDFWriter(output) as writer:
+        writer.add_image_page(pdf_image, (200, 200), 0, 0, 120, 90)
+    assert same_pixels(pypdf.PdfReader(output, strict=True).pages[0].images[0].image, image)
+
+
+@needs_libtiff
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_optimize_embeds_colour_scans_as_group4(tmp_path, backend):
+    path = save(line_art().convert('RGB'), str(tmp_path), 'scan.jpg', quality=95)
+    converter = ImageToPDFConverter(quiet=True, backend=backend, optimize=True)
+    output = converter.convert_single_image(path, str(tmp_path / 'scan.pdf'))
+
+    xobject = page_xobjects(output)[0]
+    assert (xobject['/Filter'], xobject['/BitsPerComponent']) == ('/CCITTFaxDecode', 1)
+    # JPEG noise around the edges may flip a few pixels at the threshold
+    difference = ImageChops.difference(page_images(output)[0].convert('L'), line_art().convert('L'))
+    assert ImageStat.Stat(difference).mean[0] < 255 * 0.01
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_optimize_embeds_gray_content_as_gray(tmp_path, backend):
+    gray = gradient().convert('L')
+    path = save(gray.convert('RGB'), str(tmp_path), 'gray.png')
+    # Passthrough would keep the PNG as-is, since its IDAT is smaller than plain Flate
+    converter = ImageToPDFConverter(quiet=True, backend=backend, optimize=True,
+                                    png_passthrough=False)
+    output = converter.convert_single_image(path, str(tmp_path / 'gray.pdf'))
+
+    assert page_xobjects(output)[0]['/ColorSpace'] == '/DeviceGray'
+    assert same_pixels(page_images(output)[0], gray)
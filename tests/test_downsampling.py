@@ -0,0 +1,125 @@
+"""Tests for target-DPI downsampling and the Flate encodings it produces."""
+
+import os
+import random
+import zlib
+
+import pytest
+from PIL import Image, ImageDraw
+
+from image_to_pdf_converter import ImageToPDFConverter
+from pdf_helpers import gradient, page_images, page_xobjects, save
+from pdf_writer import encode_pil_bands, encode_pil_image, resample_image
+
+
+def flat_page(size=(1240, 1754)):
+    """A page of solid bars, which compresses to almost nothing at any size."""
+    rng = random.Random(3)
+    img = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(img)
+    for y in range(100, size[1] - 100, 30):
+        draw.rectangle((100, y, rng.randrange(400, size[0] - 100), y + 10), fill=(20, 20, 20))
+    return img
+
+
+def drawing(size=(1240, 1754)):
+    """Black and white line art."""
+    rng = random.Random(5)
+    img = Image.new('1', size, 1)
+    draw = ImageDraw.Draw(img)
+    for _ in range(150):
+        left, top = rng.randrange(size[0] - 200), rng.randrange(size[1] - 200)
+        draw.ellipse((left, top, left + rng.randrange(20, 200), top + rng.randrange(20, 200)),
+                     outline=0, width=3)
+    return img
+
+
+def palette_frames():
+    rng = random.Random(7)
+    frames = []
+    for _ in range(3):
+        frame = Image.new('P', (800, 600))
+        draw = ImageDraw.Draw(frame)
+        for _ in range(20):
+            left, top = rng.randrange(400), rng.randrange(300)
+            draw.ellipse((left, top, left + rng.randrange(50, 400), top + rng.randrange(50, 300)),
+                         fill=rng.randrange(256))
+        frames.append(frame)
+    return frames
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('corpus'))
+    frames = palette_frames()
+    pages = [gradient((1000, 750)).rotate(angle) for angle in (0, 30, 60)]
+    return {
+        'page.png': save(flat_page(), directory, 'page.png'),
+        'anim.gif': save(frames[0], directory, 'anim.gif', save_all=True, append_images=frames[1:]),
+        'multi.tif': save(pages[0], directory, 'multi.tif', save_all=True, append_images=pages[1:],
+                          compression='tiff_lzw'),
+        'group4.tif': save(drawing(), directory, 'group4.tif', compression='group4'),
+        'bilevel.png': save(drawing(), directory, 'bilevel.png'),
+        'photo.jpg': save(gradient((1600, 1200)), directory, 'photo.jpg', quality=90),
+    }
+
+
+def converted_size(path, output, target_dpi=None):
+    converter = ImageToPDFConverter(quiet=True, target_dpi=target_dpi, all_frames=True)
+    return os.path.getsize(converter.convert_single_image(path, output))
+
+
+@pytest.mark.parametrize('target_dpi', [72, 150, 300])
+@pytest.mark.parametrize('name', ['page.png', 'anim.gif', 'multi.tif', 'group4.tif',
+                                  'bilevel.png', 'photo.jpg'])
+def test_downsampling_never_grows_the_output(corpus, tmp_path, name, target_dpi):
+    original = converted_size(corpus[name], str(tmp_path / 'original.pdf'))
+    downsampled = converted_size(corpus[name], str(tmp_path / 'downsampled.pdf'), target_dpi)
+    assert downsampled <= original
+
+
+@pytest.mark.parametrize('name', ['group4.tif', 'bilevel.png'])
+def test_downsampled_bilevel_images_stay_bilevel(corpus, tmp_path, name):
+    converter = ImageToPDFConverter(quiet=True, target_dpi=50)
+    output = converter.convert_single_image(corpus[name], str(tmp_path / 'out.pdf'))
+    xobject = page_xobjects(output)[0]
+    assert xobject['/BitsPerComponent'] == 1
+    assert xobject['/Width'] < drawing().width
+
+
+def test_resample_image_thresholds_bilevel_images():
+    assert resample_image(drawing(), (310, 438), draft=False).mode == '1'
+    assert resample_image(drawing().convert('L'), (310, 438), draft=False, bilevel=True).mode == '1'
+    assert resample_image(drawing().convert('L'), (310, 438), draft=False).mode == 'L'
+
+
+@pytest.mark.parametrize('mode', ['L', 'RGB'])
+def test_flate_images_use_png_predictors(mode):
+    img = gradient((300, 200)).convert(mode)
+    pdf_image = encode_pil_image(img)
+    assert pdf_image.decode_parms.startswith('<< /Predictor 15')
+    assert len(pdf_image.data) < len(zlib.compress(img.tobytes()))
+
+
+@pytest.mark.parametrize('mode', ['L', 'RGB', 'RGBA', '1', 'CMYK'])
+def test_bands_encode_like_the_whole_image(mode):
+    img = gradient((300, 200)).rotate(20).convert(mode)
+    if mode == 'RGBA':
+        img.putalpha(gradient((300, 200)).getchannel('B'))
+    bands = [img.crop((0, top, 300, min(top + 23, 200))) for top in range(0, 200, 23)]
+    whole = encode_pil_image(img)
+    banded = encode_pil_bands(bands, 300, 200)
+    assert banded.decode_parms == whole.decode_parms
+    assert zlib.decompress(banded.data) == zlib.decompress(whole.data)
+    assert (banded.smask is None) == (whole.smask is None)
+
+
+def test_downsampled_pages_keep_their_pixels(corpus, tmp_path):
+    converter = ImageToPDFConverter(quiet=True, target_dpi=100, jpeg_passthrough=False)
+    output = converter.convert_single_image(corpus['photo.jpg'], str(tmp_path / 'out.pdf'))
+    decoded = page_images(output)[0]
+    assert decoded.width < 1600
+    expected = gradient((1600, 1200)).resize(decoded.size)
+    difference = [abs(a - b) for a, b in zip(decoded.convert('L').tobytes(),
+                                              expected.convert('L').tobytes())]
+    assert sum(difference) / len(difference) < 8
@@ -0,0 +1,130 @@
+"""Tests for hot-folder watch mode, driven with explicit poll times."""
+
+import os
+import time
+
+import pytest
+
+from hot_folder import HotFolderWatcher
+from image_to_pdf_converter import ImageToPDFConverter
+from pdf_helpers import gradient, page_images, same_pixels, save
+
+
+@pytest.fixture
+def folders(tmp_path):
+    watched = tmp_path / 'drop'
+    (watched / 'sub').mkdir(parents=True)
+    return str(watched), str(tmp_path / 'out')
+
+
+def watcher_for(watched, output, **options):
+    options.setdefault('recursive', True)
+    return HotFolderWatcher(ImageToPDFConverter(quiet=True), watched, output,
+                            settle_time=0.5, batch_window=0.5, **options)
+
+
+def settle(watcher, start):
+    """Step until the current files settle and their batch is converted."""
+    created = []
+    for offset in (0.0, 1.0, 2.0):
+        created.extend(watcher.step(start + offset))
+    return created
+
+
+def backdate(path, seconds=60):
+    """Move a file's or directory's mtime into the past."""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_new_files_are_converted_into_the_mirrored_tree(folders):
+    watched, output = folders
+    save(gradient((40, 30)), watched, 'scan.png')
+    save(gradient((50, 30)), os.path.join(watched, 'sub'), 'scan.png')
+    watcher = watcher_for(watched, output)
+
+    assert watcher.step(0.0) == []  # first sighting
+    created = settle(watcher, 1.0)
+    assert sorted(created) == [os.path.join(output, 'scan.pdf'),
+                               os.path.join(output, 'sub', 'scan.pdf')]
+    assert same_pixels(page_images(os.path.join(output, 'sub', 'scan.pdf'))[0],
+                       gradient((50, 30)))
+    # Converted files are left alone afterwards
+    assert settle(watcher, 10.0) == []
+
+
+def test_files_still_being_written_wait_until_they_settle(folders):
+    watched, output = folders
+    path = save(gradient((40, 30)), watched, 'copying.png')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    empty = os.path.join(watched, 'empty.png')
+    open(empty, 'wb').close()
+    watcher = watcher_for(watched, output)
+
+    assert watcher.poll(0.0) == []
+    with open(path, 'ab') as f:
+        f.write(data[len(data) // 2:])
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    # Changed since the last poll: the settle time starts again
+    assert watcher.poll(1.0) == []
+    assert watcher.poll(1.2) == []
+    assert watcher.poll(2.0) == [path]
+    # Empty files never count as finished
+    assert watcher.poll(5.0) == []
+
+
+def test_files_changed_after_conversion_are_converted_again(folders):
+    watched, output = folders
+    path = save(gradient((40, 30)), watched, 'scan.png')
+    watcher = watcher_for(watched, output)
+    settle(watcher, 0.0)
+
+    save(gradient((60, 30)), watched, 'scan.png')
+    assert settle(watcher, 10.0) == [os.path.join(output, 'scan.pdf')]
+    assert same_pixels(page_images(os.path.join(output, 'scan.pdf'))[0], gradient((60, 30)))
+    assert path in watcher._converted
+
+
+def test_in_place_overwrites_are_found_by_the_full_scan(folders):
+    watched, output = folders
+    path = save(gradient((40, 30)), watched, 'scan.png')
+    backdate(path)
+    backdate(watched)
+    watcher = watcher_for(watched, output, recursive=False)
+    settle(watcher, 0.0)
+
+    # Overwriting a file does not change its directory's mtime, so the
+    # cached listing hides the change until the next full scan
+    save(gradient((60, 30)), watched, 'scan.png')
+    backdate(watched)
+    assert settle(watcher, 5.0) == []
+    assert settle(watcher, 5.0 + HotFolderWatcher.FULL_SCAN_INTERVAL) == [
+        os.path.join(output, 'scan.pdf')]
+
+
+def test_forgotten_files_are_pruned(folders):
+    watched, output = folders
+    converted = save(gradient((40, 30)), watched, 'done.png')
+    watcher = watcher_for(watched, output)
+    settle(watcher, 0.0)
+    pending = save(gradient((40, 30)), os.path.join(watched, 'sub'), 'pending.png')
+    watcher.poll(10.0)
+    assert converted in watcher._converted and pending in watcher._observed
+
+    os.remove(converted)
+    os.remove(pending)
+    watcher.poll(11.0)
+    assert watcher._converted == {} and watcher._observed == {}
+
+
+def test_merge_mode_converts_each_batch_into_one_pdf(folders):
+    watched, output = folders
+    for i in range(3):
+        save(gradient((40 + i, 30)), watched, 'page%d.png' % i)
+    watcher = watcher_for(watched, output, merge=True)
+    created = settle(watcher, 0.0)
+    assert len(created) == 1 and os.path.basename(created[0]).startswith('batch-')
+    assert len(page_images(created[0])) == 3
@@ -0,0 +1,120 @@
+"""Tests for header probing and the probe cache."""
+
+import os
+
+import pytest
+from PIL import Image
+
+import image_probe
+from image_probe import ProbeCache, probe_image
+from pdf_helpers import gradient, sample_images, save
+
+
+@pytest.fixture(scope='module')
+def samples(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('probe'))
+    files = sample_images(directory)
+    rgb = gradient()
+    files.update({
+        'progressive.jpg': save(rgb, directory, 'progressive.jpg', progressive=True),
+        'gray.jpg': save(rgb.convert('L'), directory, 'gray.jpg'),
+        'gray-alpha.png': save(rgb.convert('LA'), directory, 'gray-alpha.png'),
+        'dpi.png': save(rgb, directory, 'dpi.png', dpi=(300, 300)),
+        'dpi.jpg': save(rgb, directory, 'dpi.jpg', dpi=(150, 150)),
+        'palette.gif': save(rgb.quantize(16), directory, 'palette.gif'),
+        'rgb.bmp': save(rgb, directory, 'rgb.bmp'),
+        'rgb.webp': save(rgb, directory, 'rgb.webp'),
+        'raw.tif': save(rgb, directory, 'raw.tif'),
+    })
+    return files
+
+
+@pytest.mark.parametrize('name', [
+    'rgb.png', 'rgba.png', 'palette.png', 'bilevel.png', 'gray16.png', 'gray-alpha.png',
+    'cmyk.jpg', 'rgb.jpg', 'progressive.jpg', 'gray.jpg', 'palette.gif', 'rgb.bmp',
+    'rgb.webp', 'strips.tif', 'group4.tif', 'raw.tif',
+])
+def test_probe_matches_pillow(samples, name):
+    info = probe_image(samples[name])
+    with Image.open(samples[name]) as img:
+        assert (info.format, info.width, info.height, info.mode) == (img.format, img.width,
+                                                                    img.height, img.mode)
+
+
+@pytest.mark.parametrize('name, bits, encoding', [
+    ('rgb.jpg', 8, 'baseline'),
+    ('progressive.jpg', 8, 'progressive'),
+    ('bilevel.png', 1, 'deflate'),
+    ('gray16.png', 16, 'deflate'),
+    ('strips.tif', 8, 'lzw'),
+    ('group4.tif', 1, 'group4'),
+])
+def test_probe_reports_bits_and_encoding(samples, name, bits, encoding):
+    info = probe_image(samples[name])
+    assert (info.bits, info.encoding) == (bits, encoding)
+
+
+@pytest.mark.parametrize('name, dpi', [('dpi.png', 300), ('dpi.jpg', 150)])
+def test_probe_reads_resolution(samples, name, dpi):
+    assert probe_image(samples[name]).dpi == pytest.approx((dpi, dpi), abs=0.01)
+
+
+def test_probe_accepts_file_objects(samples):
+    with open(samples['rgb.png'], 'rb') as f:
+        assert probe_image(f) == probe_image(samples['rgb.png'])
+
+
+def test_probe_rejects_non_images(tmp_path):
+    path = tmp_path / 'notes.png'
+    path.write_bytes(b'not an image at all')
+    with pytest.raises(OSError, match='notes.png'):
+        probe_image(str(path))
+
+
+@pytest.fixture
+def counted_probes(monkeypatch):
+    """Count calls to image_probe.probe_image made through ProbeCache."""
+    calls = []
+
+    def probe(path):
+        calls.append(path)
+        return probe_image(path)
+
+    monkeypatch.setattr(image_probe, 'probe_image', probe)
+    return calls
+
+
+def test_probe_cache_reuses_results(samples, counted_probes):
+    cache = ProbeCache()
+    first = cache.get(samples['rgb.png'])
+    assert cache.get(samples['rgb.png']) is first
+    assert len(counted_probes) == 1
+
+
+def test_probe_cache_reprobes_changed_files(tmp_path, counted_probes):
+    cache = ProbeCache()
+    path = save(gradient(), str(tmp_path), 'changing.png')
+    assert (cache.get(path).width, cache.get(path).height) == (120, 90)
+
+    stat = os.stat(path)
+    save(gradient((60, 40)), str(tmp_path), 'changing.png')
+    # Make sure the change is visible even on coarse file system clocks
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert (cache.get(path).width, cache.get(path).height) == (60, 40)
+    assert len(counted_probes) == 2
+
+
+def test_probe_cache_evicts_least_recently_used(samples, counted_probes):
+    cache = ProbeCache(max_entries=2)
+    cache.get(samples['rgb.png'])
+    cache.get(samples['rgb.jpg'])
+    cache.get(samples['rgb.png'])
+    cache.get(samples['cmyk.jpg'])  # evicts rgb.jpg
+    cache.get(samples['rgb.png'])
+    assert len(counted_probes) == 3
+    cache.get(samples['rgb.jpg'])
+    assert len(counted_probes) == 4
+
+    cache.clear()
+    cache.get(samples['rgb.png'])
+    assert len(counted_probes) == 5
@@ -0,0 +1,155 @@
+"""Tests for incremental, resumable directory conversion and its manifest."""
+
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from batch_manifest import ConversionManifest
+from image_to_pdf_converter import ImageToPDFConverter
+from pdf_helpers import gradient, save
+
+
+class CountingConverter(ImageToPDFConverter):
+    """Records which images were actually converted (in-process runs only)."""
+
+    def __init__(self, **options):
+        options.setdefault('quiet', True)
+        super().__init__(**options)
+        self.converted = []
+
+    def convert_single_image(self, image_path, output_path=None):
+        self.converted.append(os.path.basename(image_path))
+        return super().convert_single_image(image_path, output_path)
+
+
+@pytest.fixture
+def folders(tmp_path):
+    source = tmp_path / 'images'
+    source.mkdir()
+    # BMPs keep their size when their pixels change, so only mtime or hash tell
+    for i in range(3):
+        save(gradient((60, 40)).rotate(90 * i), str(source), 'image%d.bmp' % i)
+    return str(source), str(tmp_path / 'pdfs')
+
+
+def run(source, output, **options):
+    use_hash = options.pop('use_hash', False)
+    converter = CountingConverter(**options)
+    created = converter.batch_convert_directory(source, output, incremental=True, use_hash=use_hash)
+    return converter.converted, created
+
+
+def rewrite(path, img, mtime_step_ns=2_000_000_000):
+    """Replace an image's content and move its mtime forward."""
+    stat = os.stat(path)
+    img.save(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_step_ns))
+
+
+def touch(path, mtime_step_ns=2_000_000_000):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_step_ns))
+
+
+def test_unchanged_files_are_skipped(folders):
+    source, output = folders
+    converted, created = run(source, output)
+    assert sorted(converted) == ['image0.bmp', 'image1.bmp', 'image2.bmp']
+
+    converted, created_again = run(source, output)
+    assert converted == []
+    assert sorted(created_again) == sorted(created)
+    assert os.path.exists(os.path.join(output, ConversionManifest.FILENAME))
+
+
+@pytest.mark.parametrize('use_hash', [False, True])
+def test_changed_content_is_reconverted(folders, use_hash):
+    source, output = folders
+    run(source, output, use_hash=use_hash)
+    rewrite(os.path.join(source, 'image1.bmp'), gradient((60, 40)).transpose(Image.FLIP_TOP_BOTTOM))
+    assert run(source, output, use_hash=use_hash)[0] == ['image1.bmp']
+    assert run(source, output, use_hash=use_hash)[0] == []
+
+
+def test_touched_files_are_reconverted_without_hashes(folders):
+    source, output = folders
+    run(source, output)
+    touch(os.path.join(source, 'image2.bmp'))
+    assert run(source, output)[0] == ['image2.bmp']
+
+
+def test_touched_files_are_skipped_and_not_rehashed_with_hashes(folders, monkeypatch):
+    source, output = folders
+    run(source, output, use_hash=True)
+    touch(os.path.join(source, 'image2.bmp'))
+
+    hashed = []
+    content_hash = ConversionManifest._content_hash
+    monkeypatch.setattr(ConversionManifest, '_content_hash',
+                        staticmethod(lambda path: hashed.append(path) or content_hash(path)))
+    assert run(source, output, use_hash=True)[0] == []
+    assert [os.path.basename(path) for path in hashed] == ['image2.bmp']
+
+    # The new mtime was recorded, so the next run does not hash again
+    hashed.clear()
+    assert run(source, output, use_hash=True)[0] == []
+    assert hashed == []
+
+
+def test_deleted_outputs_are_recreated(folders):
+    source, output = folders
+    _, created = run(source, output)
+    deleted = [path for path in created if os.path.basename(path) == 'image0.pdf'][0]
+    os.remove(deleted)
+    assert run(source, output)[0] == ['image0.bmp']
+    assert os.path.exists(deleted)
+
+
+def test_runtime_options_do_not_invalidate_entries(folders):
+    source, output = folders
+    run(source, output)
+    assert run(source, output, backend='direct', memory_budget=10_000_000)[0] == []
+
+    # Pooled runs convert in other processes, so look at the outputs instead
+    pdfs = [os.path.join(output, 'image%d.pdf' % i) for i in range(3)]
+    before = [os.stat(path).st_mtime_ns for path in pdfs]
+    created = CountingConverter().batch_convert_directory(source, output, workers=2,
+                                                          incremental=True)
+    assert sorted(created) == pdfs
+    assert [os.stat(path).st_mtime_ns for path in pdfs] == before
+
+
+def test_output_options_invalidate_entries(folders):
+    source, output = folders
+    run(source, output)
+    assert sorted(run(source, output, page_size='Letter')[0]) == ['image0.bmp', 'image1.bmp',
+                                                                  'image2.bmp']
+    assert run(source, output, page_size='Letter')[0] == []
+
+
+def test_interrupted_runs_resume(folders):
+    source, output = folders
+    run(source, output)
+    manifest = os.path.join(output, ConversionManifest.FILENAME)
+    with open(manifest, encoding='utf-8') as f:
+        lines = f.readlines()
+    # Lose the last entry and leave a torn line, as a killed run would
+    with open(manifest, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:20])
+    lost = os.path.basename(json.loads(lines[-1])['source'])
+    assert run(source, output)[0] == [lost]
+
+
+def test_compact_keeps_one_line_per_source(folders):
+    source, output = folders
+    run(source, output)
+    touch(os.path.join(source, 'image0.bmp'))
+    run(source, output)
+    with ConversionManifest(output, {}) as manifest:
+        manifest.compact()
+    with open(os.path.join(output, ConversionManifest.FILENAME), encoding='utf-8') as f:
+        sources = [json.loads(line)['source'] for line in f]
+    assert sorted(sources) == sorted(set(sources)) and len(sources) == 3
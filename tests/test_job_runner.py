@@ -0,0 +1,227 @@
+"""Tests for running JSONL job manifests on the pool of warm worker processes."""
+
+import io
+import json
+import multiprocessing
+import os
+import time
+
+import pypdf
+import pytest
+
+import job_runner
+from job_runner import JobRunner, parse_job, read_manifest
+from pdf_helpers import gradient, save
+
+run_job = job_runner.run_job
+
+# Scripted jobs are patched into the worker processes, which only inherit
+# the patch when they are forked
+needs_fork = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                                reason='workers are not forked on this platform')
+
+
+def scripted_run_job(spec, converters=None):
+    """
+    run_job, with behaviour chosen by the job id's prefix: 'sleep' and
+    'crash' write a partial output and then hang or kill the worker, 'fail'
+    does the same and raises, 'flaky' fails its first two attempts, 'nap'
+    records when it runs in ``spans.txt``. Every job appends its id to
+    ``order.txt`` next to its output when it starts.
+    """
+    kind = spec['id'].split('-')[0]
+    output = spec['output']
+    with open(os.path.join(os.path.dirname(output), 'order.txt'), 'a') as f:
+        f.write(spec['id'] + '\n')
+    if kind == 'nap':
+        start = time.time()
+        time.sleep(0.3)
+        with open(os.path.join(os.path.dirname(output), 'spans.txt'), 'a') as f:
+            f.write('%s %f %f %s\n' % (spec['id'], start, time.time(), spec.get('memory_budget')))
+    if kind in ('sleep', 'crash', 'fail'):
+        with open(output, 'wb') as f:
+            f.write(b'%PDF-1.4 partial')
+        if kind == 'sleep':
+            time.sleep(60)
+        if kind == 'crash':
+            os._exit(3)
+        raise RuntimeError('scripted failure')
+    if kind == 'flaky':
+        attempts_path = output + '.attempts'
+        attempts = os.path.getsize(attempts_path) if os.path.exists(attempts_path) else 0
+        with open(attempts_path, 'a') as f:
+            f.write('x')
+        if attempts < 2:
+            raise RuntimeError('flaky attempt %d' % (attempts + 1))
+    return run_job(spec, converters)
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    monkeypatch.setattr(job_runner, 'run_job', scripted_run_job)
+
+
+@pytest.fixture
+def image(tmp_path):
+    return save(gradient((40, 30)), str(tmp_path), 'image.png')
+
+
+def job(line, image, out_dir, job_id, **spec):
+    spec.setdefault('output', os.path.join(str(out_dir), job_id + '.pdf'))
+    return parse_job(dict(spec, id=job_id, inputs=[image]), line)
+
+
+def order(out_dir):
+    with open(os.path.join(str(out_dir), 'order.txt')) as f:
+        return f.read().split()
+
+
+@needs_fork
+def test_priority_order_and_retries(scripted, image, tmp_path):
+    jobs = [job(1, image, tmp_path, 'low'),
+            job(2, image, tmp_path, 'flaky-high', priority=5, retries=2),
+            job(3, image, tmp_path, 'also-low'),
+            job(4, image, tmp_path, 'urgent', priority=9)]
+    records = JobRunner(workers=1, quiet=True).run(jobs)
+
+    # Retries keep their place, ahead of jobs of lower priority
+    assert order(tmp_path) == ['urgent', 'flaky-high', 'flaky-high', 'flaky-high', 'low', 'also-low']
+    assert [record['id'] for record in records] == ['urgent', 'flaky-high', 'low', 'also-low']
+    assert all(record['status'] == 'succeeded' for record in records)
+    assert [record['attempts'] for record in records] == [1, 3, 1, 1]
+    for record in records:
+        assert record['outputs'] == [os.path.join(str(tmp_path), record['id'] + '.pdf')]
+        assert record['pages'] == 1 and record['error'] is None
+        assert len(pypdf.PdfReader(record['outputs'][0]).pages) == 1
+
+
+@needs_fork
+def test_failures_use_up_their_retries(scripted, image, tmp_path):
+    records = JobRunner(workers=1, quiet=True).run(
+        [job(1, image, tmp_path, 'flaky-short', retries=1),
+         job(2, image, tmp_path, 'fail-always', retries=2)])
+
+    assert [(r['id'], r['status'], r['attempts']) for r in records] == [
+        ('flaky-short', 'failed', 2), ('fail-always', 'failed', 3)]
+    assert records[0]['error'] == 'RuntimeError: flaky attempt 2'
+    assert records[1]['error'] == 'RuntimeError: scripted failure'
+    assert all(record['outputs'] == [] and record['pages'] == 0 for record in records)
+    # The partial PDF every failed attempt wrote is removed again
+    assert not (tmp_path / 'fail-always.pdf').exists()
+
+
+@needs_fork
+def test_timeout_kills_the_worker(scripted, image, tmp_path):
+    jobs = [job(1, image, tmp_path, 'sleep-forever', timeout=0.5, retries=1),
+            job(2, image, tmp_path, 'after')]
+    started = time.monotonic()
+    records = JobRunner(workers=1, quiet=True).run(jobs)
+
+    assert time.monotonic() - started < 20
+    timed_out = records[0]
+    assert (timed_out['id'], timed_out['status'], timed_out['attempts']) == ('sleep-forever', 'timed_out', 2)
+    assert timed_out['error'] == 'Timed out after 0.5 s'
+    assert 0.5 <= timed_out['seconds'] < 10
+    assert not (tmp_path / 'sleep-forever.pdf').exists()
+    # The replacement worker runs the next job
+    assert records[1]['status'] == 'succeeded'
+
+
+@needs_fork
+def test_crashed_worker_is_replaced(scripted, image, tmp_path):
+    # A planned output that exists before the job and is left alone is kept
+    index_path = tmp_path / 'crash-hard.index.json'
+    index_path.write_text('{"old": true}')
+    records = JobRunner(workers=2, quiet=True).run(
+        [job(1, image, tmp_path, 'crash-hard'), job(2, image, tmp_path, 'fine')])
+
+    by_id = {record['id']: record for record in records}
+    assert by_id['crash-hard']['status'] == 'failed'
+    assert by_id['crash-hard']['error'] == 'Worker process exited with code 3'
+    assert not (tmp_path / 'crash-hard.pdf').exists()
+    assert index_path.read_text() == '{"old": true}'
+    assert by_id['fine']['status'] == 'succeeded'
+
+
+@needs_fork
+@pytest.mark.parametrize('memory_budget', [100_000, None])
+def test_jobs_share_one_memory_budget(scripted, tmp_path, memory_budget):
+    # Decodes to 60 kB, so two jobs of it do not fit in 100 kB at once
+    image = save(gradient((150, 100)), str(tmp_path), 'large.png')
+    jobs = [job(line, image, tmp_path, 'nap-%d' % line, png_passthrough=False)
+            for line in range(1, 4)]
+    records = JobRunner(workers=3, quiet=True, memory_budget=memory_budget).run(jobs)
+    assert all(record['status'] == 'succeeded' for record in records)
+
+    with open(str(tmp_path / 'spans.txt')) as f:
+        spans = [line.split() for line in f]
+    overlapping = any(float(a[1]) < float(b[2]) and float(b[1]) < float(a[2])
+                      for a in spans for b in spans if a is not b)
+    assert overlapping == (memory_budget is None)
+    # Every worker's converter gets the whole budget, not a share of it
+    assert {budget for _, _, _, budget in spans} == {str(memory_budget)}
+
+
+def test_failed_separate_job_removes_the_pdfs_it_wrote(image, tmp_path):
+    bad = tmp_path / 'bad.png'
+    bad.write_bytes(b'not a png')
+    second = save(gradient((30, 20)), str(tmp_path), 'second.png')
+    out_dir = tmp_path / 'separate'
+    out_dir.mkdir()
+    # Left over from an earlier run and not rewritten by this one, so it is kept
+    (out_dir / 'unrelated.pdf').write_bytes(b'%PDF-1.4')
+    spec = {'id': 'mixed', 'inputs': [image, str(bad), second], 'output': str(out_dir),
+            'mode': 'separate', 'retries': 1}
+    records = JobRunner(workers=1, quiet=True).run([parse_job(spec, 1)])
+
+    assert records[0]['status'] == 'failed' and records[0]['attempts'] == 2
+    assert records[0]['error'].startswith('RuntimeError: 1 of 3 images failed')
+    assert os.listdir(str(out_dir)) == ['unrelated.pdf']
+
+
+def test_read_manifest_reports_invalid_lines():
+    lines = ['# comment', '', '{"id": "a", "inputs": "x.png", "output": "a.pdf"}',
+             'not json', '{"id": "b", "inputs": "x.png"}', '{"id": "a", "inputs": "y.png", "output": "y.pdf"}',
+             '{"inputs": "x.png", "output": "c.pdf", "colour": "red"}',
+             '{"inputs": "x.png", "output": "d.pdf", "retries": -1}', '[1, 2]']
+    jobs, invalid = read_manifest(lines, default_retries=2, default_timeout=30)
+
+    assert [(job.id, job.line, job.retries, job.timeout) for job in jobs] == [('a', 3, 2, 30)]
+    assert [(record['id'], record['line']) for record in invalid] == [
+        ('4', 4), ('b', 5), ('a', 6), ('7', 7), ('8', 8), ('9', 9)]
+    assert all(record['status'] == 'invalid' and record['attempts'] == 0 for record in invalid)
+    errors = [record['error'] for record in invalid]
+    assert errors[0].startswith('Invalid JSON')
+    assert 'output' in errors[1] and 'Duplicate job id' in errors[2]
+    assert 'colour' in errors[3] and 'retries' in errors[4] and 'JSON object' in errors[5]
+
+
+def test_main_writes_the_result_log(image, tmp_path, capsys):
+    manifest = tmp_path / 'jobs.jsonl'
+    results = tmp_path / 'results.jsonl'
+    out_dir = tmp_path / 'out'
+    manifest.write_text('\n'.join(json.dumps(spec) for spec in [
+        {'id': 'merged', 'inputs': [image, image], 'output': str(out_dir / 'merged.pdf')},
+        {'id': 'missing', 'inputs': [str(tmp_path / 'missing')], 'output': str(out_dir / 'm.pdf')},
+        {'id': 'broken', 'inputs': [image]},
+    ]) + '\n')
+
+    with pytest.raises(SystemExit) as exit_info:
+        job_runner.main([str(manifest), '--results', str(results), '-j', '1'])
+    assert exit_info.value.code == 1
+
+    with open(str(results), encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [(record['id'], record['status']) for record in records] == [
+        ('broken', 'invalid'), ('merged', 'succeeded'), ('missing', 'failed')]
+    merged = records[1]
+    assert merged['outputs'] == [str(out_dir / 'merged.pdf')] and merged['pages'] == 2
+    assert set(merged) >= {'line', 'attempts', 'seconds', 'error', 'started_at', 'finished_at'}
+    assert '1 succeeded, 1 failed, 1 invalid manifest lines skipped' in capsys.readouterr().out
+
+
+def test_result_log_stream(image, tmp_path):
+    log = io.StringIO()
+    records = JobRunner(workers=1, results=log, quiet=True).run(
+        [job(1, image, tmp_path, 'one'), job(2, image, tmp_path, 'two')])
+    assert [json.loads(line) for line in log.getvalue().splitlines()] == records
@@ -0,0 +1,422 @@
+"""
+Tests for memory_budget: banded TIFF and PNG decoding, admission of
+parallel work by decoded size, and the handling of images over Pillow's
+bomb limit.
+"""
+
+import io
+import struct
+import time
+import zlib
+
+import pypdf
+import pytest
+from PIL import Image, ImageFile
+
+from image_to_pdf_converter import ImageToPDFConverter, _ordered_pool_map
+from memory_budget import MemoryBudget, PngBands, TiffBands, check_decode_size, decoded_size, open_image
+from pdf_helpers import gradient, page_images, png_idat, same_pixels, save
+from pdf_writer import PNG_SIGNATURE, _png_chunk, to_pdf_mode
+
+# Odd sizes, so bands and strips do not line up with the image edges
+SIZE = (517, 389)
+
+
+def noise():
+    return Image.effect_noise(SIZE, 80).convert('L')
+
+
+def tiled_tiff(img, tile_width: int, tile_length: int) -> bytes:
+    """
+    Write an RGB image as a Deflate-compressed tiled TIFF (Pillow only
+    writes strips).
+    """
+    width, height = img.size
+    tiles = []
+    for top in range(0, height, tile_length):
+        for left in range(0, width, tile_width):
+            tile = Image.new('RGB', (tile_width, tile_length))
+            tile.paste(img.crop((left, top, min(left + tile_width, width),
+                                 min(top + tile_length, height))))
+            tiles.append(zlib.compress(tile.tobytes()))
+
+    entries = [(256, 3, [width]), (257, 3, [height]), (258, 3, [8, 8, 8]), (259, 3, [8]),
+               (262, 3, [2]), (277, 3, [3]), (284, 3, [1]), (322, 3, [tile_width]),
+               (323, 3, [tile_length]), (324, 4, None), (325, 4, [len(t) for t in tiles])]
+    ifd_size = 2 + 12 * len(entries) + 4
+    extra_offset = 8 + ifd_size
+    extra = b''
+    tile_data_offset = None
+    ifd = struct.pack('<H', len(entries))
+    for tag, kind, values in entries:
+        if values is None:
+            tile_data_offset = extra_offset + len(extra)
+            # Patched below, once the tile offsets are known
+            values = [0] * len(tiles)
+        fmt = '<%d%s' % (len(values), 'H' if kind == 3 else 'I')
+        packed = struct.pack(fmt, *values)
+        if len(packed) <= 4:
+            ifd += struct.pack('<HHI', tag, kind, len(values)) + packed.ljust(4, b'\0')
+        else:
+            ifd += struct.pack('<HHII', tag, kind, len(values), extra_offset + len(extra))
+            extra += packed
+    ifd += struct.pack('<I', 0)
+
+    data_offset = extra_offset + len(extra)
+    offsets, position = [], data_offset
+    for tile in tiles:
+        offsets.append(position)
+        position += len(tile)
+    start = tile_data_offset - extra_offset
+    extra = (extra[:start] + struct.pack('<%dI' % len(tiles), *offsets)
+             + extra[start + 4 * len(tiles):])
+    return b'II*\0' + struct.pack('<I', 8) + ifd + extra + b''.join(tiles)
+
+
+def tiff_layouts():
+    base = noise()
+    rgb = Image.merge('RGB', (base, base.rotate(90), base.transpose(Image.FLIP_LEFT_RIGHT)))
+    return {
+        'raw-single-strip': (rgb, {}),
+        'raw-strips': (rgb, {'tiffinfo': {278: 10}}),
+        'lzw': (rgb, {'compression': 'tiff_lzw', 'tiffinfo': {278: 16}}),
+        'deflate': (rgb, {'compression': 'tiff_adobe_deflate', 'tiffinfo': {278: 7}}),
+        'jpeg': (rgb, {'compression': 'jpeg', 'tiffinfo': {278: 16}}),
+        'packbits-gray': (base, {'compression': 'packbits', 'tiffinfo': {278: 5}}),
+        'group4': (base.point(lambda v: 255 if v > 128 else 0).convert('1'),
+                   {'compression': 'group4', 'tiffinfo': {278: 20}}),
+        'raw-bilevel': (base.convert('1'), {'tiffinfo': {278: 3}}),
+        'palette': (rgb.convert('P'), {'compression': 'tiff_lzw', 'tiffinfo': {278: 9}}),
+        'rgba': (rgb.convert('RGBA'), {'compression': 'tiff_lzw', 'tiffinfo': {278: 9}}),
+        'gray16': (base.convert('I;16'), {'tiffinfo': {278: 9}}),
+        'cmyk': (rgb.convert('CMYK'), {'compression': 'tiff_adobe_deflate', 'tiffinfo': {278: 9}}),
+        'tiled': (rgb, None),
+    }
+
+
+@pytest.mark.parametrize('name', sorted(tiff_layouts()))
+def test_bands_match_a_whole_decode(tmp_path, name):
+    img, params = tiff_layouts()[name]
+    if params is None:
+        path = tmp_path / (name + '.tif')
+        path.write_bytes(tiled_tiff(img, 64, 48))
+    else:
+        path = save(img, str(tmp_path), name + '.tif', **params)
+
+    with Image.open(path) as whole:
+        whole.load()
+        with open(path, 'rb') as f:
+            bands = TiffBands.open(f)
+            assert bands is not None
+            assert bands.tiled == (name == 'tiled')
+            rows = bands.band_rows(SIZE[0] * 40 * 4, whole.mode)
+            assert rows < SIZE[1]
+            joined = Image.new(whole.mode, whole.size)
+            top = 0
+            for band in bands.iter_bands(rows):
+                if band.mode == 'P':
+                    joined.putpalette(band.getpalette())
+                joined.paste(band, (0, top))
+                top += band.height
+    assert top == SIZE[1]
+    assert same_pixels(joined, whole)
+
+
+def test_single_compressed_strips_are_not_bandable(tmp_path):
+    path = save(noise(), str(tmp_path), 'single.tif', compression='tiff_lzw',
+                tiffinfo={278: SIZE[1]})
+    with open(path, 'rb') as f:
+        assert TiffBands.open(f) is None
+
+
+def test_non_tiffs_are_not_bandable(tmp_path):
+    path = save(noise(), str(tmp_path), 'noise.png')
+    with open(path, 'rb') as f:
+        assert TiffBands.open(f) is None
+
+
+def png_layouts():
+    base = noise()
+    rgb = Image.merge('RGB', (base, base.rotate(90), base.transpose(Image.FLIP_LEFT_RIGHT)))
+    return {
+        'gray': (base, {}),
+        'bilevel': (base.convert('1'), {}),
+        'gray4': (base.quantize(16).convert('L'), {'bits': 4}),
+        'gray16': (base.convert('I;16'), {}),
+        'gray-alpha': (base.convert('LA'), {}),
+        'rgb': (rgb, {}),
+        'rgb-transparent': (rgb, {'transparency': (0, 0, 0)}),
+        'rgba': (rgb.convert('RGBA'), {}),
+        'palette': (rgb.convert('P'), {'transparency': 3}),
+        'palette-alpha': (rgb.convert('P'), {'transparency': bytes(range(0, 256, 2))}),
+        'palette2': (rgb.convert('P', colors=4), {'bits': 2}),
+    }
+
+
+def join_bands(bands, rows, mode):
+    joined, top, info = None, 0, {}
+    for band in bands.iter_bands(rows):
+        if joined is None:
+            joined = Image.new(mode, (bands.width, bands.height))
+        if band.mode == 'P':
+            joined.putpalette(band.getpalette())
+        joined.paste(band, (0, top))
+        top += band.height
+        info = band.info
+    assert top == bands.height
+    return joined, info
+
+
+@pytest.mark.parametrize('name', sorted(png_layouts()))
+def test_png_bands_match_a_whole_decode(tmp_path, name):
+    img, params = png_layouts()[name]
+    path = save(img, str(tmp_path), name + '.png', **params)
+    with Image.open(path) as whole:
+        whole.load()
+        with open(path, 'rb') as f:
+            bands = PngBands.open(f)
+            rows = bands.band_rows(SIZE[0] * 40 * 4, whole.mode)
+            assert 1 < rows < SIZE[1]
+            joined, info = join_bands(bands, rows, whole.mode)
+    assert same_pixels(joined, whole)
+    assert info.get('transparency') == whole.info.get('transparency')
+
+
+def test_png_bands_of_single_rows(tmp_path):
+    path = save(gradient((50, 7)), str(tmp_path), 'rows.png')
+    with Image.open(path) as whole, open(path, 'rb') as f:
+        assert same_pixels(join_bands(PngBands.open(f), 1, 'RGB')[0], whole)
+
+
+def png_file(width, height, bits, color_type, interlace, idat) -> io.BytesIO:
+    """A PNG file with the given header fields and IDAT data (Pillow writes neither
+    interlaced nor 16-bit colour PNGs)."""
+    header = struct.pack('>IIBBBBB', width, height, bits, color_type, 0, 0, interlace)
+    return io.BytesIO(PNG_SIGNATURE + _png_chunk(b'IHDR', header) + _png_chunk(b'IDAT', idat)
+                      + _png_chunk(b'IEND', b''))
+
+
+def test_unsupported_pngs_are_not_bandable(tmp_path):
+    rgb = gradient((60, 40))
+    plain = save(rgb, str(tmp_path), 'plain.png')
+    with open(plain, 'rb') as f:
+        assert PngBands.open(f) is not None
+        assert PngBands.open(f, frame=1) is None
+
+    idat = zlib.compress(bytes(40 * 361))
+    assert PngBands.open(png_file(60, 40, 8, 2, 1, idat)) is None
+    assert PngBands.open(png_file(60, 40, 16, 2, 0, idat)) is None
+    assert PngBands.open(png_file(60, 1, 8, 2, 0, idat)) is None
+    assert PngBands.open(png_file(60, 40, 8, 3, 0, idat)) is None  # No palette
+    assert PngBands.open(io.BytesIO(b'not a png at all')) is None
+
+
+def test_damaged_png_data_fails_to_band(tmp_path):
+    idat = png_idat(save(noise(), str(tmp_path), 'noise.png'))
+    for damaged in (idat[:len(idat) // 2], idat[:100] + bytes(len(idat) - 100)):
+        bands = PngBands.open(png_file(SIZE[0], SIZE[1], 8, 0, 0, damaged))
+        with pytest.raises(OSError):
+            list(bands.iter_bands(16))
+
+
+@pytest.fixture
+def large_images(tmp_path):
+    """Images that each decode to far more than a 20 kB budget."""
+    rgb = gradient((200, 150))
+    rgba = rgb.convert('RGBA')
+    rgba.putalpha(rgb.getchannel('G'))
+    directory = str(tmp_path)
+    return [
+        save(rgb, directory, 'photo.jpg', quality=90),
+        save(rgba, directory, 'alpha.png'),
+        save(rgb, directory, 'bitmap.bmp'),
+        save(rgb, directory, 'single-strip.tif', compression='tiff_lzw', tiffinfo={278: 150}),
+        save(rgb, directory, 'strips.tif', compression='tiff_lzw', tiffinfo={278: 16}),
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_images_over_the_budget_are_still_converted(large_images, tmp_path, workers):
+    reference = ImageToPDFConverter(quiet=True, jpeg_passthrough=False)
+    converter = ImageToPDFConverter(quiet=True, jpeg_passthrough=False, memory_budget=20_000)
+    results = converter.convert_images(large_images, str(tmp_path / 'budget'), workers=workers)
+    assert [error for _, _, error in results] == [None] * len(large_images)
+
+    for image_path, pdf_path, _ in results:
+        expected = reference.convert_single_image(image_path, str(tmp_path / 'reference.pdf'))
+        if image_path.endswith('.jpg'):
+            # Decoded at the 1/4 scale that fits the budget, in the same place on the page
+            assert page_images(pdf_path)[0].size == (50, 37)
+            assert (pypdf.PdfReader(pdf_path).pages[0].get_contents().get_data()
+                    == pypdf.PdfReader(expected).pages[0].get_contents().get_data())
+        else:
+            assert same_pixels(page_images(pdf_path)[0], page_images(expected)[0])
+
+
+@pytest.mark.parametrize('optimize', [False, True])
+def test_nothing_bandable_is_decoded_over_the_budget(large_images, tmp_path, monkeypatch,
+                                                     optimize):
+    loaded = []
+    load = ImageFile.ImageFile.load
+
+    def recording_load(img):
+        loaded.append(decoded_size(img.width, img.height, img.mode))
+        return load(img)
+
+    monkeypatch.setattr(ImageFile.ImageFile, 'load', recording_load)
+    converter = ImageToPDFConverter(quiet=True, jpeg_passthrough=False, png_passthrough=False,
+                                    optimize=optimize, memory_budget=20_000)
+    for path in large_images:
+        if path.endswith(('.bmp', 'single-strip.tif')):
+            continue  # Cannot be banded: decoded whole, on its own
+        del loaded[:]
+        converter.convert_single_image(path, str(tmp_path / 'out.pdf'))
+        assert loaded and max(loaded) <= 20_000
+        assert 0 < converter._decode_cost(path) <= 20_000
+
+
+def test_jpeg_budget_scale(tmp_path):
+    path = save(gradient((400, 300)), str(tmp_path), 'photo.jpg')
+    info = ImageToPDFConverter().get_image_info(path)
+    for budget, size in [(None, None), (480_000, None), (479_999, (200, 150)),
+                         (120_000, (200, 150)), (30_000, (100, 75)), (7_500, (50, 37)),
+                         (10, (50, 37))]:
+        converter = ImageToPDFConverter(quiet=True, memory_budget=budget)
+        assert converter._budget_jpeg_size(info, None) == size
+    # A downsampled size already within the budget is kept, a larger one is not
+    converter = ImageToPDFConverter(quiet=True, memory_budget=120_000)
+    assert converter._budget_jpeg_size(info, (120, 90)) == (120, 90)
+    assert converter._budget_jpeg_size(info, (300, 225)) == (200, 150)
+
+
+def test_merges_over_the_budget_are_still_converted(large_images, tmp_path):
+    converter = ImageToPDFConverter(quiet=True, jpeg_passthrough=False, memory_budget=20_000)
+    output = converter.convert_multiple_images(large_images, str(tmp_path / 'merged.pdf'),
+                                               workers=2)
+    assert len(page_images(output)) == len(large_images)
+
+
+def pool_task(item):
+    """Sleep for one admission test item, reporting when it ran."""
+    name, _, seconds = item
+    start = time.monotonic()
+    time.sleep(seconds)
+    return name, start, time.monotonic()
+
+
+def test_pool_admission_keeps_running_cost_within_budget():
+    items = [('a', 60, 0.2), ('b', 60, 0.2), ('c', 30, 0.1), ('d', 30, 0.2),
+             ('e', 150, 0.1), ('f', 10, 0.1), ('g', 40, 0.1), ('h', 50, 0.1)]
+    costs = {name: cost for name, cost, _ in items}
+    results = list(_ordered_pool_map(pool_task, items, workers=3, options={}, max_in_flight=6,
+                                     cost=lambda item: item[1], budget=100))
+    assert [item[0] for item, _ in results] == [name for name, _, _ in items]
+
+    spans = [result for _, result in results]
+    for name, start, _ in spans:
+        running = [other for other, other_start, other_end in spans
+                   if other_start <= start < other_end]
+        if costs[name] > 100:
+            assert running == [name]
+        else:
+            assert sum(costs[other] for other in running) <= 100
+
+
+def test_memory_budget_admission():
+    budget = MemoryBudget(100)
+    assert budget.fits(150)  # Nothing running: anything fits, and runs alone
+    budget.start('a', 60)
+    assert budget.fits(40) and not budget.fits(41)
+    budget.start('b', 40)
+    assert budget.in_use == 100 and sorted(budget) == ['a', 'b'] and len(budget) == 2
+    budget.finish('a')
+    assert budget.fits(60) and not budget.fits(61)
+    budget.finish('a')  # Finishing twice is harmless
+    budget.clear()
+    assert len(budget) == 0 and budget.fits(10 ** 12)
+
+    unlimited = MemoryBudget(None)
+    unlimited.start('a', 10 ** 12)
+    assert unlimited.fits(10 ** 12)
+
+
+def test_decode_cost_of_paths_and_data(large_images):
+    converter = ImageToPDFConverter(quiet=True, jpeg_passthrough=False, memory_budget=20_000)
+    for path in large_images:
+        with open(path, 'rb') as f:
+            data = f.read()
+        assert converter._decode_cost(data) == converter._decode_cost(path) > 0
+    assert converter._decode_cost(b'not an image') == 0
+
+
+def test_open_image_leaves_the_pixel_limit_alone(tmp_path, monkeypatch):
+    paths = [save(gradient((400, 300)), str(tmp_path), 'large.tif', tiffinfo={278: 16}),
+             save(gradient((400, 300)), str(tmp_path), 'large.jpg')]
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 5000)
+    for path in paths:
+        with open_image(path) as img:
+            assert img.size == (400, 300)
+        assert Image.MAX_IMAGE_PIXELS == 5000
+        with pytest.raises(Image.DecompressionBombError):
+            Image.open(path)
+
+
+def test_check_decode_size_applies_pillows_limit(monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 5000)
+    check_decode_size(100, 100)
+    with pytest.raises(Image.DecompressionBombError):
+        check_decode_size(101, 100)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', None)
+    check_decode_size(10 ** 6, 10 ** 6)
+
+
+def test_tiffs_over_the_bomb_limit_are_decoded_in_bands(tmp_path, monkeypatch):
+    rgb = gradient((300, 400))
+    path = save(rgb, str(tmp_path), 'huge.tif', compression='tiff_lzw', tiffinfo={278: 8})
+    # A small budget keeps each band (8 rows) under the lowered limit
+    converter = ImageToPDFConverter(quiet=True, memory_budget=10_000)
+    with monkeypatch.context() as patch:
+        patch.setattr(Image, 'MAX_IMAGE_PIXELS', 5000)
+        output = converter.convert_single_image(path, str(tmp_path / 'huge.pdf'))
+    assert same_pixels(page_images(output)[0], rgb)
+
+
+def test_jpegs_over_the_bomb_limit_are_passed_through_or_drafted(tmp_path, monkeypatch):
+    path = save(gradient((400, 300)), str(tmp_path), 'huge.jpg')
+    with monkeypatch.context() as patch:
+        patch.setattr(Image, 'MAX_IMAGE_PIXELS', 5000)
+        passthrough = ImageToPDFConverter(quiet=True).convert_single_image(
+            path, str(tmp_path / 'passthrough.pdf'))
+        # A 1/8 scale draft stays under the limit
+        drafted = ImageToPDFConverter(quiet=True, jpeg_passthrough=False, target_dpi=8) \
+            .convert_single_image(path, str(tmp_path / 'drafted.pdf'))
+    assert page_images(passthrough)[0].size == (400, 300)
+    assert page_images(drafted)[0].size[0] < 400 // 4
+
+
+@pytest.mark.parametrize('name, params, passthrough', [
+    ('single-strip.tif', {'compression': 'tiff_lzw', 'tiffinfo': {278: 300}}, True),
+    ('photo.jpg', {}, False),
+    ('photo.png', {}, True),
+])
+def test_whole_decodes_over_the_bomb_limit_are_refused(tmp_path, monkeypatch, name, params,
+                                                       passthrough):
+    path = save(gradient((400, 300)), str(tmp_path), name, **params)
+    converter = ImageToPDFConverter(quiet=True, jpeg_passthrough=passthrough,
+                                    png_passthrough=False)
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 5000)
+    with pytest.raises(Image.DecompressionBombError):
+        converter.convert_single_image(path, str(tmp_path / 'refused.pdf'))
+    assert not (tmp_path / 'refused.pdf').exists()
+
+
+def test_sources_between_the_limits_are_converted(tmp_path, monkeypatch):
+    # Pillow only warns between MAX_IMAGE_PIXELS and twice that
+    rgb = gradient((90, 80))
+    path = save(rgb, str(tmp_path), 'warned.png')
+    with monkeypatch.context() as patch:
+        patch.setattr(Image, 'MAX_IMAGE_PIXELS', 5000)
+        with pytest.warns(Image.DecompressionBombWarning):
+            output = ImageToPDFConverter(quiet=True, png_passthrough=False).convert_single_image(
+                path, str(tmp_path / 'warned.pdf'))
+    assert same_pixels(page_images(output)[0], to_pdf_mode(rgb))
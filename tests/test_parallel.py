@@ -0,0 +1,58 @@
+"""Tests for the process-pool engine behind parallel conversions."""
+
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from image_to_pdf_converter import ImageToPDFConverter, _ordered_pool_map
+from pdf_helpers import gradient, page_images, same_pixels, save
+
+
+def square_or_die(item):
+    """Square a number in a worker, killing the worker outright on 'die'."""
+    if item == 'die':
+        os._exit(1)
+    return item * item
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_worker_crash_only_fails_its_item(workers):
+    items = [1, 2, 'die', 3, 4, 5]
+    crashes = []
+
+    def on_crash(item, error):
+        crashes.append((item, type(error)))
+        return 'crashed'
+
+    results = list(_ordered_pool_map(square_or_die, items, workers=workers, options={},
+                                     max_in_flight=4, on_crash=on_crash))
+    assert results == [(1, 1), (2, 4), ('die', 'crashed'), (3, 9), (4, 16), (5, 25)]
+    assert crashes == [('die', BrokenProcessPool)]
+
+
+def test_worker_crash_without_handler_raises():
+    with pytest.raises(BrokenProcessPool):
+        list(_ordered_pool_map(square_or_die, [1, 'die', 2], workers=2, options={},
+                               max_in_flight=3))
+
+
+def test_several_crashes_are_all_reported():
+    results = list(_ordered_pool_map(square_or_die, ['die', 1, 'die', 2], workers=2,
+                                     options={}, max_in_flight=4,
+                                     on_crash=lambda item, error: None))
+    assert [result for _, result in results] == [None, 1, None, 4]
+
+
+def test_parallel_separate_pdfs_keep_input_order(tmp_path):
+    images = [save(gradient((40 + 10 * i, 30)), str(tmp_path), 'image%d.png' % i)
+              for i in range(5)]
+    missing = str(tmp_path / 'missing.png')
+    results = ImageToPDFConverter(quiet=True).convert_images(
+        images + [missing], str(tmp_path / 'out'), workers=2)
+
+    assert [image_path for image_path, _, _ in results] == images + [missing]
+    for i, (_, pdf_path, error) in enumerate(results[:-1]):
+        assert error is None
+        assert same_pixels(page_images(pdf_path)[0], gradient((40 + 10 * i, 30)))
+    assert results[-1][1] is None and results[-1][2]
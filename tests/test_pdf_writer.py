@@ -0,0 +1,141 @@
+"""Tests for StreamingPDFWriter and streaming merges."""
+
+import io
+import re
+
+import pypdf
+import pytest
+
+from image_to_pdf_converter import ImageToPDFConverter
+from pdf_helpers import gradient, page_images, sample_images, same_pixels
+from pdf_writer import StreamingPDFWriter, encode_pil_image
+
+A4 = (595.2756, 841.8898)
+
+
+class WriteOnlyStream:
+    """A binary stream that cannot seek or tell, like a pipe or socket."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def check_xref(data: bytes):
+    """Assert that every cross-reference entry points at its object."""
+    xref_offset = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[xref_offset:].startswith(b'xref\n')
+    entries = re.findall(rb'(\d{10}) (\d{5}) n ', data[xref_offset:])
+    assert entries
+    for object_id, (offset, _) in enumerate(entries, 1):
+        assert data[int(offset):].startswith(b'%d 0 obj\n' % object_id)
+
+
+def test_writer_output_parses_strictly(tmp_path):
+    path = str(tmp_path / 'out.pdf')
+    image = encode_pil_image(gradient())
+    with StreamingPDFWriter(path) as writer:
+        writer.add_image_page(image, A4, 10, 20, 120, 90)
+        writer.add_image_page(image, A4, 0, 0, 240, 180)
+        assert writer.page_count == 2
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert writer.bytes_written == len(data)
+    check_xref(data)
+
+    reader = pypdf.PdfReader(path, strict=True)
+    assert len(reader.pages) == 2
+    assert [float(v) for v in reader.pages[0].mediabox] == pytest.approx([0, 0, A4[0], A4[1]])
+    for decoded in page_images(path):
+        assert same_pixels(decoded, gradient())
+
+
+def test_writer_shares_images_between_pages():
+    output = io.BytesIO()
+    writer = StreamingPDFWriter(output)
+    image_id = writer.add_image(encode_pil_image(gradient()))
+    writer.add_page(A4, [(image_id, 0, 0, 120, 90)])
+    writer.add_page(A4, [(image_id, 0, 0, 120, 90), (image_id, 200, 200, 60, 45)])
+    writer.close()
+    assert not output.closed
+
+    reader = pypdf.PdfReader(output, strict=True)
+    references = [ref.idnum for page in reader.pages
+                  for ref in page['/Resources']['/XObject'].values()]
+    assert references == [image_id] * 3
+    assert output.getvalue().count(b'/Subtype /Image') == 1
+
+
+def test_writer_handles_non_seekable_streams():
+    output = WriteOnlyStream()
+    writer = StreamingPDFWriter(output)
+    writer.add_image_page(encode_pil_image(gradient()), A4, 0, 0, 120, 90)
+    writer.close()
+
+    data = output.getvalue()
+    assert writer.bytes_written == len(data)
+    check_xref(data)
+    assert len(pypdf.PdfReader(io.BytesIO(data), strict=True).pages) == 1
+
+
+def test_writer_writes_soft_masks():
+    rgba = gradient().convert('RGBA')
+    rgba.putalpha(gradient().getchannel('G'))
+    output = io.BytesIO()
+    with StreamingPDFWriter(output) as writer:
+        writer.add_image_page(encode_pil_image(rgba), A4, 0, 0, 120, 90)
+
+    xobject = list(pypdf.PdfReader(output, strict=True).pages[0]['/Resources']['/XObject']
+                   .values())[0].get_object()
+    smask = xobject['/SMask'].get_object()
+    assert smask['/ColorSpace'] == '/DeviceGray'
+    assert smask.get_data() == rgba.getchannel('A').tobytes()
+
+
+def test_writer_abort_removes_file(tmp_path):
+    path = tmp_path / 'partial.pdf'
+    with pytest.raises(RuntimeError):
+        with StreamingPDFWriter(str(path)) as writer:
+            writer.add_image_page(encode_pil_image(gradient()), A4, 0, 0, 120, 90)
+            raise RuntimeError('stop')
+    assert not path.exists()
+
+
+def test_writer_abort_leaves_streams_open():
+    output = io.BytesIO()
+    writer = StreamingPDFWriter(output)
+    writer.abort()
+    assert not output.closed
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_streaming_merge_matches_in_memory_merge(tmp_path, workers):
+    samples = sample_images(str(tmp_path))
+    paths = [samples[name] for name in ('rgb.png', 'rgb.jpg', 'palette.png', 'group4.tif',
+                                        'rgb.png')]
+    converter = ImageToPDFConverter(quiet=True)
+    in_memory = converter.convert_multiple_images(paths, str(tmp_path / 'memory.pdf'))
+    streamed = converter.convert_multiple_images(paths, str(tmp_path / 'streamed.pdf'),
+                                                 streaming=True, workers=workers)
+
+    expected = page_images(in_memory)
+    decoded = page_images(streamed)
+    assert len(decoded) == len(paths)
+    for a, b in zip(expected, decoded):
+        assert same_pixels(a, b)
+
+    with open(streamed, 'rb') as f:
+        data = f.read()
+    check_xref(data)
+    # The repeated PNG is embedded once
+    assert data.count(b'/Subtype /Image') == len(paths) - 1
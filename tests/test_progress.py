@@ -0,0 +1,127 @@
+"""Tests for progress callbacks and cancelling conversions through a CancelToken."""
+
+import os
+
+import pytest
+
+from image_to_pdf_converter import CancelToken, ConversionCancelled, ImageToPDFConverter
+from pdf_helpers import gradient, page_images, same_pixels, save
+
+
+@pytest.fixture
+def images(tmp_path):
+    directory = tmp_path / 'images'
+    directory.mkdir()
+    return [save(gradient((40 + 10 * i, 30)), str(directory), 'image%d.png' % i)
+            for i in range(10)]
+
+
+def recorder(cancel_after=None, token=None):
+    """A progress callback that records every report, cancelling ``token`` after ``cancel_after``."""
+    reports = []
+
+    def progress(report):
+        reports.append(report)
+        if cancel_after is not None and report.done == cancel_after:
+            token.cancel()
+
+    return reports, progress
+
+
+def started_limit(done, workers):
+    """Most PDFs a run cancelled after ``done`` results can leave, counting jobs already running."""
+    if workers == 1:
+        return done
+    return done + workers * ImageToPDFConverter.PIPELINE_QUEUE_PER_WORKER
+
+
+def assert_counts_up_to(reports, total, expected_total):
+    assert [report.done for report in reports] == list(range(1, total + 1))
+    assert all(report.total == expected_total for report in reports)
+    elapsed = [report.elapsed for report in reports]
+    assert elapsed == sorted(elapsed)
+
+
+@pytest.mark.parametrize('streaming, workers', [(False, 1), (True, 1), (True, 2)])
+def test_merge_progress_counts_every_page(images, tmp_path, streaming, workers):
+    reports, progress = recorder()
+    output = str(tmp_path / 'merged.pdf')
+    ImageToPDFConverter(quiet=True).convert_multiple_images(
+        images, output, streaming=streaming, workers=workers, progress=progress)
+
+    assert_counts_up_to(reports, len(images), len(images))
+    assert [report.path for report in reports] == images
+    assert reports[-1].eta == 0
+    assert len(page_images(output)) == len(images)
+
+
+@pytest.mark.parametrize('streaming, workers', [(False, 1), (True, 1), (True, 2)])
+def test_cancelled_merge_leaves_no_pdf(images, tmp_path, streaming, workers):
+    token = CancelToken()
+    reports, progress = recorder(cancel_after=2, token=token)
+    output = tmp_path / 'merged.pdf'
+    with pytest.raises(ConversionCancelled):
+        ImageToPDFConverter(quiet=True).convert_multiple_images(
+            images, str(output), streaming=streaming, workers=workers, progress=progress,
+            cancel=token)
+
+    assert [report.done for report in reports] == [1, 2]
+    assert not output.exists()
+    assert os.listdir(str(tmp_path)) == ['images']
+
+
+def test_merge_cancelled_before_it_starts(images, tmp_path):
+    token = CancelToken()
+    token.cancel()
+    reports, progress = recorder()
+    with pytest.raises(ConversionCancelled):
+        ImageToPDFConverter(quiet=True).convert_multiple_images(
+            images, str(tmp_path / 'merged.pdf'), progress=progress, cancel=token)
+    assert reports == []
+    assert os.listdir(str(tmp_path)) == ['images']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_separate_pdfs_progress_and_cancel(images, tmp_path, workers):
+    converter = ImageToPDFConverter(quiet=True)
+    reports, progress = recorder()
+    results = converter.convert_images(images, str(tmp_path / 'all'), workers=workers,
+                                       progress=progress)
+    assert_counts_up_to(reports, len(images), len(images))
+    assert all(error is None for _, _, error in results)
+
+    token = CancelToken()
+    reports, progress = recorder(cancel_after=2, token=token)
+    out = tmp_path / 'cancelled'
+    with pytest.raises(ConversionCancelled):
+        converter.convert_images(images, str(out), workers=workers, progress=progress,
+                                 cancel=token)
+    assert [report.done for report in reports] == [1, 2]
+    # Finished PDFs are kept; with a pool, jobs already running may finish too
+    created = sorted(os.listdir(str(out)))
+    assert created[:2] == ['image0.pdf', 'image1.pdf']
+    assert len(created) <= started_limit(2, workers) < len(images)
+    for name in created:
+        index = int(name[len('image'):-len('.pdf')])
+        assert same_pixels(page_images(str(out / name))[0], gradient((40 + 10 * index, 30)))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_progress_and_cancel(images, tmp_path, workers):
+    directory = os.path.dirname(images[0])
+    converter = ImageToPDFConverter(quiet=True)
+    reports, progress = recorder()
+    created = converter.batch_convert_directory(directory, str(tmp_path / 'all'),
+                                                workers=workers, progress=progress)
+    # The directory is read lazily, so the total stays unknown
+    assert_counts_up_to(reports, len(images), None)
+    assert len(created) == len(images)
+
+    token = CancelToken()
+    reports, progress = recorder(cancel_after=3, token=token)
+    with pytest.raises(ConversionCancelled):
+        converter.batch_convert_directory(directory, str(tmp_path / 'cancelled'),
+                                          workers=workers, progress=progress, cancel=token)
+    assert [report.done for report in reports] == [1, 2, 3]
+    created = os.listdir(str(tmp_path / 'cancelled'))
+    assert 3 <= len(created) <= started_limit(3, workers) < len(images)
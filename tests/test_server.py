@@ -0,0 +1,232 @@
+"""Tests for the HTTP conversion server."""
+
+import asyncio
+import http.client
+import io
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from conversion_server import ConversionServer, _warm_up
+from pdf_helpers import gradient, page_images, same_pixels
+
+
+class RunningServer:
+    """A ConversionServer on an ephemeral port, run by an event loop in a background thread."""
+
+    def __init__(self, **options):
+        self.server = ConversionServer(port=0, **options)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.run(self.server.start(), timeout=60)
+
+    def run(self, coroutine, timeout=30):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def stop(self):
+        self.run(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """Send one request; returns (status, content type, body)."""
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=60)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, response.getheader('Content-Type'), response.read()
+        finally:
+            connection.close()
+
+    def health(self):
+        status, _, body = self.request('GET', '/health')
+        return status, json.loads(body)
+
+    def worker_pids(self):
+        executor = self.server._executor
+        return {executor.submit(_warm_up).result(30) for _ in range(self.server.workers)}
+
+
+@pytest.fixture
+def server():
+    running = RunningServer(workers=1, max_upload_bytes=200 * 1024)
+    yield running
+    running.stop()
+
+
+def png_bytes(img) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def multipart(parts):
+    """Encode ``parts`` as a multipart/form-data body; returns (body, headers)."""
+    boundary = 'test-boundary-7d93f2'
+    body = b''
+    for index, data in enumerate(parts):
+        body += (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                 f'filename="image{index}.png"\r\nContent-Type: image/png\r\n\r\n').encode('latin-1')
+        body += data + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode('latin-1')
+    return body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def test_convert_raw_body(server):
+    img = gradient((60, 40))
+    status, content_type, body = server.request('POST', '/convert', png_bytes(img),
+                                                {'Content-Type': 'image/png'})
+    assert status == 200 and content_type == 'application/pdf'
+    pages = page_images(io.BytesIO(body))
+    assert len(pages) == 1 and same_pixels(pages[0], img)
+
+
+def test_merge_keeps_upload_order(server):
+    images = [gradient((40 + 10 * i, 30)) for i in range(3)]
+    body, headers = multipart([png_bytes(img) for img in images])
+    status, content_type, pdf = server.request('POST', '/merge', body, headers)
+    assert status == 200 and content_type == 'application/pdf'
+    pages = page_images(io.BytesIO(pdf))
+    assert len(pages) == 3
+    assert all(same_pixels(page, img) for page, img in zip(pages, images))
+
+
+def test_convert_takes_exactly_one_image(server):
+    body, headers = multipart([png_bytes(gradient((20, 20)))] * 2)
+    status, _, _ = server.request('POST', '/convert', body, headers)
+    assert status == 400
+
+
+def test_bad_image_data_is_422(server):
+    status, content_type, body = server.request('POST', '/convert', b'not an image at all')
+    assert status == 422 and content_type == 'application/json'
+    assert 'Conversion failed' in json.loads(body)['error']
+
+    data = png_bytes(gradient((60, 40)))
+    assert server.request('POST', '/convert', data[:len(data) // 2])[0] == 422
+    # The worker survives bad uploads
+    assert server.health()[1]['pool_restarts'] == 0
+
+
+def test_upload_size_limit(server):
+    status, _, body = server.request('POST', '/convert', b'\0' * (200 * 1024 + 1))
+    assert status == 413 and 'larger than' in json.loads(body)['error']
+    # A body at the limit is read and handed on (and fails as an image)
+    assert server.request('POST', '/convert', b'\0' * (200 * 1024))[0] == 422
+
+
+def test_unknown_endpoint_and_method(server):
+    assert server.request('GET', '/nowhere')[0] == 404
+    assert server.request('GET', '/convert')[0] == 405
+    assert server.request('POST', '/health', b'')[0] == 405
+
+
+def test_health_before_and_after_a_worker_is_killed(server):
+    status, health = server.health()
+    assert status == 200
+    assert health == {'status': 'ok', 'pool': 'ok', 'pool_restarts': 0, 'workers': 1,
+                      'queued': 0, 'queue_size': 4}
+
+    old_pids = server.worker_pids()
+    for pid in old_pids:
+        os.kill(pid, signal.SIGKILL)
+
+    # The pool notices the dead worker shortly; /health reports it and starts a new pool
+    seen = []
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        status, health = server.health()
+        seen.append(status)
+        if status == 200 and health['pool_restarts'] == 1:
+            break
+        time.sleep(0.05)
+    assert health == {'status': 'ok', 'pool': 'ok', 'pool_restarts': 1, 'workers': 1,
+                      'queued': 0, 'queue_size': 4}
+    assert 503 in seen
+    assert not server.worker_pids() & old_pids
+
+    img = gradient((30, 20))
+    status, _, body = server.request('POST', '/convert', png_bytes(img))
+    assert status == 200 and same_pixels(page_images(io.BytesIO(body))[0], img)
+
+
+def test_conversion_survives_a_killed_worker(server):
+    for pid in server.worker_pids():
+        os.kill(pid, signal.SIGKILL)
+    time.sleep(0.5)
+
+    # The request finds the pool broken, restarts it and runs once more
+    img = gradient((30, 20))
+    status, _, body = server.request('POST', '/convert', png_bytes(img))
+    assert status == 200 and same_pixels(page_images(io.BytesIO(body))[0], img)
+    assert server.health()[1]['pool_restarts'] == 1
+
+
+async def admit_in_order(server, requests):
+    """Run fake conversions of the given costs through the admission gate, recording starts and ends."""
+    events = []
+
+    async def convert(name, cost):
+        async with server._admitted(cost):
+            events.append(('start', name, server._budget.in_use))
+            await asyncio.sleep(0.05)
+            events.append(('end', name, None))
+
+    tasks = []
+    for name, cost in requests:
+        tasks.append(asyncio.ensure_future(convert(name, cost)))
+        await asyncio.sleep(0)  # Queue them in this order
+    await asyncio.gather(*tasks)
+    return events
+
+
+def test_requests_share_one_memory_budget():
+    running = RunningServer(workers=2, memory_budget=100)
+    try:
+        events = running.run(admit_in_order(running.server, [
+            ('a', 60), ('b', 60), ('c', 10), ('huge', 250), ('d', 10)]))
+        assert running.server._budget.in_use == 0
+    finally:
+        running.stop()
+
+    starts = [(name, in_use) for kind, name, in_use in events if kind == 'start']
+    # In queue order: 'c' would fit beside 'a' but waits its turn behind 'b'
+    assert [name for name, _ in starts] == ['a', 'b', 'c', 'huge', 'd']
+    assert dict(starts) == {'a': 60, 'b': 60, 'c': 70, 'huge': 250, 'd': 10}
+    position = {(kind, name): index for index, (kind, name, _) in enumerate(events)}
+    assert position['end', 'a'] < position['start', 'b'] < position['start', 'c'] < position['end', 'b']
+    # Over the whole budget: runs once nothing else is, and alone
+    assert max(position['end', 'b'], position['end', 'c']) < position['start', 'huge']
+    assert position['end', 'huge'] < position['start', 'd']
+
+
+def test_conversions_within_a_memory_budget():
+    # Each image decodes to 60 kB, so only one conversion runs at a time
+    running = RunningServer(workers=2, memory_budget=100_000,
+                            converter_options={'png_passthrough': False})
+    try:
+        images = [gradient((150, 100)).rotate(i * 90) for i in range(2)]
+        assert running.server._upload_cost([png_bytes(images[0])]) == 150 * 100 * 4
+        assert running.server._upload_cost([png_bytes(gradient((10, 10))),
+                                            png_bytes(images[0])]) == 150 * 100 * 4
+        results = []
+        threads = [threading.Thread(target=lambda img=img: results.append(
+            (img, running.request('POST', '/convert', png_bytes(img))))) for img in images * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        assert len(results) == 4
+        for img, (status, _, body) in results:
+            assert status == 200 and same_pixels(page_images(io.BytesIO(body))[0], img)
+        assert running.server._budget.in_use == 0
+        # The workers get the whole budget as their converter's own
+        assert running.server.converter_options['memory_budget'] == 100_000
+    finally:
+        running.stop()
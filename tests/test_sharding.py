@@ -0,0 +1,137 @@
+"""Tests for merging images into a series of PDF shards with an index."""
+
+import json
+import os
+import random
+
+import pypdf
+import pytest
+from PIL import Image
+
+from image_to_pdf_converter import ImageToPDFConverter
+from pdf_helpers import gradient, page_images, same_pixels, save
+
+
+def noise(size, seed):
+    """An RGB image of random pixels, which compresses to about its raw size."""
+    return Image.frombytes('RGB', size, random.Random(seed).randbytes(size[0] * size[1] * 3))
+
+
+def read_index(output_path):
+    with open(os.path.splitext(output_path)[0] + '.index.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_index(output_path, shards, images):
+    """The index describes the shards exactly: files, page ranges, sizes and images in order."""
+    index = read_index(output_path)
+    assert index['output'] == os.path.basename(output_path)
+    assert [entry['file'] for entry in index['shards']] == [os.path.basename(s) for s in shards]
+
+    next_page = 1
+    for entry, shard in zip(index['shards'], shards):
+        pages = len(pypdf.PdfReader(shard, strict=True).pages)
+        assert (entry['first_page'], entry['last_page'], entry['pages']) == (
+            next_page, next_page + pages - 1, pages)
+        assert len(entry['images']) == pages
+        assert entry['bytes'] == os.path.getsize(shard)
+        next_page += pages
+    assert index['pages'] == next_page - 1 == len(images)
+    assert [label for entry in index['shards'] for label in entry['images']] == images
+    return index
+
+
+@pytest.fixture
+def images(tmp_path):
+    directory = tmp_path / 'images'
+    directory.mkdir()
+    return [save(gradient((40 + 5 * i, 30)), str(directory), 'image%d.png' % i)
+            for i in range(7)]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_page_limit_splits_into_planned_shards(images, tmp_path, workers):
+    output = str(tmp_path / 'out' / 'album.pdf')
+    shards = ImageToPDFConverter(quiet=True).convert_sharded_images(
+        images, output, max_pages_per_file=3, workers=workers)
+
+    assert [os.path.basename(shard) for shard in shards] == [
+        'album-0001.pdf', 'album-0002.pdf', 'album-0003.pdf']
+    index = check_index(output, shards, images)
+    assert [entry['pages'] for entry in index['shards']] == [3, 3, 1]
+    assert (index['max_pages_per_file'], index['max_bytes_per_file']) == (3, None)
+
+    pages = [page for shard in shards for page in page_images(shard)]
+    assert all(same_pixels(page, gradient((40 + 5 * i, 30))) for i, page in enumerate(pages))
+
+
+def test_multi_frame_files_are_not_split(tmp_path):
+    directory = str(tmp_path)
+    frames = [gradient((30, 20)).rotate(90 * i) for i in range(4)]
+    animation = save(frames[0], directory, 'frames.tif', save_all=True, append_images=frames[1:])
+    single = [save(gradient((30, 20)), directory, 'single%d.png' % i) for i in range(2)]
+    output = str(tmp_path / 'album.pdf')
+    shards = ImageToPDFConverter(quiet=True, all_frames=True).convert_sharded_images(
+        [single[0], animation, single[1]], output, max_pages_per_file=3)
+
+    index = read_index(output)
+    assert [entry['pages'] for entry in index['shards']] == [1, 4, 1]
+    assert [len(pypdf.PdfReader(shard).pages) for shard in shards] == [1, 4, 1]
+    assert index['shards'][1]['first_page'] == 2 and index['shards'][1]['last_page'] == 5
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_byte_limit_fills_shards(tmp_path, workers):
+    # Each page holds a bit over 4.8 KB of incompressible image data
+    images = [save(noise((40, 40), seed), str(tmp_path), 'noise%d.png' % seed)
+              for seed in range(9)]
+    limit = 12 * 1024
+    output = str(tmp_path / 'noise.pdf')
+    shards = ImageToPDFConverter(quiet=True).convert_sharded_images(
+        images, output, max_bytes_per_file=limit, workers=workers)
+
+    index = check_index(output, shards, images)
+    assert [entry['pages'] for entry in index['shards']] == [2, 2, 2, 2, 1]
+    # Within the limit apart from the trailer, and full: one more page would not have fit
+    page_bytes = min(entry['bytes'] for entry in index['shards'])
+    for entry in index['shards']:
+        assert entry['bytes'] <= limit + 1024
+    for entry in index['shards'][:-1]:
+        assert entry['bytes'] + page_bytes > limit
+
+
+def test_byte_and_page_limits_combine(tmp_path):
+    images = [save(noise((40, 40), seed), str(tmp_path), 'noise%d.png' % seed)
+              for seed in range(5)]
+    output = str(tmp_path / 'noise.pdf')
+    shards = ImageToPDFConverter(quiet=True).convert_sharded_images(
+        images, output, max_pages_per_file=1, max_bytes_per_file=1024 * 1024)
+    assert [entry['pages'] for entry in check_index(output, shards, images)['shards']] == [1] * 5
+
+
+def test_page_over_the_byte_limit_gets_its_own_shard(tmp_path):
+    small = [save(gradient((20, 20)), str(tmp_path), 'small%d.png' % i) for i in range(2)]
+    large = save(noise((80, 80), 1), str(tmp_path), 'large.png')
+    images = [small[0], large, small[1]]
+    output = str(tmp_path / 'mixed.pdf')
+    shards = ImageToPDFConverter(quiet=True).convert_sharded_images(
+        images, output, max_bytes_per_file=8 * 1024)
+
+    index = check_index(output, shards, images)
+    assert [entry['images'] for entry in index['shards']] == [[small[0]], [large], [small[1]]]
+    assert index['shards'][1]['bytes'] > 8 * 1024
+
+
+def test_repeated_images_are_shared_within_a_shard(tmp_path):
+    image = save(noise((40, 40), 3), str(tmp_path), 'same.png')
+    output = str(tmp_path / 'same.pdf')
+    shards = ImageToPDFConverter(quiet=True).convert_sharded_images(
+        [image] * 6, output, max_bytes_per_file=12 * 1024)
+    # Only the first page of a shard adds the image data, so all pages fit in one
+    index = check_index(output, shards, [image] * 6)
+    assert [entry['pages'] for entry in index['shards']] == [6]
+
+
+def test_a_limit_is_required(images, tmp_path):
+    with pytest.raises(ValueError):
+        ImageToPDFConverter(quiet=True).convert_sharded_images(images, str(tmp_path / 'a.pdf'))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Thumbnail Cache
+Generates small PNG previews of images on background threads and keeps them
+in an on-disk LRU cache, so the GUI can show page thumbnails for large
+selections without blocking and without decoding the same file twice.
+"""
+
+import hashlib
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from pdf_writer import to_pdf_mode
+
+
+def default_cache_dir() -> str:
+    """Return the per-user cache directory for thumbnails."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'image2pdf', 'thumbnails')
+
+
+class ThumbnailCache:
+    """
+    On-disk LRU cache of PNG thumbnails.
+
+    Entries are keyed by the image path, its size and modification time and
+    the thumbnail size, so an edited file gets a fresh thumbnail. Each entry
+    is one file whose mtime records its last use; when the cache grows past
+    ``max_bytes`` the least recently used entries are deleted. The index is
+    rebuilt from the directory on start-up, so the cache persists between
+    runs.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Open (or create) a thumbnail cache.
+
+        Args:
+            cache_dir (str): Directory for cached thumbnails (optional,
+                default_cache_dir() otherwise)
+            max_bytes (int): Total size the cache is trimmed to
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Index existing entries, least recently used first."""
+        entries = []
+        with os.scandir(self.cache_dir) as scan:
+            for entry in scan:
+                if entry.is_file() and entry.name.endswith('.png'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def key(image_path: str, size: Tuple[int, int]) -> Optional[str]:
+        """
+        Return the cache entry name for an image, or None if it cannot be read.
+
+        Args:
+            image_path (str): Path to the image file
+            size (Tuple[int, int]): Maximum thumbnail width and height
+        """
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        identity = '\0'.join((os.path.abspath(image_path), str(stat.st_size),
+                              str(stat.st_mtime_ns), '%dx%d' % size))
+        return hashlib.sha1(identity.encode('utf-8', 'surrogatepass')).hexdigest() + '.png'
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return a cached thumbnail and mark it as recently used, or None."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store a thumbnail, evicting least recently used entries beyond max_bytes."""
+        path = os.path.join(self.cache_dir, key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            # A cache that cannot be written only costs regeneration later
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        evicted = []
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(os.path.join(self.cache_dir, old_key))
+            except OSError:
+                pass
+
+
+def render_thumbnail(image_path: str, size: Tuple[int, int]) -> bytes:
+    """
+    Render a PNG thumbnail of an image's first frame.
+
+    JPEGs are decoded at a reduced DCT scale via draft mode, so large photos
+    are never decoded at full resolution.
+
+    Args:
+        image_path (str): Path to the image file
+        size (Tuple[int, int]): Maximum thumbnail width and height
+
+    Returns:
+        bytes: PNG-encoded thumbnail
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        img.draft('RGB', size)
+        img.thumbnail(size)
+        img = to_pdf_mode(img)
+        if img.mode in ('1', 'CMYK'):
+            img = img.convert('L' if img.mode == '1' else 'RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ThumbnailLoader:
+    """
+    Produce thumbnails on a pool of background threads.
+
+    Callers say which images they currently want with request(); the newest
+    request replaces whatever is still queued, so scrolling through
+    thousands of files only ever renders the ones that were on screen.
+    Finished thumbnails (or None for unreadable files) are passed to the
+    callback on the worker thread; GUI code should hand them to its own
+    thread, e.g. through a queue polled with ``after()``.
+    """
+
+    def __init__(self, callback: Callable[[str, Optional[bytes]], None],
+                 cache: ThumbnailCache = None, size: Tuple[int, int] = (64, 64), workers: int = 2):
+        """
+        Start the worker threads.
+
+        Args:
+            callback (Callable[[str, Optional[bytes]], None]): Called with
+                each image path and its PNG thumbnail
+            cache (ThumbnailCache): On-disk cache (optional, no caching if
+                None)
+            size (Tuple[int, int]): Maximum thumbnail width and height
+            workers (int): Number of rendering threads
+        """
+        self.callback = callback
+        self.cache = cache
+        self.size = size
+        self._condition = threading.Condition()
+        self._wanted: List[str] = []
+        self._in_progress = set()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, name=f'thumbnails-{index}', daemon=True)
+                         for index in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, image_paths: List[str]):
+        """
+        Replace the queue with these images, rendered in the order given.
+
+        Images already being rendered are not queued again.
+        """
+        with self._condition:
+            self._wanted = [path for path in reversed(image_paths) if path not in self._in_progress]
+            self._condition.notify_all()
+
+    def close(self):
+        """Stop the workers once their current thumbnail is done."""
+        with self._condition:
+            self._closed = True
+            self._wanted = []
+            self._condition.notify_all()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._wanted and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                image_path = self._wanted.pop()
+                self._in_progress.add(image_path)
+            try:
+                data = self._load(image_path)
+            except Exception:
+                data = None
+            finally:
+                with self._condition:
+                    self._in_progress.discard(image_path)
+            self.callback(image_path, data)
+
+    def _load(self, image_path: str) -> bytes:
+        key = self.cache.key(image_path, self.size) if self.cache is not None else None
+        if key is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+        data = render_thumbnail(image_path, self.size)
+        if key is not None:
+            self.cache.put(key, data)
+        return data